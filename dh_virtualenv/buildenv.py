@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Build environments for PEP 517 builds, prepared once and kept
+between builds, instead of the isolated one pip sets up for each build.
+"""
+from __future__ import absolute_import
+
+import configparser
+import contextlib
+import os
+import tarfile
+import zipfile
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+from . import cache
+from .wheelhouse import normalize_name, requirements_key
+
+# What pip assumes for a pyproject.toml without build-system table
+DEFAULT_BUILD_REQUIRES = ['setuptools>=40.8.0']
+# ... and for one without build-backend
+DEFAULT_BUILD_BACKEND = 'setuptools.build_meta:__legacy__'
+
+
+def parse_build_requires(content):
+    """Return the sorted ``build-system.requires`` of the pyproject.toml
+    ``content``.
+    """
+    data = tomllib.loads(content)
+    if 'build-system' not in data:
+        return list(DEFAULT_BUILD_REQUIRES)
+    requires = data['build-system'].get('requires')
+    if not isinstance(requires, list):
+        raise ValueError('build-system.requires is not a list')
+    return sorted(set(requirement.strip() for requirement in requires))
+
+
+def project_build_requires(source_dir):
+    """Return the build requirements of the project in ``source_dir``,
+    or None if it has no pyproject.toml (and gets built the legacy way).
+    """
+    path = os.path.join(source_dir, 'pyproject.toml')
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as fh:
+        return parse_build_requires(fh.read())
+
+
+def project_build_backend(source_dir):
+    """Return the ``build-backend`` and ``backend-path`` of the project
+    in ``source_dir``.
+    """
+    with open(os.path.join(source_dir, 'pyproject.toml'),
+              encoding='utf-8') as fh:
+        build_system = tomllib.loads(fh.read()).get('build-system', {})
+    return (build_system.get('build-backend', DEFAULT_BUILD_BACKEND),
+            build_system.get('backend-path', []))
+
+
+def project_name(source_dir):
+    """Return the normalized name of the project in ``source_dir`` as
+    declared in its pyproject.toml or setup.cfg, or None if unknown.
+    """
+    path = os.path.join(source_dir, 'pyproject.toml')
+    if tomllib is not None and os.path.exists(path):
+        try:
+            with open(path, encoding='utf-8') as fh:
+                name = tomllib.loads(fh.read()).get('project', {}).get('name')
+        except (ValueError, IOError, OSError):
+            name = None
+        if isinstance(name, str) and name:
+            return normalize_name(name)
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        parser.read(os.path.join(source_dir, 'setup.cfg'), encoding='utf-8')
+    except configparser.Error:
+        return None
+    name = parser.get('metadata', 'name', fallback=None)
+    return normalize_name(name) if name else None
+
+
+def sdist_build_requires(sdist_path):
+    """Return the build requirements of a source distribution, or None
+    if it has no (valid) pyproject.toml.
+    """
+    try:
+        if sdist_path.endswith('.zip'):
+            with zipfile.ZipFile(sdist_path) as zf:
+                names = [name for name in zf.namelist()
+                         if name.count('/') == 1 and
+                         name.endswith('/pyproject.toml')]
+                if not names:
+                    return None
+                content = zf.read(names[0])
+        else:
+            with tarfile.open(sdist_path) as tf:
+                members = [member for member in tf.getmembers()
+                           if member.isfile() and
+                           member.name.count('/') == 1 and
+                           member.name.endswith('/pyproject.toml')]
+                if not members:
+                    return None
+                content = tf.extractfile(members[0]).read()
+        return parse_build_requires(content.decode('utf-8'))
+    except (tarfile.TarError, zipfile.BadZipFile, UnicodeDecodeError,
+            ValueError, IOError, OSError):
+        # tomllib.TOMLDecodeError is a ValueError
+        return None
+
+
+def environment(env_dir, base_env):
+    """Return ``base_env`` changed to run builds without isolation
+    against the build environment in ``env_dir``.
+    """
+    site_dir = os.path.join(env_dir, 'site')
+    env = dict(base_env)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [site_dir] + [path for path in [base_env.get('PYTHONPATH')] if path])
+    env['PATH'] = os.pathsep.join(
+        [os.path.join(site_dir, 'bin'), base_env.get('PATH', os.defpath)])
+    return env
+
+
+class BuildEnvCache(object):
+    """A directory of build environments for one interpreter ABI and
+    platform, keyed by their requirements.
+
+    Each environment is a directory ``site`` with the requirements
+    installed by ``pip install --target``, and used by putting it on the
+    ``PYTHONPATH``. Since they are keyed by the requirements as given,
+    unpinned ones are not updated until the cache is cleared.
+    """
+
+    def __init__(self, root, tag):
+        self.path = os.path.join(root, 'build-envs', tag)
+
+    def env_dir(self, requires):
+        """Return the directory of the environment for ``requires``."""
+        return os.path.join(self.path, requirements_key(*requires))
+
+    @contextlib.contextmanager
+    def prepare(self, requires):
+        """Prepare the environment for ``requires`` in the scratch
+        directory yielded, which becomes its cache entry once the block
+        succeeds (see :func:`cache.entry`).
+        """
+        with cache.entry(self.env_dir(requires)) as staging:
+            yield staging
+            with open(os.path.join(staging, 'requires.txt'), 'w') as fh:
+                fh.write(''.join(requirement + '\n'
+                                 for requirement in requires))
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Atomic updates of the caches shared between package builds."""
+from __future__ import absolute_import
+
+import contextlib
+import os
+import shutil
+import tempfile
+
+
+def staging_dir(parent):
+    """Create a scratch directory in ``parent``, so what is prepared in
+    it can be moved into ``parent`` without copying.
+    """
+    if not os.path.isdir(parent):
+        os.makedirs(parent, exist_ok=True)
+    return tempfile.mkdtemp(prefix='.staging-', dir=parent)
+
+
+def publish(staged_path, path):
+    """Move a file or directory prepared in a staging directory to
+    ``path``.
+
+    The rename is atomic, so concurrent builds never see partially
+    written entries. If another build published a directory at ``path``
+    in the meantime, that one is kept.
+    """
+    try:
+        os.rename(staged_path, path)
+    except OSError:
+        # Somebody else was faster, just use theirs
+        if not os.path.isdir(path):
+            raise
+
+
+@contextlib.contextmanager
+def entry(path):
+    """Prepare the cache directory ``path`` in the scratch directory
+    yielded, which is published there once the block succeeds, and
+    removed in any case.
+    """
+    staging = staging_dir(os.path.dirname(path))
+    try:
+        yield staging
+        publish(staging, path)
+    finally:
+        if os.path.isdir(staging):
+            shutil.rmtree(staging)
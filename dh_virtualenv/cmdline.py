@@ -99,6 +99,20 @@ def _set_setuptools(
         parser.values.setuptools = True
 
 
+def _set_size(option, opt_str, value, parser, *args, **kwargs):
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    number, multiplier = value, 1
+    if value[-1:].upper() in units:
+        number, multiplier = value[:-1], units[value[-1:].upper()]
+    try:
+        size = int(number) * multiplier
+    except ValueError:
+        raise OptionValueError(
+            '{0} expects a size in bytes, optionally with a K, M or G '
+            'suffix, not {1!r}'.format(opt_str, value))
+    setattr(parser.values, option.dest, size)
+
+
 def get_default_parser():
     usage = '%prog [options]'
     parser = DebhelperOptionParser(usage, version='%prog ' + version)
@@ -128,6 +142,13 @@ def get_default_parser():
                       "you'll install this program by using the --preinstall "
                       "argument. The replacement is expected to be found in "
                       "the virtualenv's bin/ directory.")
+    parser.add_option('--installer', type='choice',
+                      choices=['pip', 'builtin'], default='pip',
+                      metavar='INSTALLER',
+                      help='How requirements are installed: pip (default), '
+                      'or builtin, which builds or downloads wheels of all '
+                      'of them with pip first, then installs those wheels '
+                      'in parallel without pip.')
     parser.add_option('--upgrade-pip', action='store_true', default=False,
                       help='Upgrade pip to the latest available version')
     parser.add_option('--upgrade-pip-to', default='', metavar='VERSION',
@@ -174,6 +195,159 @@ def get_default_parser():
                       dest='requirements_filename',
                       help='Specify the filename for requirements.txt',
                       default='requirements.txt')
+    parser.add_option('--requirements-lock', metavar='FILEPATH',
+                      dest='requirements_lock',
+                      help='Install the requirements from this hash-checked '
+                      'lock file, which is (re-)created whenever the '
+                      'requirements file changes.')
+    parser.add_option('--offline', metavar='DIRECTORY',
+                      help='Install distributions only from the wheels and '
+                      'source distributions in DIRECTORY, without any '
+                      'network access.')
+    parser.add_option('--jobs', type='int', default=1, metavar='N',
+                      help='Build up to N binary packages concurrently. '
+                      'The output of each build goes to '
+                      'debian/<package>.dh-virtualenv.log.')
+    parser.add_option('--prebuild-wheels', action='store_true',
+                      default=False, dest='prebuild_wheels',
+                      help='Build wheels from the source distributions among '
+                      'the requirements in parallel before installing them.')
+    parser.add_option('--prebuild-jobs', type='int', metavar='N',
+                      dest='prebuild_jobs',
+                      help='Build up to N wheels at a time with '
+                      '--prebuild-wheels. Defaults to the number of CPUs.')
+    parser.add_option('--schedule-builds', action='store_true',
+                      default=False, dest='schedule_builds',
+                      help='Limit the compiler processes run while '
+                      'installing requirements by the available CPUs and '
+                      'memory, and parallel=N in DEB_BUILD_OPTIONS, shared '
+                      'between packages built concurrently.')
+    parser.add_option('--build-job-memory', metavar='SIZE', type='string',
+                      action='callback', callback=_set_size,
+                      dest='build_job_memory',
+                      help='Memory needed by each compiler process with '
+                      '--schedule-builds. K, M and G suffixes are accepted. '
+                      'Defaults to 2G.')
+    parser.add_option('--cache-build-envs', action='store_true',
+                      default=False, dest='cache_build_envs',
+                      help='Build the package, and wheels with '
+                      '--prebuild-wheels, without build isolation, in '
+                      'environments with their build requirements that are '
+                      'kept in the cache directory.')
+    parser.add_option('--compiler-cache', type='choice',
+                      choices=['ccache', 'sccache'], metavar='TOOL',
+                      dest='compiler_cache',
+                      help='Compile C and C++ extensions through TOOL, '
+                      'ccache or sccache, keeping its cache in the cache '
+                      'directory, and report its hit rate to '
+                      'debian/<package>.dh-virtualenv-compiler-cache.json.')
+    parser.add_option('--cache-dir', metavar='DIRECTORY',
+                      dest='cache_dir',
+                      help='Directory for caches kept between builds. '
+                      'Defaults to $DH_VIRTUALENV_CACHE_DIR or '
+                      '~/.cache/dh-virtualenv.')
+    parser.add_option('--wheelhouse', action='store_true', default=False,
+                      help='Keep wheels of all installed distributions in '
+                      'the cache directory, and install from there.')
+    parser.add_option('--cache-base-venv', action='store_true', default=False,
+                      dest='cache_base_venv',
+                      help='Create the virtualenv by copying a pristine one '
+                      'kept in the cache directory.')
+    parser.add_option('--seed-from-cache', action='store_true',
+                      default=False, dest='seed_from_cache',
+                      help='With --builtin-venv, install pip, setuptools and '
+                      'wheel from wheels kept in the cache directory, '
+                      'instead of bootstrapping and upgrading pip.')
+    parser.add_option('--fast-launchers', action='store_true', default=False,
+                      dest='fast_launchers',
+                      help='Replace the console scripts installed by pip by '
+                      'minimal launchers calling the entry point directly.')
+    parser.add_option('--consolidate-pth', action='store_true',
+                      default=False, dest='consolidate_pth',
+                      help='Merge the .pth files that only list paths into '
+                      'a single one.')
+    parser.add_option('--relocate', action='store_true', default=False,
+                      help='Replace the build location of the virtualenv by '
+                      'its final location in all text files and symlinks, '
+                      'and report binary files referring to it.')
+    parser.add_option('--compile-bytecode', action='store_true',
+                      default=False, dest='compile_bytecode',
+                      help='Byte-compile the whole virtualenv in parallel '
+                      'after installation, instead of letting pip do it.')
+    parser.add_option('--bytecode-optimize', action='append', type='choice',
+                      choices=['0', '1', '2'], metavar='LEVEL',
+                      dest='bytecode_optimize', default=[],
+                      help='Optimization level to compile bytecode for with '
+                      '--compile-bytecode. Can be given multiple times. '
+                      'Defaults to 0.')
+    parser.add_option('--bytecode-invalidation-mode', type='choice',
+                      choices=['timestamp', 'checked-hash', 'unchecked-hash'],
+                      default='checked-hash', metavar='MODE',
+                      dest='bytecode_invalidation_mode',
+                      help='How Python checks bytecode compiled with '
+                      '--compile-bytecode is up to date: timestamp, '
+                      'checked-hash (default) or unchecked-hash.')
+    parser.add_option('--hardlink-duplicates', action='store_true',
+                      default=False, dest='hardlink_duplicates',
+                      help='Replace identical files in the virtualenv by '
+                      'hardlinks to a single copy.')
+    parser.add_option('--prune', action='append', metavar='RULE',
+                      default=[],
+                      help='Remove files matching RULE from the virtualenv, '
+                      'e.g. "*/tests/" or "*.pyi". Rules prefixed with '
+                      '"strip:" strip debug symbols instead. Can be given '
+                      'multiple times.')
+    parser.add_option('--prune-file', metavar='FILEPATH', dest='prune_file',
+                      help='Read additional --prune rules from FILEPATH, '
+                      'one per line.')
+    parser.add_option('--footprint-report', action='store_true',
+                      default=False, dest='footprint_report',
+                      help='Write the size of each installed distribution to '
+                      'debian/<package>.dh-virtualenv-footprint.json.')
+    parser.add_option('--max-size', metavar='SIZE', type='string',
+                      action='callback', callback=_set_size, dest='max_size',
+                      help='Fail the build if the virtualenv is larger than '
+                      'SIZE bytes. K, M and G suffixes are accepted.')
+    parser.add_option('--import-time-report', action='store_true',
+                      default=False, dest='import_time_report',
+                      help='Write the import time of the modules run by the '
+                      'console scripts of the package to '
+                      'debian/<package>.dh-virtualenv-importtime.json.')
+    parser.add_option('--max-import-time', type='float', metavar='SECONDS',
+                      dest='max_import_time',
+                      help='Fail the build if importing the module of a '
+                      'console script takes longer than SECONDS.')
+    parser.add_option('--benchmark-scripts', action='store_true',
+                      default=False, dest='benchmark_scripts',
+                      help='Measure the cold and warm start-up time of the '
+                      'Python scripts in bin/, and write it to '
+                      'debian/<package>.dh-virtualenv-benchmark.json.')
+    parser.add_option('--benchmark-runs', type='int', default=5, metavar='N',
+                      dest='benchmark_runs',
+                      help='Run each script N times for --benchmark-scripts, '
+                      'both cold and warm. Defaults to 5.')
+    parser.add_option('--benchmark-args', default='--help', metavar='ARGS',
+                      dest='benchmark_args',
+                      help='Arguments to run scripts with for '
+                      '--benchmark-scripts. Defaults to --help.')
+    parser.add_option('--benchmark-timeout', type='float', default=30,
+                      metavar='SECONDS', dest='benchmark_timeout',
+                      help='Kill scripts benchmarked with --benchmark-scripts '
+                      'after SECONDS, and record them as timed out. '
+                      'Defaults to 30.')
+    parser.add_option('--timings-report', action='store_true', default=False,
+                      dest='timings_report',
+                      help='Write the time and resources used by each build '
+                      'phase to debian/<package>.dh-virtualenv-timings.json.')
+    parser.add_option('--incremental', action='store_true', default=False,
+                      help='Reuse the virtualenv of an earlier build if its '
+                      'requirements, arguments, interpreter and source tree '
+                      'are unchanged, and only redo the final fix-ups.')
+    parser.add_option('--pip-timeline-report', action='store_true',
+                      default=False, dest='pip_timeline_report',
+                      help='Write the time pip spent resolving, downloading, '
+                      'building and installing each distribution to '
+                      'debian/<package>.dh-virtualenv-pip-timeline.json.')
     parser.add_option('--setuptools-test',
                       dest='setuptools_test',
                       default=False,
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Run compilers through ccache or sccache, and measure how much that
+saves.
+
+The compilers are wrapped by a small script, which logs how long each
+compilation takes and, with ccache, whether it was a hit or a miss.
+This estimates the time saved: hits would have taken as long as the
+misses did, on average.
+"""
+from __future__ import absolute_import
+
+import json
+import os
+import shlex
+
+TOOLS = ('ccache', 'sccache')
+# Compilers of the interpreter's build configuration, used by setuptools
+# unless overridden in the environment
+COMPILER_VARS = ('CC', 'CXX', 'LDSHARED')
+_WRAPPER_TEMPLATE = '''\
+#!/bin/sh
+# Generated by dh-virtualenv: compile with {tool}, and log how long it took
+# and what ccache counted it as
+stats={log}.$$
+start=$(date +%s.%N)
+CCACHE_STATSLOG=$stats {tool} "$@"
+status=$?
+end=$(date +%s.%N)
+counters=$(grep -v '^#' "$stats" 2>/dev/null | tr '\\n' ' ')
+rm -f "$stats"
+echo "$start $end $counters" >>{log}
+exit $status
+'''
+
+
+def write_wrapper(path, tool, log_path):
+    """Write the compiler wrapper running ``tool`` to ``path``."""
+    with open(path, 'w') as fh:
+        fh.write(_WRAPPER_TEMPLATE.format(tool=shlex.quote(tool),
+                                          log=shlex.quote(log_path)))
+    os.chmod(path, 0o755)
+
+
+def is_wrapped(command):
+    """Check whether a compiler command already runs through a cache."""
+    words = command.split()
+    return bool(words) and os.path.basename(words[0]) in TOOLS
+
+
+def tool_env(tool, cache_dir, basedir):
+    """Return the environment variables configuring ``tool`` to keep
+    its cache in ``cache_dir``, and to hash paths below ``basedir``
+    relative to the working directory, so hits do not depend on where
+    the sources were unpacked.
+    """
+    if tool == 'ccache':
+        return {
+            'CCACHE_DIR': cache_dir,
+            'CCACHE_BASEDIR': basedir,
+            # The working directory only matters for debug information
+            'CCACHE_NOHASHDIR': '1',
+        }
+    return {
+        'SCCACHE_DIR': cache_dir,
+        'SCCACHE_BASEDIRS': basedir,
+    }
+
+
+def stats_command(tool):
+    """Return the arguments printing the statistics of ``tool``."""
+    if tool == 'ccache':
+        return ['--print-stats']
+    return ['--show-stats', '--stats-format=json']
+
+
+def parse_stats(tool, output):
+    """Return the ``(hits, misses)`` counted by ``tool``, from the
+    output of :func:`stats_command`.
+    """
+    if tool == 'ccache':
+        counters = {}
+        for line in output.splitlines():
+            key, _, value = line.partition('\t')
+            if value.strip().isdigit():
+                counters[key.strip()] = int(value)
+        return (counters.get('direct_cache_hit', 0) +
+                counters.get('preprocessed_cache_hit', 0),
+                counters.get('cache_miss', 0))
+
+    stats = json.loads(output).get('stats', {})
+    return tuple(
+        sum(stats.get(key, {}).get('counts', {}).values())
+        for key in ('cache_hits', 'cache_misses'))
+
+
+def _outcome(counters):
+    if any(counter.endswith('cache_hit') for counter in counters):
+        return 'hit'
+    if 'cache_miss' in counters:
+        return 'miss'
+    return None
+
+
+def read_compilations(log_path):
+    """Return ``(seconds, outcome)`` for the compilations logged by the
+    wrapper, where the outcome is ``'hit'``, ``'miss'``, or None if the
+    tool did not tell (sccache, and ccache versions without the
+    ``stats_log`` setting), or the compilation was not cacheable.
+    """
+    compilations = []
+    try:
+        with open(log_path) as fh:
+            for line in fh:
+                words = line.split()
+                try:
+                    start, end = float(words[0]), float(words[1])
+                except (ValueError, IndexError):
+                    continue
+                compilations.append((max(0.0, end - start),
+                                     _outcome(words[2:])))
+    except (IOError, OSError):
+        pass
+    return compilations
+
+
+def summarize(before, after, compilations):
+    """Summarize a build from the ``(hits, misses)`` the tool counted
+    before and after it, and its :func:`read_compilations`.
+
+    If the outcome of the compilations is known, hits and misses are
+    counted from those, so only this build is taken into account.
+    Otherwise, they are the difference of the tool's counters, which
+    include any other build using the same cache at the same time, and
+    the time saved is not estimated.
+    """
+    hit_seconds = [seconds for seconds, outcome in compilations
+                   if outcome == 'hit']
+    miss_seconds = [seconds for seconds, outcome in compilations
+                    if outcome == 'miss']
+    if hit_seconds or miss_seconds:
+        scope = 'build'
+        hits, misses = len(hit_seconds), len(miss_seconds)
+    else:
+        scope = 'cache'
+        hits, misses = after[0] - before[0], after[1] - before[1]
+    saved_seconds = None
+    if miss_seconds:
+        average_miss = sum(miss_seconds) / len(miss_seconds)
+        saved_seconds = round(hits * average_miss - sum(hit_seconds), 3)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+        'counted_for': scope,
+        'compilations': len(compilations),
+        'compile_seconds': round(sum(seconds for seconds, _ in compilations), 3),
+        'saved_seconds': saved_seconds,
+    }
@@ -17,16 +17,219 @@
 # along with dh-virtualenv. If not, see
 # <http://www.gnu.org/licenses/>.
 
+import collections
+import fnmatch
+import hashlib
+import json
+import logging
+import mmap
 import os
+import pathlib
 import re
+import shlex
 import shutil
+import stat
 import subprocess
 import tempfile
 
+from concurrent.futures import ThreadPoolExecutor
+
+from . import (buildenv, cache, compilercache, installer, lockfile, metadata,
+               piplog, profiling, scheduler, simpleindex)
+from ._version import version
+from .timing import PhaseTimer
+from .wheelhouse import (Wheelhouse, parse_pins, parse_sdist_filename,
+                         parse_wheel_filename, requirements_key)
+
+log = logging.getLogger(__name__)
+
 ROOT_ENV_KEY = 'DH_VIRTUALENV_INSTALL_ROOT'
+CACHE_ENV_KEY = 'DH_VIRTUALENV_CACHE_DIR'
 DEFAULT_INSTALL_DIR = '/opt/venvs/'
 PYTHON_INTERPRETERS = ['python', 'pypy', 'ipy', 'jython']
-_PYTHON_INTERPRETERS_REGEX = r'\(' + r'\|'.join(PYTHON_INTERPRETERS) + r'\)'
+_PYTHON_INTERPRETERS_REGEX = '(?:' + '|'.join(PYTHON_INTERPRETERS) + ')'
+# Patterns recognizing (and rewriting) the interpreter of a script, both
+# in plain shebangs, and in the "'''exec'" line pip uses for long paths.
+_SHEBANG_RE = re.compile(
+    r'^#!(?:{0}|.*bin/(?:env )?{0}"?)'.format(_PYTHON_INTERPRETERS_REGEX).encode())
+_EXEC_RE = re.compile(
+    r"^'''exec.*bin/{0}".format(_PYTHON_INTERPRETERS_REGEX).encode())
+_EXEC_REWRITE_RE = re.compile(
+    r"^'''exec'.*bin/{0}".format(_PYTHON_INTERPRETERS_REGEX).encode())
+# Shebangs are short, and the "'''exec'" line is the second one
+_SCRIPT_HEADER_SIZE = 4096
+# Environment variables that could point pip to the network
+_PIP_NETWORK_ENV = ('PIP_INDEX_URL', 'PIP_EXTRA_INDEX_URL', 'PIP_FIND_LINKS',
+                    'PIP_TRUSTED_HOST', 'PIP_PROXY', 'NO_PROXY', 'no_proxy')
+# A proxy nobody listens on, to make any network access fail right away
+_OFFLINE_PROXY = 'http://127.0.0.1:9'
+_STARTUP_RUNS = 10
+# Source tree entries that do not affect what gets installed
+_FINGERPRINT_EXCLUDE_DIRS = frozenset([
+    '.bzr', '.eggs', '.git', '.hg', '.pybuild', '.svn', '.tox', '__pycache__',
+    'build', 'debian', 'dist',
+])
+# Number of distributions listed when logging the footprint, and
+# of modules per entry point in the import time report
+_FOOTPRINT_TOP = 10
+_IMPORT_TIME_TOP = 20
+# First pip with ``pip install --report``
+_PIP_REPORT_VERSION = (22, 2)
+# Distributions whose entry points are tools of the virtualenv itself
+_TOOLING_DISTRIBUTIONS = frozenset(['pip', 'setuptools', 'wheel'])
+_INTERPRETER_TAG_SCRIPT = (
+    'import platform, sys, sysconfig; '
+    'print("%s-%d%d%s-%s" % (platform.python_implementation().lower(), '
+    'sys.version_info[0], sys.version_info[1], getattr(sys, "abiflags", ""), '
+    'sysconfig.get_platform()))'
+)
+_COMPILER_VARS_SCRIPT = (
+    'import json, sysconfig; '
+    'print(json.dumps(dict((key, sysconfig.get_config_var(key) or "") '
+    'for key in {0!r})))'.format(compilercache.COMPILER_VARS)
+)
+# Asks a PEP 517 build backend (sys.argv[1], found on the backend path in
+# sys.argv[2]) for the requirements to build a wheel, written to sys.argv[3]
+_BUILD_REQUIRES_SCRIPT = (
+    'import functools, importlib, json, os, sys; '
+    'name, path, output = sys.argv[1:4]; '
+    'sys.path[:0] = [os.path.abspath(p) for p in json.loads(path)]; '
+    'module, _, attrs = name.partition(":"); '
+    'backend = functools.reduce(getattr, [a for a in attrs.strip().split(".") '
+    'if a], importlib.import_module(module.strip())); '
+    'hook = getattr(backend, "get_requires_for_build_wheel", None); '
+    'requires = hook({}) if hook else []; '
+    'json.dump(requires, open(output, "w"))'
+)
+# Where the builtin installer puts the parts of a wheel, like pip does
+_SCHEME_SCRIPT = (
+    'import json, os, sys, sysconfig; '
+    'paths = sysconfig.get_paths(); '
+    'print(json.dumps({"purelib": paths["purelib"], '
+    '"platlib": paths["platlib"], "scripts": paths["scripts"], '
+    '"data": paths["data"], "headers": os.path.join(sys.prefix, "include", '
+    '"site", "python%d.%d" % sys.version_info[:2])}))'
+)
+
+
+def default_cache_dir():
+    """Return the directory used for caches kept between builds."""
+    cache_dir = os.environ.get(CACHE_ENV_KEY)
+    if not cache_dir:
+        cache_dir = os.path.join(
+            os.environ.get('XDG_CACHE_HOME') or '~/.cache', 'dh-virtualenv')
+    return os.path.expanduser(cache_dir)
+
+
+def _atomic_write(path, content):
+    """Replace the contents of ``path``, keeping its permissions."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(content)
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def _tree_size(path):
+    """Total size of the regular files below ``path``."""
+    if os.path.islink(path):
+        return 0
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            st = os.lstat(os.path.join(root, f))
+            if stat.S_ISREG(st.st_mode):
+                size += st.st_size
+    return size
+
+
+def _bytecode_source(path):
+    """Return the source file a ``__pycache__`` entry was compiled from."""
+    cache_dir, filename = os.path.split(path)
+    if os.path.basename(cache_dir) != '__pycache__':
+        return None
+    return os.path.join(os.path.dirname(cache_dir),
+                        filename.split('.', 1)[0] + '.py')
+
+
+def _pth_entries(path):
+    """Return the lines of a ``.pth`` file that ``site`` would treat as
+    path entries, or None if the file runs code (or cannot be read the
+    way ``site`` would).
+    """
+    entries = []
+    try:
+        with open(path, encoding='utf-8') as fh:
+            for line in fh:
+                if line.startswith('#') or not line.strip():
+                    continue
+                if line.startswith(('import ', 'import\t')):
+                    return None
+                entries.append(line.rstrip())
+    except (IOError, OSError, UnicodeDecodeError):
+        return None
+    return entries
+
+
+def parse_prune_rules(lines):
+    """Return the prune rules in ``lines``, skipping blank lines and
+    ``#`` comments.
+    """
+    rules = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            rules.append(line)
+    return rules
+
+
+def _count(buf, needle):
+    """Count the occurrences of ``needle`` in a buffer like ``mmap``,
+    which lacks ``count()``."""
+    count = 0
+    position = buf.find(needle)
+    while position != -1:
+        count += 1
+        position = buf.find(needle, position + len(needle))
+    return count
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _version_tuple(text):
+    """Turn the leading release numbers of a version string into a
+    tuple of ints, e.g. ``(22, 2)`` for ``22.2b1``.
+    """
+    numbers = []
+    for part in text.split('.'):
+        match = re.match(r'\d+', part)
+        if match is None:
+            break
+        numbers.append(int(match.group()))
+        if match.end() < len(part):
+            break
+    return tuple(numbers)
+
+
+def virtualenv_install_dir(package, install_suffix=None):
+    """Location the virtualenv of ``package`` is installed to."""
+    install_root = os.environ.get(ROOT_ENV_KEY, DEFAULT_INSTALL_DIR)
+    if install_suffix is None:
+        return os.path.join(install_root, package)
+    return os.path.join(install_root, install_suffix)
 
 
 class Deployment(object):
@@ -50,6 +253,39 @@ class Deployment(object):
                  install_suffix=None,
                  requirements_filename='requirements.txt',
                  upgrade_pip_to='',
+                 cache_dir=None,
+                 wheelhouse=False,
+                 cache_base_venv=False,
+                 compile_bytecode=False,
+                 bytecode_optimize=[],
+                 bytecode_invalidation_mode='checked-hash',
+                 hardlink_duplicates=False,
+                 requirements_lock=None,
+                 incremental=False,
+                 prune=[],
+                 prune_file=None,
+                 footprint_report=False,
+                 max_size=None,
+                 import_time_report=False,
+                 max_import_time=None,
+                 benchmark_scripts=False,
+                 benchmark_runs=5,
+                 benchmark_args='--help',
+                 benchmark_timeout=30,
+                 fast_launchers=False,
+                 consolidate_pth=False,
+                 relocate=False,
+                 pip_timeline_report=False,
+                 offline=None,
+                 prebuild_wheels=False,
+                 prebuild_jobs=None,
+                 installer='pip',
+                 schedule_builds=False,
+                 build_job_memory=None,
+                 concurrent_builds=1,
+                 compiler_cache=None,
+                 cache_build_envs=False,
+                 seed_from_cache=False,
         ):
 
         self.package = package
@@ -59,11 +295,11 @@ class Deployment(object):
         self.debian_root = os.path.join(
             'debian', package, install_root.lstrip('/'))
 
+        self.virtualenv_install_dir = virtualenv_install_dir(
+            package, install_suffix)
         if install_suffix is None:
-            self.virtualenv_install_dir = os.path.join(install_root, self.package)
             self.package_dir = os.path.join(self.debian_root, package)
         else:
-            self.virtualenv_install_dir = os.path.join(install_root, install_suffix)
             self.package_dir = os.path.join(self.debian_root, install_suffix)
 
         self.bin_dir = os.path.join(self.package_dir, 'bin')
@@ -75,6 +311,7 @@ class Deployment(object):
         self.upgrade_pip_to = upgrade_pip_to
         self.extra_virtualenv_arg = extra_virtualenv_arg
         self.log_file = tempfile.NamedTemporaryFile()
+        self.timings = PhaseTimer()
         self.verbose = verbose
         self.setuptools = setuptools
         self.python = python
@@ -83,6 +320,63 @@ class Deployment(object):
         self.use_system_packages = use_system_packages
         self.skip_install = skip_install
         self.requirements_filename = requirements_filename
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.use_wheelhouse = wheelhouse
+        self.cache_base_venv = cache_base_venv
+        self.compile_bytecode = compile_bytecode
+        self.bytecode_optimize = bytecode_optimize or [0]
+        self.bytecode_invalidation_mode = bytecode_invalidation_mode
+        self.hardlink_duplicates = hardlink_duplicates
+        self.requirements_lock = requirements_lock
+        self.incremental = incremental
+        self.prune_rules = list(prune)
+        self.prune_file = prune_file
+        self.footprint_report = footprint_report
+        self.max_size = max_size
+        self.import_time_report = import_time_report
+        self.max_import_time = max_import_time
+        self.benchmark_scripts = benchmark_scripts
+        self.benchmark_runs = benchmark_runs
+        self.benchmark_args = shlex.split(benchmark_args)
+        self.benchmark_timeout = benchmark_timeout
+        self.fast_launchers = fast_launchers
+        self.consolidate_pth = consolidate_pth
+        self.relocate = relocate
+        self.pip_timeline_report = pip_timeline_report
+        self.pip_timeline = []
+        self.offline = offline
+        self.prebuild = prebuild_wheels
+        self.prebuild_jobs = prebuild_jobs or os.cpu_count() or 1
+        self._prebuild_dir = None
+        self.builtin_installer = installer == 'builtin'
+        self.schedule_builds = schedule_builds
+        self.build_job_memory = build_job_memory or scheduler.DEFAULT_JOB_MEMORY
+        self.concurrent_builds = concurrent_builds
+        self.build_jobs = None
+        self.compiler_cache = compiler_cache
+        self._compiler_cache_tool = None
+        self._compiler_cache_tmp = None
+        self._compiler_cache_stats = None
+        self.cache_build_envs = cache_build_envs
+        if cache_build_envs and buildenv.tomllib is None:
+            log.warning('%s: Cannot read pyproject.toml without tomli, build '
+                        'environments are not cached', package)
+            self.cache_build_envs = False
+        self.build_env_cache = None
+        self.seed_from_cache = seed_from_cache and builtin_venv
+        if seed_from_cache and not builtin_venv:
+            log.warning('%s: Seeding from the cache needs --builtin-venv, '
+                        'virtualenv seeds from its own cache', package)
+        self.pip_env = None
+        self._offline_index = None
+        self.pip_report_file = None
+        self._requirements_path = None
+        self.wheelhouse = None
+        self._wheelhouse_key = None
+        # Only for installing the requirements, see setup_wheelhouse()
+        self._requirements_index_args = []
+        self._requirement_pins = None
+        self._interpreter_tag = None
 
         # We need to prefix the pip run with the location of python
         # executable. Otherwise it would just blow up due to too long
@@ -95,12 +389,36 @@ class Deployment(object):
         if self.verbose:
             self.pip_args.append('-v')
 
+        if self.offline:
+            # Populated by setup_offline_index()
+            self._offline_index = tempfile.TemporaryDirectory(
+                prefix='dh-virtualenv-index-')
+            index_url = pathlib.Path(self._offline_index.name).as_uri()
+            extra_urls = []
+            self.pip_env = dict((key, value) for key, value in os.environ.items()
+                                if key not in _PIP_NETWORK_ENV)
+            self.pip_env.update({
+                'PIP_CONFIG_FILE': os.devnull,
+                'PIP_DISABLE_PIP_VERSION_CHECK': '1',
+                'PIP_NO_INPUT': '1',
+                'PIP_RETRIES': '0',
+            })
+            for key in ('http_proxy', 'https_proxy', 'HTTP_PROXY',
+                        'HTTPS_PROXY', 'ALL_PROXY', 'all_proxy'):
+                self.pip_env[key] = _OFFLINE_PROXY
+
+        self.pip_index_args = []
         if index_url:
-            self.pip_args.append('--index-url={0}'.format(index_url))
-        self.pip_args.extend([
+            self.pip_index_args.append('--index-url={0}'.format(index_url))
+        self.pip_index_args.extend([
             '--extra-index-url={0}'.format(url) for url in extra_urls
         ])
-        self.pip_args.append('--log={0}'.format(os.path.abspath(self.log_file.name)))
+        self.pip_args.extend(self.pip_index_args)
+        self.pip_log_arg = '--log={0}'.format(os.path.abspath(self.log_file.name))
+        self.pip_args.append(self.pip_log_arg)
+        if self.compile_bytecode:
+            # Everything gets compiled in one go later on
+            self.pip_args.append('--no-compile')
         # Keep a copy with well-supported options only (for upgrading pip itself)
         self.pip_upgrade_args = self.pip_args[:]
         # Add in any user supplied pip args
@@ -128,12 +446,169 @@ class Deployment(object):
                    install_suffix=options.install_suffix,
                    requirements_filename=options.requirements_filename,
                    upgrade_pip_to=options.upgrade_pip_to,
+                   cache_dir=options.cache_dir,
+                   wheelhouse=options.wheelhouse,
+                   cache_base_venv=options.cache_base_venv,
+                   compile_bytecode=options.compile_bytecode,
+                   bytecode_optimize=options.bytecode_optimize,
+                   bytecode_invalidation_mode=options.bytecode_invalidation_mode,
+                   hardlink_duplicates=options.hardlink_duplicates,
+                   requirements_lock=options.requirements_lock,
+                   incremental=options.incremental,
+                   prune=options.prune,
+                   prune_file=options.prune_file,
+                   footprint_report=options.footprint_report,
+                   max_size=options.max_size,
+                   import_time_report=options.import_time_report,
+                   max_import_time=options.max_import_time,
+                   benchmark_scripts=options.benchmark_scripts,
+                   benchmark_runs=options.benchmark_runs,
+                   benchmark_args=options.benchmark_args,
+                   benchmark_timeout=options.benchmark_timeout,
+                   fast_launchers=options.fast_launchers,
+                   consolidate_pth=options.consolidate_pth,
+                   relocate=options.relocate,
+                   pip_timeline_report=options.pip_timeline_report,
+                   offline=options.offline,
+                   prebuild_wheels=options.prebuild_wheels,
+                   prebuild_jobs=options.prebuild_jobs,
+                   installer=options.installer,
+                   schedule_builds=options.schedule_builds,
+                   build_job_memory=options.build_job_memory,
+                   # Set by bin/dh_virtualenv, from --jobs and the packages
+                   concurrent_builds=getattr(options, 'concurrent_builds', 1),
+                   compiler_cache=options.compiler_cache,
+                   cache_build_envs=options.cache_build_envs,
+                   seed_from_cache=options.seed_from_cache,
                   )
 
     def clean(self):
         shutil.rmtree(self.debian_root)
 
-    def create_virtualenv(self):
+    def report_path(self, name):
+        """Location of the report called ``name`` for this package."""
+        return os.path.join(
+            'debian', '{0}.dh-virtualenv-{1}.json'.format(self.package, name))
+
+    def write_report(self, name, data):
+        """Write ``data`` as the JSON report called ``name``."""
+        data = dict(data, package=self.package)
+        with open(self.report_path(name), 'w') as fh:
+            json.dump(data, fh, indent=2, sort_keys=True)
+            fh.write('\n')
+
+    def fingerprint_path(self):
+        """Location of the fingerprint of the last successful build.
+
+        It is kept beside the package build directory rather than in it,
+        so it never ends up in the binary package.
+        """
+        return os.path.join(
+            'debian', '{0}.dh-virtualenv-fingerprint'.format(self.package))
+
+    def fingerprint(self):
+        """Hash everything that determines the contents of the
+        virtualenv before the fix-up steps: the requirements, preinstall
+        and extras, the pip and virtualenv arguments, the interpreter
+        binary, the source tree (minus ``debian/``, VCS metadata and
+        build artifacts), and the distribution files of ``offline``.
+        """
+        digest = hashlib.sha256()
+
+        def add(*parts):
+            for part in parts:
+                digest.update(str(part).encode('utf-8') + b'\0')
+
+        add('dh-virtualenv', version, self.virtualenv_install_dir)
+        add('virtualenv', *self.virtualenv_command())
+        # The --log argument and the offline index name fresh temporary
+        # files on every run, the offline files are hashed below instead
+        volatile = set([self.pip_log_arg])
+        if self._offline_index is not None:
+            volatile.add('--index-url={0}'.format(
+                pathlib.Path(self._offline_index.name).as_uri()))
+        add('pip', self.pip_prefix[1], *(arg for arg in self.pip_args
+                                           if arg not in volatile))
+        add('installer', self.builtin_installer)
+        add('preinstall', *self.preinstall)
+        add('extras', *self.extras)
+        add('upgrade-pip', self.upgrade_pip, self.upgrade_pip_to)
+        add('skip-install', self.skip_install)
+
+        requirements_path = os.path.join(self.sourcedirectory,
+                                         self.requirements_filename)
+        if os.path.exists(requirements_path):
+            add('requirements', _file_digest(requirements_path))
+
+        interpreter = shutil.which(self.python or 'python3')
+        if interpreter:
+            add('interpreter', _file_digest(os.path.realpath(interpreter)))
+
+        lock_path = None
+        if self.requirements_lock:
+            # Written by the build itself, and derived from requirements
+            lock_path = os.path.normpath(
+                os.path.join(self.sourcedirectory, self.requirements_lock))
+        for root, dirs, files in os.walk(self.sourcedirectory):
+            dirs[:] = sorted(d for d in dirs
+                             if d not in _FINGERPRINT_EXCLUDE_DIRS
+                             and not d.endswith('.egg-info'))
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                if os.path.normpath(path) == lock_path:
+                    continue
+                relpath = os.path.relpath(path, self.sourcedirectory)
+                if os.path.islink(path):
+                    add('link', relpath, os.readlink(path))
+                elif os.path.isfile(path):
+                    add('file', relpath, _file_digest(path))
+
+        if self.offline:
+            add('offline', os.path.abspath(self.offline))
+            for root, dirs, files in os.walk(self.offline):
+                dirs.sort()
+                for filename in sorted(files):
+                    path = os.path.join(root, filename)
+                    if os.path.isfile(path):
+                        add('offline-file',
+                            os.path.relpath(path, self.offline),
+                            _file_digest(path))
+        return digest.hexdigest()
+
+    def previous_fingerprint(self):
+        """Return the fingerprint of the virtualenv left behind by an
+        earlier build, or None if there is no such virtualenv.
+        """
+        if not os.path.isdir(self.package_dir):
+            return None
+        try:
+            with open(self.fingerprint_path()) as fh:
+                return fh.read().strip()
+        except (IOError, OSError):
+            return None
+
+    def forget_fingerprint(self):
+        """Drop the fingerprint, so an interrupted build is never
+        mistaken for an up to date one.
+        """
+        if os.path.exists(self.fingerprint_path()):
+            os.unlink(self.fingerprint_path())
+
+    def discard_virtualenv(self):
+        """Remove the virtualenv left behind by an earlier build, so
+        distributions dropped from the requirements since do not linger.
+        """
+        if os.path.lexists(self.package_dir):
+            shutil.rmtree(self.package_dir)
+
+    def save_fingerprint(self, fingerprint):
+        _atomic_write(self.fingerprint_path(),
+                      (fingerprint + '\n').encode('utf-8'))
+
+    def virtualenv_command(self):
+        """Return the command creating the virtualenv, without the
+        target directory.
+        """
         # Specify interpreter and virtual environment options
         if self.builtin_venv:
             virtualenv = [self.python, '-m', 'venv']
@@ -141,6 +616,9 @@ class Deployment(object):
             if self.use_system_packages:
                 virtualenv.append('--system-site-packages')
 
+            if self.seed_from_cache:
+                virtualenv.append('--without-pip')
+
         else:
             virtualenv = ['virtualenv']
 
@@ -160,9 +638,23 @@ class Deployment(object):
         if self.extra_virtualenv_arg:
             virtualenv.extend(self.extra_virtualenv_arg)
 
-        virtualenv.append(self.package_dir)
+        return virtualenv
+
+    def create_virtualenv(self):
+        virtualenv = self.virtualenv_command()
+        if self.cache_base_venv:
+            self.clone_base_virtualenv(self.base_virtualenv(virtualenv))
+        else:
+            self._run_virtualenv(virtualenv, self.package_dir)
+
+    def _run_virtualenv(self, virtualenv, target):
+        virtualenv = virtualenv + [target]
         subprocess.check_call(virtualenv)
 
+        if self.seed_from_cache:
+            self.seed_virtualenv(target)
+            return
+
         # Due to Python bug https://bugs.python.org/issue24875
         # venv doesn't bootstrap pip/setuptools in the virtual
         # environment with --system-site-packages .
@@ -172,34 +664,703 @@ class Deployment(object):
             virtualenv.append('--system-site-packages')
             subprocess.check_call(virtualenv)
 
+    def base_virtualenv(self, virtualenv):
+        """Return the cache entry holding a pristine virtualenv created by
+        the ``virtualenv`` command, creating it if necessary.
+
+        Entries are keyed by the command line and the identity of the
+        executables it refers to, so an interpreter update creates a new
+        entry. Each entry has the virtualenv itself in ``venv``, and the
+        path it was originally created at in ``origin``.
+        """
+        digest = hashlib.sha256()
+        if self.seed_from_cache:
+            virtualenv = virtualenv + self.seed_requirements()
+        for arg in virtualenv:
+            digest.update(str(arg).encode('utf-8') + b'\0')
+            executable = shutil.which(arg) if arg else None
+            if executable:
+                executable = os.path.realpath(executable)
+                st = os.stat(executable)
+                digest.update('{0}:{1}:{2}\0'.format(
+                    executable, st.st_size, st.st_mtime).encode('utf-8'))
+        entry = os.path.join(self.cache_dir, 'venvs', digest.hexdigest())
+        if os.path.isdir(entry):
+            return entry
+
+        with cache.entry(entry) as building:
+            origin = os.path.join(building, 'venv')
+            self._run_virtualenv(virtualenv, origin)
+            with open(os.path.join(building, 'origin'), 'w') as fh:
+                fh.write(origin)
+        return entry
+
+    def seed_requirements(self):
+        """Return the requirements of the wheels seeding the virtualenv:
+        pip, in the version asked for by ``upgrade_pip_to``, setuptools
+        and wheel.
+        """
+        if self.upgrade_pip_to and self.upgrade_pip_to != 'latest':
+            pip = 'pip==' + self.upgrade_pip_to
+        else:
+            pip = 'pip'
+        return [pip, 'setuptools', 'wheel']
+
+    def seed_wheels(self, python=None):
+        """Return the cache directory with the wheels of
+        :meth:`seed_requirements` for the interpreter ``python``,
+        downloading them first if needed.
+
+        Directories are keyed by the interpreter tag and the
+        requirements, so they are only downloaded again for another
+        interpreter, or when a different version of pip is asked for.
+        Unpinned requirements (including pip for ``upgrade_pip``) stay at
+        the versions downloaded first, which are recorded in a
+        ``requirements.txt``. pip is bootstrapped in a throwaway
+        virtualenv to download them.
+        """
+        requirements = self.seed_requirements()
+        seed_dir = os.path.join(self.cache_dir, 'seed',
+                                self.interpreter_tag(python),
+                                requirements_key(*requirements))
+        if os.path.isdir(seed_dir):
+            return seed_dir
+
+        log.info('%s: Downloading %s to seed virtualenvs', self.package,
+                 ', '.join(requirements))
+        with cache.entry(seed_dir) as wheel_dir, \
+                tempfile.TemporaryDirectory(
+                    prefix='dh-virtualenv-bootstrap-') as bootstrap:
+            subprocess.check_call([self.python, '-m', 'venv', bootstrap])
+            if self.offline:
+                self.setup_offline_index()
+            self._run_pip([
+                os.path.join(bootstrap, 'bin', 'python'), '-m', 'pip',
+                'download', '--only-binary=:all:', '--no-deps',
+                '--dest', wheel_dir] + self._find_links_args() +
+                self.pip_index_args + [self.pip_log_arg] + requirements,
+                'seed')
+            pins = sorted(parse_wheel_filename(filename)
+                          for filename in os.listdir(wheel_dir)
+                          if filename.endswith('.whl'))
+            with open(os.path.join(wheel_dir, 'requirements.txt'), 'w') as fh:
+                fh.writelines('{0}=={1}\n'.format(*pin) for pin in pins)
+        return seed_dir
+
+    def seed_virtualenv(self, target):
+        """Install the cached seed wheels pinned in the ``requirements.txt``
+        of :meth:`seed_wheels` into the virtualenv at ``target``, created
+        without pip, with the builtin installer.
+        """
+        python = os.path.abspath(os.path.join(target, 'bin', 'python'))
+        seed_dir = self.seed_wheels(python)
+        with open(os.path.join(seed_dir, 'requirements.txt')) as fh:
+            pins = parse_pins(fh)
+        wheels = dict((parse_wheel_filename(filename),
+                       os.path.join(seed_dir, filename))
+                      for filename in sorted(os.listdir(seed_dir))
+                      if filename.endswith('.whl'))
+        log.info('%s: Seeding the virtualenv with %s', self.package,
+                 ', '.join('{0}=={1}'.format(*pin) for pin in pins))
+        installer.install_wheels([wheels[pin] for pin in pins],
+                                 self.install_scheme(python), python)
+
+    def clone_base_virtualenv(self, entry):
+        """Populate ``package_dir`` from a cached base virtualenv.
+
+        Files are copied with ``cp --reflink=auto``, which shares their
+        data blocks on copy-on-write file systems. Hardlinks are not an
+        option, since later steps rewrite some files in place. Absolute
+        paths to the cached copy in ``bin/`` and ``pyvenv.cfg`` are then
+        pointed at the build location.
+        """
+        with open(os.path.join(entry, 'origin')) as fh:
+            origin = fh.read()
+        if not os.path.isdir(self.package_dir):
+            os.makedirs(self.package_dir)
+        subprocess.check_call([
+            'cp', '-a', '--reflink=auto',
+            os.path.join(entry, 'venv', '.'), self.package_dir])
+
+        paths = [os.path.join(self.package_dir, 'pyvenv.cfg')]
+        if os.path.isdir(self.bin_dir):
+            paths.extend(os.path.join(self.bin_dir, f)
+                         for f in sorted(os.listdir(self.bin_dir)))
+        old = origin.encode('utf-8')
+        new = os.path.abspath(self.package_dir).encode('utf-8')
+        for path in paths:
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as fh:
+                content = fh.read()
+            if old in content:
+                _atomic_write(path, content.replace(old, new))
+
     def venv_bin(self, binary_name):
         return os.path.abspath(os.path.join(self.bin_dir, binary_name))
 
+    def interpreter_tag(self, python=None):
+        """Identify the virtualenv's interpreter implementation, ABI and
+        platform, e.g. ``cpython-311-linux-x86_64``. Used to key caches.
+        ``python`` is an interpreter to ask instead, if the virtualenv
+        does not exist yet.
+        """
+        if self._interpreter_tag is None:
+            output = subprocess.check_output(
+                [python or self.venv_bin('python'), '-c',
+                 _INTERPRETER_TAG_SCRIPT])
+            self._interpreter_tag = output.decode('utf-8').strip()
+        return self._interpreter_tag
+
+    def installed_pins(self):
+        """Return ``(name, version)`` for everything in the virtualenv."""
+        output = subprocess.check_output(
+            self.pip_preinstall_prefix + ['freeze', '--all'])
+        return parse_pins(output.decode('utf-8').splitlines())
+
     def pip_preinstall(self, *args):
         return self.pip_preinstall_prefix + self.pip_args + list(args)
 
     def pip(self, *args):
         return self.pip_prefix + self.pip_args + list(args)
 
+    def setup_offline_index(self):
+        """Generate the simple index pip uses in offline mode from the
+        distribution files in the ``offline`` directory.
+        """
+        count = simpleindex.build_index(self.offline, self._offline_index.name)
+        log.info('%s: Serving %d projects from %s', self.package, count,
+                 self.offline)
+
+    def _run_pip(self, cmd, label, **kwargs):
+        """Run a pip command, and add what it logged to ``pip_timeline``
+        with ``pip_timeline_report``.
+        """
+        offset = None
+        if self.pip_timeline_report:
+            try:
+                offset = os.path.getsize(self.log_file.name)
+            except OSError:
+                pass
+        if self.pip_env is not None:
+            kwargs.setdefault('env', self.pip_env)
+        try:
+            subprocess.check_call(cmd, **kwargs)
+        finally:
+            if offset is not None:
+                self._record_pip_timeline(offset, label)
+
+    def _record_pip_timeline(self, offset, label):
+        # Only a report, so it must never hide whether pip failed
+        try:
+            with open(self.log_file.name, 'rb') as fh:
+                fh.seek(offset)
+                lines = fh.read().decode('utf-8', 'replace').splitlines()
+            timeline = piplog.parse_log(lines)
+        except Exception:
+            log.warning('%s: Could not parse the pip log of %s', self.package,
+                        label, exc_info=True)
+            return
+        timeline['label'] = label
+        self.pip_timeline.append(timeline)
+
+    def schedule_build_jobs(self):
+        """Decide how many compiler processes the builds started by pip
+        may run, from the CPUs, the available memory (``build_job_memory``
+        per process), ``parallel=N`` in ``DEB_BUILD_OPTIONS``, and the
+        number of packages built concurrently, and set the environment
+        variables of the common build tools accordingly.
+
+        Wheels built in parallel by :meth:`prebuild_wheels` share those
+        processes, so there are no more of them than processes either.
+        """
+        cpus = scheduler.available_cpus()
+        memory = scheduler.available_memory()
+        parallel = scheduler.parallel_option(
+            os.environ.get('DEB_BUILD_OPTIONS', ''))
+        self.build_jobs = scheduler.compile_jobs(
+            cpus, memory, self.build_job_memory, parallel,
+            self.concurrent_builds)
+        self.prebuild_jobs = min(self.prebuild_jobs, self.build_jobs)
+
+        env = dict(os.environ if self.pip_env is None else self.pip_env)
+        settings = scheduler.build_env(self.build_jobs,
+                                       env.get('MAKEFLAGS', ''))
+        env.update(settings)
+        self.pip_env = env
+        log.info('%s: Compiling with up to %d jobs (%d CPUs, %s MiB '
+                 'available, parallel=%s, %d concurrent builds): %s',
+                 self.package, self.build_jobs, cpus,
+                 'unknown' if memory is None else memory // 1024 ** 2,
+                 parallel or 'unset', self.concurrent_builds,
+                 ' '.join('{0}={1}'.format(key, shlex.quote(value))
+                          for key, value in sorted(settings.items())))
+
+    def setup_compiler_cache(self):
+        """Run the C and C++ compilers of the builds started by pip
+        through ``compiler_cache`` (ccache or sccache), keeping its cache
+        in ``cache_dir``.
+
+        The compilers are those in :envvar:`CC`, :envvar:`CXX` and
+        :envvar:`LDSHARED`, or else the ones the interpreter was built
+        with, and CMake's compiler launcher. Temporary build directories
+        are placed below ``debian/``, inside the tree the cache hashes
+        paths relative to, so that hits do not depend on the random
+        directory names pip picks.
+        """
+        self._compiler_cache_tool = shutil.which(self.compiler_cache)
+        if self._compiler_cache_tool is None:
+            raise Exception('Cannot find {0} to use as compiler cache'.format(
+                self.compiler_cache))
+
+        self._compiler_cache_tmp = tempfile.TemporaryDirectory(
+            prefix='{0}.dh-virtualenv-build-'.format(self.package),
+            dir=os.path.abspath('debian'))
+        build_tmp = os.path.join(self._compiler_cache_tmp.name, 'tmp')
+        os.makedirs(build_tmp)
+        wrapper = os.path.join(self._compiler_cache_tmp.name, 'compile')
+        compilercache.write_wrapper(
+            wrapper, self._compiler_cache_tool,
+            os.path.join(self._compiler_cache_tmp.name, 'compile.log'))
+
+        output = subprocess.check_output(
+            [self.venv_bin('python'), '-c', _COMPILER_VARS_SCRIPT])
+        compilers = json.loads(output.decode('utf-8'))
+        env = dict(os.environ if self.pip_env is None else self.pip_env)
+        env.update(compilercache.tool_env(
+            self.compiler_cache,
+            os.path.join(self.cache_dir, self.compiler_cache), os.getcwd()))
+        for key in compilercache.COMPILER_VARS:
+            command = env.get(key) or compilers.get(key)
+            if not command or compilercache.is_wrapped(command):
+                continue
+            # Linking is not cached, nor worth timing
+            env[key] = '{0} {1}'.format(
+                self._compiler_cache_tool if key == 'LDSHARED' else wrapper,
+                command)
+        env['CMAKE_C_COMPILER_LAUNCHER'] = wrapper
+        env['CMAKE_CXX_COMPILER_LAUNCHER'] = wrapper
+        env['TMPDIR'] = build_tmp
+        self.pip_env = env
+        self._compiler_cache_stats = self._read_compiler_cache_stats()
+
+    def _read_compiler_cache_stats(self):
+        output = subprocess.check_output(
+            [self._compiler_cache_tool] +
+            compilercache.stats_command(self.compiler_cache),
+            env=self.pip_env)
+        return compilercache.parse_stats(self.compiler_cache,
+                                         output.decode('utf-8'))
+
+    def report_compiler_cache(self):
+        """Log and report the hits and misses of the compiler cache
+        since :meth:`setup_compiler_cache`, and an estimate of the time
+        it saved. Returns the report, or None if the cache was not set up.
+        """
+        if self._compiler_cache_stats is None:
+            return None
+        report = compilercache.summarize(
+            self._compiler_cache_stats, self._read_compiler_cache_stats(),
+            compilercache.read_compilations(os.path.join(
+                self._compiler_cache_tmp.name, 'compile.log')))
+        report['tool'] = self.compiler_cache
+        self._compiler_cache_tmp.cleanup()
+        self._compiler_cache_stats = None
+
+        if report['hit_rate'] is None:
+            log.info('%s: Nothing compiled through %s', self.package,
+                     self.compiler_cache)
+        else:
+            log.info('%s: %s hit rate %.0f%% (%d of %d%s), saved about %s s',
+                     self.package, self.compiler_cache,
+                     100 * report['hit_rate'], report['hits'],
+                     report['hits'] + report['misses'],
+                     '' if report['counted_for'] == 'build'
+                     else ', including concurrent builds',
+                     '?' if report['saved_seconds'] is None
+                     else '{0:.1f}'.format(report['saved_seconds']))
+        self.write_report('compiler-cache', report)
+        return report
+
     def install_dependencies(self):
+        requirements_path = os.path.join(self.sourcedirectory, self.requirements_filename)
+        if self.schedule_builds:
+            self.schedule_build_jobs()
+        if self.compiler_cache:
+            self.setup_compiler_cache()
+        if self.offline:
+            self.setup_offline_index()
+        if self.use_wheelhouse:
+            self.setup_wheelhouse(requirements_path)
+
         # Install preinstall stage packages. This is handy if you need
         # a custom package to install dependencies (think something
         # along lines of setuptools), but that does not get installed
         # by default virtualenv.
-        if self.upgrade_pip or self.upgrade_pip_to:
+        # A virtualenv seeded from the cache has the requested pip already
+        if ((self.upgrade_pip or self.upgrade_pip_to) and
+                not self.seed_from_cache):
             # First, bootstrap pip with a reduced option set (well-supported options)
             cmd = self.pip_preinstall_prefix + self.pip_upgrade_args
             if not self.upgrade_pip_to or self.upgrade_pip_to == 'latest':
                 cmd += ['-U', 'pip']
             else:
                 cmd += ['pip==' + self.upgrade_pip_to]
-            subprocess.check_call(cmd)
+            with self.timings.phase('pip_upgrade'):
+                self._run_pip(cmd, 'pip_upgrade')
         if self.preinstall:
-            subprocess.check_call(self.pip_preinstall(*self.preinstall))
+            with self.timings.phase('preinstall'):
+                self._run_pip(self.pip_preinstall(
+                    *(self._requirements_index_args + self.preinstall)),
+                    'preinstall')
 
-        requirements_path = os.path.join(self.sourcedirectory, self.requirements_filename)
+        if self.prebuild and os.path.exists(requirements_path):
+            with self.timings.phase('prebuild_wheels'):
+                self.prebuild_wheels(requirements_path)
+
+        if os.path.exists(requirements_path):
+            with self.timings.phase('requirements'):
+                if self.builtin_installer:
+                    self.install_requirement_wheels(requirements_path)
+                else:
+                    self._run_pip(self._requirements_command(requirements_path),
+                                  'requirements')
+
+        if self.wheelhouse is not None:
+            self._requirement_pins = self.installed_pins()
+
+    def prebuild_log_dir(self):
+        """Directory for the logs of the wheels built by
+        :meth:`prebuild_wheels`.
+        """
+        return os.path.join(
+            'debian', '{0}.dh-virtualenv-prebuild'.format(self.package))
+
+    def prebuild_wheels(self, requirements_path):
+        """Download the requirements (and their dependencies), and build
+        wheels from those only available as source distributions, up to
+        ``prebuild_jobs`` at a time, instead of one after the other as
+        pip would. Each build logs to its own file in
+        :meth:`prebuild_log_dir`.
+
+        The downloads and wheels are then offered to pip as additional
+        candidates, and the wheels added to the wheelhouse, if in use.
+        A failed build is not fatal, pip simply tries again later.
+        """
+        self._prebuild_dir = tempfile.TemporaryDirectory(
+            prefix='dh-virtualenv-prebuild-')
+        download_dir = os.path.join(self._prebuild_dir.name, 'downloads')
+        os.makedirs(download_dir)
+
+        index_args = list(self.pip_index_args)
+        if self.wheelhouse is not None:
+            index_args = self.wheelhouse.pip_args(self._wheelhouse_key) + index_args
+        self._run_pip(self.pip_preinstall_prefix + [
+            'download', '--dest', download_dir] + index_args + [
+            self.pip_log_arg, '-r', requirements_path], 'prebuild_download')
+
+        sdists = sorted(
+            os.path.join(download_dir, filename)
+            for filename in os.listdir(download_dir)
+            if parse_sdist_filename(filename) is not None)
+        if sdists:
+            if not os.path.isdir(self.prebuild_log_dir()):
+                os.makedirs(self.prebuild_log_dir())
+            log.info('%s: Building %d wheels, %d at a time', self.package,
+                     len(sdists), self.prebuild_jobs)
+
+        env = self.pip_env
+        if self.build_jobs is not None:
+            # Split the compiler processes between the parallel builds
+            env = dict(env, **scheduler.build_env(
+                max(1, self.build_jobs // self.prebuild_jobs),
+                env.get('MAKEFLAGS', '')))
+
+        # Prepared one after the other, as builds may share them
+        build_envs = {}
+        if self.cache_build_envs:
+            for sdist in sdists:
+                requires = buildenv.sdist_build_requires(sdist)
+                if requires is not None:
+                    build_envs[sdist] = self.build_environment(requires, env)
+
+        if self.wheelhouse is not None:
+            # On the wheelhouse's file system, so wheels can be moved there
+            wheel_dir = self.wheelhouse.staging_dir()
+        else:
+            wheel_dir = os.path.join(self._prebuild_dir.name, 'wheels')
+            os.makedirs(wheel_dir)
+
+        def build(sdist):
+            log_path = os.path.join(
+                self.prebuild_log_dir(),
+                '{0}-{1}.log'.format(*parse_sdist_filename(sdist)))
+            cmd = self.pip_preinstall_prefix + [
+                'wheel', '--no-deps', '--wheel-dir', wheel_dir] + index_args
+            with open(log_path, 'w') as fh:
+                status = None
+                if sdist in build_envs:
+                    status = subprocess.call(
+                        cmd + ['--no-build-isolation', sdist], stdout=fh,
+                        stderr=subprocess.STDOUT, env=build_envs[sdist])
+                if status != 0:
+                    # Retry in isolation, e.g. for a backend that needs
+                    # more than its static build requirements
+                    status = subprocess.call(cmd + [sdist], stdout=fh,
+                                             stderr=subprocess.STDOUT, env=env)
+            return sdist, status, log_path
+
+        try:
+            # Threads only wait for the build processes, which run in parallel
+            with ThreadPoolExecutor(self.prebuild_jobs) as executor:
+                for sdist, status, log_path in executor.map(build, sdists):
+                    if status:
+                        log.warning('%s: Building a wheel from %s failed, '
+                                    'see %s', self.package,
+                                    os.path.basename(sdist), log_path)
+
+            if self.wheelhouse is not None:
+                # pip finds them in the wheelhouse from now on
+                for filename in sorted(os.listdir(wheel_dir)):
+                    if filename.endswith('.whl'):
+                        self.wheelhouse.add(os.path.join(wheel_dir, filename))
+            else:
+                self.pip_args.append('--find-links={0}'.format(wheel_dir))
+        finally:
+            if self.wheelhouse is not None:
+                shutil.rmtree(wheel_dir)
+        self.pip_args.append('--find-links={0}'.format(download_dir))
+
+    def _find_links_args(self):
+        """Return the local sources of distributions among the pip
+        arguments, like the wheelhouse and prebuilt wheels.
+        """
+        return [arg for arg in self.pip_args
+                if arg == '--no-index' or arg.startswith('--find-links=')]
+
+    def build_environment(self, requires, env=None):
+        """Return ``env`` (by default, the one pip runs with) changed to
+        build without isolation against the cached build environment for
+        ``requires``, which is prepared first if needed.
+        """
+        if self.build_env_cache is None:
+            self.build_env_cache = buildenv.BuildEnvCache(
+                self.cache_dir, self.interpreter_tag())
+        env_dir = self.build_env_cache.env_dir(requires)
+        if not os.path.isdir(env_dir):
+            log.info('%s: Preparing build environment for %s', self.package,
+                     ', '.join(requires))
+            with self.build_env_cache.prepare(requires) as staging_dir:
+                self._run_pip(self.pip_preinstall_prefix + [
+                    'install', '--target', os.path.join(staging_dir, 'site')] +
+                    self._find_links_args() + self.pip_index_args +
+                    [self.pip_log_arg] + requires, 'build_env')
+        if env is None:
+            env = os.environ if self.pip_env is None else self.pip_env
+        return buildenv.environment(env_dir, env)
+
+    def install_scheme(self, python=None):
+        """Return where the builtin installer puts the parts of wheels
+        in the virtualenv (of the interpreter ``python``).
+        """
+        output = subprocess.check_output(
+            [python or self.venv_bin('python'), '-c', _SCHEME_SCRIPT])
+        return installer.Scheme(**json.loads(output.decode('utf-8')))
+
+    def install_requirement_wheels(self, requirements_path):
+        """Install the requirements with the builtin installer.
+
+        ``pip wheel`` resolves the requirements (or takes the locked
+        ones, if the lock is up to date), and downloads or builds a wheel
+        for each of them. Those wheels are then installed in parallel,
+        with scripts pointing to the final location of the interpreter.
+        Distributions already installed in the same version are kept,
+        other versions are replaced.
+        """
+        requirement_args = self._locked_requirements_args(requirements_path)
+        if requirement_args is None:
+            if self.requirements_lock:
+                log.warning('%s: The builtin installer cannot update %s',
+                            self.package, self.requirements_lock)
+            requirement_args = ['-r', requirements_path]
+
+        # The same options as for pip install, minus the one pip wheel
+        # does not know
+        pip_args = [arg for arg in self.pip_args[1:] if arg != '--no-compile']
+        with tempfile.TemporaryDirectory(
+                prefix='dh-virtualenv-wheels-') as wheel_dir:
+            self._run_pip(self.pip_preinstall_prefix + [
+                'wheel', '--wheel-dir', wheel_dir] + pip_args +
+                self._requirements_index_args + requirement_args,
+                'requirements')
+
+            installed = dict((dist.name, dist) for dist in
+                             metadata.distributions(self.package_dir))
+            wheels = []
+            for filename in sorted(os.listdir(wheel_dir)):
+                pin = parse_wheel_filename(filename)
+                if pin is None:
+                    continue
+                dist = installed.get(pin[0])
+                if dist is not None:
+                    if dist.version.lower() == pin[1]:
+                        continue
+                    installer.uninstall(dist)
+                wheels.append(os.path.join(wheel_dir, filename))
+
+            log.info('%s: Installing %d wheels', self.package, len(wheels))
+            installer.install_wheels(
+                wheels, self.install_scheme(),
+                os.path.join(self.virtualenv_install_dir, 'bin/python'))
+
+    def _locked_requirements_args(self, requirements_path):
+        """Return the pip arguments installing the requirements lock
+        without resolving dependencies, or None if there is no lock, or it
+        was made from a different requirements file.
+        """
+        if not self.requirements_lock:
+            return None
+        lock_path = os.path.join(self.sourcedirectory, self.requirements_lock)
+        if lockfile.read_digest(lock_path) != _file_digest(requirements_path):
+            return None
+        log.info('%s: Installing locked requirements from %s',
+                 self.package, lock_path)
+        return ['--no-deps', '--require-hashes', '-r', lock_path]
+
+    def _requirements_command(self, requirements_path):
+        """Return the pip command installing the requirements file.
+
+        With a requirements lock that is up to date, the locked
+        distributions are installed as they are, without resolving
+        dependencies. Otherwise the requirements are resolved as usual,
+        and pip's installation report is kept to lock them afterwards.
+        """
+        index_args = self._requirements_index_args
+        locked_args = self._locked_requirements_args(requirements_path)
+        if locked_args is not None:
+            return self.pip(*(index_args + locked_args))
+        if not self.requirements_lock:
+            return self.pip(*(index_args + ['-r', requirements_path]))
+
+        self._check_pip_version(_PIP_REPORT_VERSION, '--requirements-lock')
+        self._requirements_path = requirements_path
+        self.pip_report_file = tempfile.NamedTemporaryFile(suffix='.json')
+        return self.pip(*(index_args + [
+            '--report', self.pip_report_file.name, '-r', requirements_path]))
+
+    def _check_pip_version(self, minimum, option):
+        """Fail unless the pip in the virtualenv is at least ``minimum``,
+        a tuple of version numbers. A pip without metadata passes.
+        """
+        for dist in metadata.distributions(self.package_dir):
+            if dist.name != 'pip':
+                continue
+            if _version_tuple(dist.version) < minimum:
+                raise Exception(
+                    '{0} needs pip {1} or later, but the virtualenv has pip '
+                    '{2} (see --upgrade-pip-to)'.format(
+                        option, '.'.join(str(n) for n in minimum),
+                        dist.version))
+
+    def write_requirements_lock(self):
+        """Lock the requirements installed by this build, if they were
+        resolved from scratch.
+
+        Besides the hashes of the distributions pip installed, the lock
+        accepts those of the same versions found in the wheelhouse, so
+        it can be used with wheels built locally from source too.
+        """
+        if self.pip_report_file is None:
+            return
+
+        with open(self.pip_report_file.name) as fh:
+            pins = lockfile.pins_from_report(json.load(fh))
+        if pins is None:
+            log.warning('%s: Not all requirements come from archives with '
+                        'known hashes, cannot lock them', self.package)
+            return
+
+        if self.wheelhouse is not None:
+            wheels = self.wheelhouse.wheels()
+            for name, pinned, hashes in pins:
+                wheel = wheels.get((name, pinned.lower()))
+                if wheel is not None:
+                    hashes.append(_file_digest(wheel))
+
+        with open(self._requirements_path) as fh:
+            requirements = fh.read()
+        lock_path = os.path.join(self.sourcedirectory, self.requirements_lock)
+        _atomic_write(lock_path, lockfile.format_lock(
+            requirements, _file_digest(self._requirements_path), pins,
+            source=self.requirements_filename).encode('utf-8'))
+        log.info('%s: Wrote %s', self.package, lock_path)
+
+    def setup_wheelhouse(self, requirements_path):
+        """Point pip at the wheelhouse cached for this interpreter.
+
+        The wheelhouse is keyed by the requirements file contents and
+        the preinstall list. If a previous build recorded a complete
+        set of wheels for the same key, pip does not touch the index
+        (``--no-index``) while installing those; otherwise the cached
+        wheels are merely offered as additional candidates. The package
+        itself is always built with access to the index, since its
+        build requirements need not be in the wheelhouse.
+        """
+        self.wheelhouse = Wheelhouse(self.cache_dir, self.interpreter_tag())
+        requirements = ''
         if os.path.exists(requirements_path):
-            subprocess.check_call(self.pip('-r', requirements_path))
+            with open(requirements_path) as fh:
+                requirements = fh.read()
+        self._wheelhouse_key = requirements_key(
+            requirements, ' '.join(self.preinstall))
+        # Only the requirements are known to be in the wheelhouse, not
+        # what the package itself needs to build
+        for arg in self.wheelhouse.pip_args(self._wheelhouse_key):
+            if arg == '--no-index':
+                self._requirements_index_args.append(arg)
+            else:
+                self.pip_args.append(arg)
+
+    def update_wheelhouse(self):
+        """Add wheels for everything installed in the virtualenv to the
+        wheelhouse, and record the resolved requirements once all of them
+        are available.
+        """
+        if self.wheelhouse is None:
+            return
+
+        # The package itself and whatever was installed from a local
+        # path or a URL cannot be fetched from an index.
+        local = metadata.local_distributions(self.package_dir)
+        local.add(buildenv.project_name(self.sourcedirectory))
+        missing = self.wheelhouse.missing(
+            [pin for pin in self.installed_pins() if pin[0] not in local])
+        if missing:
+            staging = self.wheelhouse.staging_dir()
+            try:
+                for name, pinned in missing:
+                    # One pip call per wheel, so a single distribution
+                    # that cannot be built does not spoil the others.
+                    cmd = self.pip_preinstall_prefix + [
+                        'wheel', '--no-deps',
+                        '--wheel-dir={0}'.format(staging),
+                        '--find-links={0}'.format(self.wheelhouse.path),
+                    ] + self.pip_index_args + [
+                        self.pip_log_arg, '{0}=={1}'.format(name, pinned)]
+                    try:
+                        self._run_pip(cmd, 'wheelhouse')
+                    except subprocess.CalledProcessError:
+                        log.warning('Could not add %s==%s to the wheelhouse',
+                                    name, pinned)
+                for filename in os.listdir(staging):
+                    if filename.endswith('.whl'):
+                        self.wheelhouse.add(os.path.join(staging, filename))
+            finally:
+                shutil.rmtree(staging)
+
+        pins = self._requirement_pins
+        if pins is not None and not self.wheelhouse.missing(pins):
+            self.wheelhouse.save_manifest(self._wheelhouse_key, pins)
 
     def run_tests(self):
         python = self.venv_bin('python')
@@ -207,31 +1368,81 @@ class Deployment(object):
         if os.path.exists(setup_py):
             subprocess.check_call([python, 'setup.py', 'test'], cwd=self.sourcedirectory)
 
+    def _script_headers(self):
+        """Yield the path and first two lines of the files in the bin
+        directory, recursively. Symlinks are skipped, as they point to
+        either the interpreter or files that are visited anyway.
+        """
+        if os.path.isfile(self.bin_dir):
+            paths = [self.bin_dir]
+        else:
+            paths = (os.path.join(root, f)
+                     for root, dirs, files in os.walk(self.bin_dir)
+                     for f in sorted(files))
+        for path in paths:
+            if os.path.islink(path):
+                continue
+            with open(path, 'rb') as fh:
+                header = fh.read(_SCRIPT_HEADER_SIZE)
+            yield path, header.split(b'\n', 2)[:2]
+
     def find_script_files(self):
         """Find list of files containing python shebangs in the bin directory"""
-        command = ['grep', '-l', '-r',
-                   '-e', r'^#!\({0}\|.*bin/\(env \)\?{0}\)'.format(_PYTHON_INTERPRETERS_REGEX),
-                   '-e', r"^'''exec.*bin/{0}".format(_PYTHON_INTERPRETERS_REGEX),
-                   self.bin_dir]
-        grep_proc = subprocess.Popen(command, stdout=subprocess.PIPE)
-        files, stderr = grep_proc.communicate()
-        return set(f for f in files.decode('utf-8').strip().split('\n') if f)
+        return set(path for path, lines in self._script_headers()
+                   if any(_SHEBANG_RE.match(line) or _EXEC_RE.match(line)
+                          for line in lines))
 
     def fix_shebangs(self):
         """Translate '/usr/bin/python', '/usr/bin/env python', and 'python' shebang
         lines to point to our virtualenv python.
+
+        Only the first two lines of each file are looked at, and files
+        are replaced atomically when they change.
+        """
+        pythonpath = os.fsencode(
+            os.path.join(self.virtualenv_install_dir, 'bin/python'))
+        shebang = b'#!' + pythonpath
+        exec_line = b"'''exec' " + pythonpath
+
+        def fix(line):
+            return _EXEC_REWRITE_RE.sub(lambda m: exec_line,
+                                        _SHEBANG_RE.sub(lambda m: shebang, line))
+
+        for path, lines in self._script_headers():
+            if [fix(line) for line in lines] == lines:
+                continue
+            # The header may end within the second line, so rewrite the
+            # complete lines of the file.
+            with open(path, 'rb') as fh:
+                content = fh.read().split(b'\n', 2)
+            content[:2] = [fix(line) for line in content[:2]]
+            _atomic_write(path, b'\n'.join(content))
+
+    def generate_launchers(self):
+        """Replace the scripts in ``bin/`` generated for the console and
+        GUI script entry points of the installed distributions by minimal
+        launchers, which import the entry point directly (instead of, for
+        example, going through ``pkg_resources``) and already point to the
+        final location of the interpreter. Returns their names.
         """
         pythonpath = os.path.join(self.virtualenv_install_dir, 'bin/python')
-        for f in self.find_script_files():
-            regex = (r's-^#!\({names}\|.*bin/\(env \)\?{names}\"\?\)-#!{pythonpath}-;'
-                     r"s-^'''exec'.*bin/{names}-'''exec' {pythonpath}-"
-            ).format(names=_PYTHON_INTERPRETERS_REGEX, pythonpath=re.escape(pythonpath))
-            p = subprocess.Popen(
-                ['sed', '-i', regex, f],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-            subprocess.check_call(['sed', '-i', regex, f])
+        generated = []
+        for dist in metadata.distributions(self.package_dir):
+            groups = metadata.entry_points(dist)
+            for group in ('console_scripts', 'gui_scripts'):
+                for name, reference in sorted(groups.get(group, {}).items()):
+                    script = installer.launcher_script(pythonpath, reference)
+                    if '/' in name or script is None:
+                        log.warning('%s: Not generating a launcher for %s = %s',
+                                    self.package, name, reference)
+                        continue
+                    path = os.path.join(self.bin_dir, name)
+                    _atomic_write(path, script.encode('utf-8'))
+                    os.chmod(path, 0o755)
+                    generated.append(name)
+        log.info('%s: Generated launchers for %s', self.package,
+                 ', '.join(generated) or 'no entry points')
+        return generated
 
     def fix_activate_path(self):
         """Replace the `VIRTUAL_ENV` path in bin/activate to reflect the
@@ -268,8 +1479,87 @@ class Deployment(object):
 
     def install_package(self):
         if not self.skip_install:
+            requires = None
+            if self.cache_build_envs:
+                requires = buildenv.project_build_requires(self.sourcedirectory)
+            if requires is not None:
+                try:
+                    env = self.package_build_environment(requires)
+                except subprocess.CalledProcessError:
+                    log.warning('%s: Could not get the build requirements '
+                                'from the build backend, building the '
+                                'package in isolation', self.package)
+                else:
+                    self.install_package_wheel(env)
+                    return
             package = '.[{}]'.format(','.join(self.extras)) if self.extras else '.'
-            subprocess.check_call(self.pip(package), cwd=os.path.abspath(self.sourcedirectory))
+            self._run_pip(self.pip(package), 'install_package',
+                          cwd=os.path.abspath(self.sourcedirectory))
+
+    def package_build_environment(self, requires):
+        """Return the environment to build the package in, with the
+        cached build environment for its build ``requires`` and those
+        its build backend asks for in ``get_requires_for_build_wheel``
+        (like ``cmake`` for scikit-build).
+        """
+        env = self.build_environment(requires)
+        backend, backend_path = buildenv.project_build_backend(
+            self.sourcedirectory)
+        with tempfile.TemporaryDirectory(
+                prefix='dh-virtualenv-requires-') as tmpdir:
+            output = os.path.join(tmpdir, 'requires.json')
+            subprocess.check_call(
+                [self.venv_bin('python'), '-c', _BUILD_REQUIRES_SCRIPT,
+                 backend, json.dumps(backend_path), output],
+                cwd=os.path.abspath(self.sourcedirectory), env=env)
+            with open(output) as fh:
+                dynamic = json.load(fh)
+        missing = set(requirement.strip() for requirement in dynamic
+                      if requirement.strip()) - set(requires)
+        if not missing:
+            return env
+        return self.build_environment(sorted(set(requires) | missing))
+
+    def install_package_wheel(self, env):
+        """Build a wheel of the package without isolation in ``env``,
+        and install that.
+        """
+        with tempfile.TemporaryDirectory(
+                prefix='dh-virtualenv-package-') as wheel_dir:
+            self._run_pip(self.pip_preinstall_prefix + [
+                'wheel', '--no-deps', '--no-build-isolation',
+                '--wheel-dir', wheel_dir, self.pip_log_arg,
+                os.path.abspath(self.sourcedirectory)], 'build_package',
+                env=env)
+            wheel, = [filename for filename in os.listdir(wheel_dir)
+                      if filename.endswith('.whl')]
+            package = os.path.join(wheel_dir, wheel)
+            if self.extras:
+                package += '[{}]'.format(','.join(self.extras))
+            self._run_pip(self.pip(package), 'install_package',
+                          cwd=os.path.abspath(self.sourcedirectory))
+
+    def byte_compile(self):
+        """Compile all modules in the virtualenv, using all CPUs.
+
+        Paths recorded in the bytecode are those of the installed
+        virtualenv, not the build location. With the (default) hash based
+        invalidation modes, the output does not depend on file timestamps,
+        so it is reproducible and needs no mtime checks at import time.
+        This needs Python 3.9 or later in the virtualenv.
+        """
+        cmd = [self.venv_bin('python'), '-m', 'compileall', '-q', '-j', '0',
+               '--invalidation-mode', self.bytecode_invalidation_mode,
+               '-s', os.path.abspath(self.package_dir),
+               '-p', self.virtualenv_install_dir]
+        for level in self.bytecode_optimize:
+            cmd.extend(['-o', str(level)])
+        cmd.append(os.path.abspath(os.path.join(self.package_dir, 'lib')))
+        # Like pip, do not fail on modules that cannot be compiled,
+        # e.g. ones for another Python version shipped in a distribution
+        if subprocess.call(cmd):
+            log.warning('Some modules of %s could not be byte-compiled',
+                        self.package)
 
     def fix_local_symlinks(self):
         # The virtualenv might end up with a local folder that points outside the package
@@ -299,3 +1589,483 @@ class Deployment(object):
             new_target = os.path.relpath(existing_target, local_dir)
             os.unlink(path)
             os.symlink(new_target, path)
+
+    def _match_prune_rule(self, rules, relpath, is_dir):
+        for rule in rules:
+            pattern = rule[len('strip:'):] if rule.startswith('strip:') else rule
+            if pattern.endswith('/') != is_dir:
+                continue
+            if fnmatch.fnmatchcase(relpath + ('/' if is_dir else ''), pattern):
+                return rule
+        return None
+
+    def relocate_build_paths(self):
+        """Replace the build location of the virtualenv by its final
+        location everywhere in the virtualenv.
+
+        Every file is scanned once through ``mmap``. Text files (those
+        without NUL bytes) are rewritten atomically, while occurrences in
+        binary files, which cannot be patched safely, are only reported.
+        Absolute symlinks into the build location are made relative.
+        Returns the report, which is also written to disk.
+        """
+        package_dir = os.path.abspath(self.package_dir)
+        prefixes = [package_dir]
+        if os.path.realpath(package_dir) != package_dir:
+            prefixes.append(os.path.realpath(package_dir))
+        byte_prefixes = [os.fsencode(prefix) for prefix in prefixes]
+        target = os.fsencode(self.virtualenv_install_dir)
+
+        rewritten = []
+        binary = {}
+        symlinks = []
+        for root, dirs, files in os.walk(self.package_dir):
+            dirs.sort()
+            for f in sorted(dirs + files):
+                path = os.path.join(root, f)
+                relpath = os.path.relpath(path, self.package_dir)
+                if os.path.islink(path):
+                    link = os.readlink(path)
+                    for prefix in prefixes:
+                        if link == prefix or link.startswith(prefix + os.sep):
+                            new_link = os.path.relpath(
+                                package_dir + link[len(prefix):],
+                                os.path.dirname(os.path.abspath(path)))
+                            tmp_path = path + '.dh-virtualenv-link'
+                            os.symlink(new_link, tmp_path)
+                            os.rename(tmp_path, path)
+                            symlinks.append(relpath)
+                            break
+                    continue
+                if f in dirs or not os.path.getsize(path):
+                    continue
+                try:
+                    with open(path, 'rb') as fh, mmap.mmap(
+                            fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        hits = sum(_count(mm, p) for p in byte_prefixes)
+                        if not hits:
+                            continue
+                        if mm.find(b'\0') != -1:
+                            binary[relpath] = hits
+                            continue
+                        content = mm[:]
+                except (IOError, OSError, ValueError):
+                    continue
+                for prefix in byte_prefixes:
+                    content = content.replace(prefix, target)
+                _atomic_write(path, content)
+                rewritten.append(relpath)
+
+        log.info('%s: Relocated %d files and %d symlinks', self.package,
+                 len(rewritten), len(symlinks))
+        if binary:
+            log.warning('%s: %d binary files refer to the build location, '
+                        'see %s', self.package, len(binary),
+                        self.report_path('relocation'))
+        for relpath, hits in sorted(binary.items()):
+            log.debug('%s:   %s (%d times)', self.package, relpath, hits)
+        report = {'rewritten': rewritten, 'binary': binary,
+                  'symlinks': symlinks}
+        self.write_report('relocation', report)
+        return report
+
+    def _startup_time(self):
+        cmd = [self.venv_bin('python'), '-c', 'pass']
+        return min(profiling.run_measured(cmd)[1]
+                   for _ in range(_STARTUP_RUNS))
+
+    def consolidate_pth_files(self):
+        """Merge consecutive ``.pth`` files of each ``site-packages``
+        directory that only list paths into one, so the interpreter reads
+        fewer files at every start. Entries are kept in the order ``site``
+        would add them, minus duplicates and relative paths that do not
+        exist.
+
+        Files running code (like the ``_virtualenv.pth`` of virtualenv and
+        the ``distutils-precedence.pth`` of setuptools) are left alone,
+        and no entries are moved across them, since that code may depend
+        on the state of ``sys.path`` at that point. Each run of plain files
+        between them is merged into the first file of the run. Returns the
+        start-up time saved in seconds, as measured with the virtualenv's
+        interpreter.
+        """
+        merges = []
+        for site_packages in metadata.site_packages_dirs(self.package_dir):
+            runs = [[]]
+            for name in sorted(os.listdir(site_packages)):
+                if not name.endswith('.pth') or name.startswith('.'):
+                    continue
+                entries = _pth_entries(os.path.join(site_packages, name))
+                if entries is None:
+                    log.debug('%s: %s runs code, not moving path entries '
+                              'across it', self.package, name)
+                    runs.append([])
+                else:
+                    runs[-1].append((name, entries))
+            merges.extend((site_packages, run) for run in runs if len(run) > 1)
+        if not merges:
+            log.info('%s: No path files to consolidate', self.package)
+            return 0
+
+        before = self._startup_time()
+        for site_packages, merge in merges:
+            lines = ['# Generated by dh-virtualenv from {0}'.format(
+                ', '.join(name for name, _ in merge))]
+            seen = set()
+            for name, entries in merge:
+                for entry in entries:
+                    path = os.path.normpath(os.path.join(site_packages, entry))
+                    if path in seen or (not os.path.isabs(entry) and
+                                        not os.path.exists(path)):
+                        continue
+                    seen.add(path)
+                    lines.append(entry)
+            # Taking the place of the first file keeps it between the
+            # same files running code
+            _atomic_write(os.path.join(site_packages, merge[0][0]),
+                          ('\n'.join(lines) + '\n').encode('utf-8'))
+            for name, _ in merge[1:]:
+                os.unlink(os.path.join(site_packages, name))
+        saved = before - self._startup_time()
+        log.info('%s: Consolidated %d path files, saving %.1fms of start-up '
+                 'time', self.package, sum(len(m) for _, m in merges),
+                 saved * 1000)
+        return saved
+
+    def prune(self):
+        """Remove files the package does not need at run time.
+
+        Rules are shell patterns matched against paths relative to the
+        virtualenv, where ``*`` also matches ``/``. Patterns ending in a
+        slash remove whole directories, others remove files. Rules
+        prefixed with ``strip:`` run ``strip --strip-debug`` on the
+        matching files instead of removing them. The first matching rule
+        applies. Returns the number of bytes removed by each rule.
+        """
+        rules = list(self.prune_rules)
+        if self.prune_file:
+            with open(self.prune_file) as fh:
+                rules.extend(parse_prune_rules(fh))
+        removed = collections.OrderedDict((rule, 0) for rule in rules)
+
+        for root, dirs, files in os.walk(self.package_dir):
+            kept = []
+            for d in sorted(dirs):
+                path = os.path.join(root, d)
+                rule = self._match_prune_rule(
+                    rules, os.path.relpath(path, self.package_dir), True)
+                if rule is None or rule.startswith('strip:'):
+                    kept.append(d)
+                    continue
+                removed[rule] += _tree_size(path)
+                if os.path.islink(path):
+                    os.unlink(path)
+                else:
+                    shutil.rmtree(path)
+            dirs[:] = kept
+
+            for f in sorted(files):
+                path = os.path.join(root, f)
+                rule = self._match_prune_rule(
+                    rules, os.path.relpath(path, self.package_dir), False)
+                if rule is None:
+                    continue
+                st = os.lstat(path)
+                if not rule.startswith('strip:'):
+                    if stat.S_ISREG(st.st_mode):
+                        removed[rule] += st.st_size
+                    os.unlink(path)
+                elif stat.S_ISREG(st.st_mode):
+                    if subprocess.call(['strip', '--strip-debug', path]):
+                        log.warning('%s: Could not strip %s',
+                                    self.package, path)
+                        continue
+                    removed[rule] += st.st_size - os.lstat(path).st_size
+
+        for rule, size in removed.items():
+            log.info('%s: Pruned %d bytes with rule %s',
+                     self.package, size, rule)
+        return removed
+
+    def footprint(self):
+        """Attribute the size of the virtualenv to the distributions
+        installed in it, using their ``RECORD`` files.
+
+        Bytecode compiled after installation counts towards the owner of
+        its source file. Files hardlinked to each other count once, and
+        files no ``RECORD`` lists (the interpreter, ``pyvenv.cfg``, ...)
+        are reported as unattributed.
+        """
+        owners = {}
+        distributions = {}
+        for dist in metadata.distributions(self.package_dir):
+            distributions[dist.name] = {
+                'version': dist.version, 'bytes': 0, 'files': 0}
+            for path in metadata.record_files(dist):
+                owners.setdefault(path, dist.name)
+
+        unattributed = {'bytes': 0, 'files': 0}
+        total = 0
+        seen = set()
+        for root, dirs, files in os.walk(self.package_dir):
+            dirs.sort()
+            for f in sorted(files):
+                path = os.path.normpath(os.path.join(root, f))
+                st = os.lstat(path)
+                if (not stat.S_ISREG(st.st_mode) or
+                        (st.st_dev, st.st_ino) in seen):
+                    continue
+                seen.add((st.st_dev, st.st_ino))
+                owner = owners.get(path) or owners.get(_bytecode_source(path))
+                entry = distributions[owner] if owner else unattributed
+                entry['bytes'] += st.st_size
+                entry['files'] += 1
+                total += st.st_size
+        return {'distributions': distributions,
+                'unattributed': unattributed,
+                'total_bytes': total}
+
+    def check_footprint(self):
+        """Log the largest distributions in the virtualenv and how their
+        size changed since the previous report, write the report if
+        requested, and fail if the virtualenv exceeds ``max_size``.
+        """
+        report = self.footprint()
+        distributions = report['distributions']
+        try:
+            with open(self.report_path('footprint')) as fh:
+                previous = json.load(fh)
+        except (IOError, OSError, ValueError):
+            previous = None
+
+        ranked = sorted(distributions.items(),
+                        key=lambda item: (-item[1]['bytes'], item[0]))
+        log.info('%s: Virtualenv size is %d bytes, largest distributions:',
+                 self.package, report['total_bytes'])
+        for name, entry in ranked[:_FOOTPRINT_TOP]:
+            log.info('%s:   %s %s: %d bytes in %d files', self.package,
+                     name, entry['version'], entry['bytes'], entry['files'])
+
+        if previous is not None:
+            old = previous.get('distributions', {})
+            changes = {}
+            for name in set(old) | set(distributions):
+                delta = (distributions.get(name, {}).get('bytes', 0) -
+                         old.get(name, {}).get('bytes', 0))
+                if delta:
+                    changes[name] = delta
+            report['previous_total_bytes'] = previous.get('total_bytes', 0)
+            report['changes'] = changes
+            log.info('%s: Size changed by %+d bytes since the previous build',
+                     self.package,
+                     report['total_bytes'] - report['previous_total_bytes'])
+            for name, delta in sorted(changes.items(),
+                                      key=lambda item: -abs(item[1])):
+                log.info('%s:   %s: %+d bytes', self.package, name, delta)
+
+        if self.footprint_report:
+            self.write_report('footprint', report)
+        if self.max_size is not None and report['total_bytes'] > self.max_size:
+            raise Exception(
+                'Virtualenv of {0} is {1} bytes, exceeding the maximum size '
+                'of {2} bytes'.format(
+                    self.package, report['total_bytes'], self.max_size))
+        return report
+
+    def entry_point_modules(self):
+        """Return the modules the console and GUI scripts of the
+        installed distributions (other than pip and friends) run.
+        """
+        modules = set()
+        for dist in metadata.distributions(self.package_dir):
+            if dist.name in _TOOLING_DISTRIBUTIONS:
+                continue
+            groups = metadata.entry_points(dist)
+            for group in ('console_scripts', 'gui_scripts'):
+                for reference in groups.get(group, {}).values():
+                    module, _ = metadata.parse_object_reference(reference)
+                    if module:
+                        modules.add(module)
+        return sorted(modules)
+
+    def _importtime(self, code):
+        # -I keeps the source directory and the environment out of
+        # sys.path, -B keeps bytecode of the run out of the package
+        process = subprocess.run(
+            [self.venv_bin('python'), '-I', '-B', '-X', 'importtime',
+             '-c', code],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        lines = process.stderr.decode('utf-8', 'replace').splitlines()
+        return process.returncode, lines
+
+    def profile_imports(self):
+        """Measure how long importing the module of each entry point
+        takes, on top of the interpreter start-up, with
+        ``python -X importtime``.
+
+        Reports the total per entry point module, and the modules it
+        imports sorted by their cumulative import time. Fails if any
+        entry point takes longer than ``max_import_time`` seconds.
+        """
+        _, lines = self._importtime('pass')
+        startup = set(i.module for i in profiling.parse_importtime(lines))
+
+        entry_points = {}
+        for module in self.entry_point_modules():
+            returncode, lines = self._importtime('import ' + module)
+            imports = [i for i in profiling.parse_importtime(lines)
+                       if i.module not in startup]
+            imports.sort(key=lambda i: (-i.cumulative_us, i.module))
+            entry = {
+                'cumulative_us': sum(i.cumulative_us for i in imports
+                                     if i.level == 0),
+                'imports': [{'module': i.module, 'self_us': i.self_us,
+                             'cumulative_us': i.cumulative_us}
+                            for i in imports],
+            }
+            if returncode:
+                log.warning('%s: Importing %s failed:\n%s', self.package,
+                            module, '\n'.join(lines[-10:]))
+                entry['failed'] = True
+            entry_points[module] = entry
+
+        for module, entry in sorted(entry_points.items(),
+                                    key=lambda item: -item[1]['cumulative_us']):
+            log.info('%s: Importing %s takes %.3fs, slowest imports:',
+                     self.package, module, entry['cumulative_us'] / 1e6)
+            for imported in entry['imports'][:_IMPORT_TIME_TOP]:
+                log.info('%s:   %s: %.3fs', self.package, imported['module'],
+                         imported['cumulative_us'] / 1e6)
+
+        report = {'entry_points': entry_points}
+        if self.import_time_report:
+            self.write_report('importtime', report)
+        if self.max_import_time is not None:
+            slow = sorted(module for module, entry in entry_points.items()
+                          if entry['cumulative_us'] > self.max_import_time * 1e6)
+            if slow:
+                raise Exception(
+                    'Importing {0} takes longer than {1}s'.format(
+                        ', '.join(slow), self.max_import_time))
+        return report
+
+    def benchmark(self):
+        """Measure the start-up latency of the Python scripts in ``bin/``
+        (other than those of pip and friends).
+
+        Each script is run ``benchmark_runs`` times with
+        ``benchmark_args``, both with the files of the virtualenv evicted
+        from the page cache before every run (cold), and after a warm-up
+        run (warm). The wall clock time and peak memory usage of the runs
+        are summarized per script, and compared with the report of the
+        previous build, if any.
+        """
+        tooling = set()
+        for dist in metadata.distributions(self.package_dir):
+            if dist.name in _TOOLING_DISTRIBUTIONS:
+                tooling.update(metadata.record_files(dist))
+        scripts = sorted(path for path in self.find_script_files()
+                         if os.path.normpath(path) not in tooling)
+        python = self.venv_bin('python')
+
+        # Only pages that are written back can be evicted
+        os.sync()
+        results = {}
+        for script in scripts:
+            cmd = [python, script] + self.benchmark_args
+            samples = {'cold': [], 'warm': []}
+            statuses = set()
+            name = os.path.basename(script)
+            try:
+                for temperature in ('cold', 'warm'):
+                    if temperature == 'warm':
+                        profiling.run_measured(cmd, self.benchmark_timeout)
+                    for _ in range(self.benchmark_runs):
+                        if temperature == 'cold':
+                            profiling.evict_page_cache(self.package_dir)
+                        status, wall, rss = profiling.run_measured(
+                            cmd, self.benchmark_timeout)
+                        statuses.add(status)
+                        samples[temperature].append((wall, rss))
+            except subprocess.TimeoutExpired:
+                log.warning('%s: %s did not exit within %ss when '
+                            'benchmarked', self.package, ' '.join(cmd),
+                            self.benchmark_timeout)
+                results[name] = {'timed_out': True}
+                continue
+            results[name] = dict(
+                (temperature, profiling.summarize(samples[temperature]))
+                for temperature in samples)
+            results[name]['exit_status'] = max(statuses, key=abs)
+            if results[name]['exit_status']:
+                log.warning('%s: %s exited with status %d when benchmarked',
+                            self.package, ' '.join(cmd),
+                            results[name]['exit_status'])
+
+        try:
+            with open(self.report_path('benchmark')) as fh:
+                previous = json.load(fh).get('scripts', {})
+        except (IOError, OSError, ValueError):
+            previous = None
+
+        for name, result in sorted(results.items()):
+            if result.get('timed_out'):
+                continue
+            log.info('%s: %s starts in %.3fs cold, %.3fs warm (median), '
+                     'using up to %d KiB', self.package, name,
+                     result['cold']['wall_seconds']['median'],
+                     result['warm']['wall_seconds']['median'],
+                     max(result['cold']['max_rss_kb'],
+                         result['warm']['max_rss_kb']))
+            if previous and 'cold' in previous.get(name, {}):
+                result['changes'] = dict(
+                    (temperature,
+                     result[temperature]['wall_seconds']['median'] -
+                     previous[name][temperature]['wall_seconds']['median'])
+                    for temperature in ('cold', 'warm'))
+                log.info('%s:   %+.3fs cold, %+.3fs warm since the previous '
+                         'build', self.package, result['changes']['cold'],
+                         result['changes']['warm'])
+
+        report = {'args': self.benchmark_args, 'runs': self.benchmark_runs,
+                  'scripts': results}
+        self.write_report('benchmark', report)
+        return report
+
+    def deduplicate(self):
+        """Replace files with identical contents (and permissions) in the
+        virtualenv by hardlinks to a single copy. Returns the number of
+        bytes saved.
+        """
+        candidates = {}
+        for root, dirs, files in os.walk(self.package_dir):
+            for f in files:
+                path = os.path.join(root, f)
+                st = os.lstat(path)
+                if not stat.S_ISREG(st.st_mode) or not st.st_size:
+                    continue
+                key = (st.st_size, st.st_mode, st.st_uid, st.st_gid)
+                # Files already hardlinked to each other only count once
+                candidates.setdefault(key, {}).setdefault(
+                    (st.st_dev, st.st_ino), []).append(path)
+
+        saved = 0
+        for (size, _, _, _), inodes in candidates.items():
+            if len(inodes) < 2:
+                continue
+            by_digest = {}
+            for paths in inodes.values():
+                paths.sort()
+                by_digest.setdefault(_file_digest(paths[0]), []).append(paths)
+            for groups in by_digest.values():
+                groups.sort()
+                original = groups[0][0]
+                for paths in groups[1:]:
+                    for path in paths:
+                        tmp_path = path + '.dh-virtualenv-link'
+                        os.link(original, tmp_path)
+                        os.rename(tmp_path, path)
+                    saved += size
+        log.info('%s: Saved %d bytes by hardlinking duplicate files',
+                 self.package, saved)
+        return saved
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""A minimal installer for wheels, which installs many of them in
+parallel, as an alternative to ``pip install``.
+
+Only wheels are supported, and nothing is resolved: the set of wheels
+given is installed as it is, like ``pip install --no-deps --no-compile``
+would do.
+"""
+from __future__ import absolute_import
+
+import base64
+import collections
+import csv
+import hashlib
+import io
+import os
+import re
+import shutil
+import zipfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metadata
+
+# Longest shebang line the kernel accepts
+MAX_SHEBANG_LENGTH = 127
+INSTALLER_NAME = 'dh-virtualenv'
+_DOTTED_NAME_RE = re.compile(r'^[A-Za-z_][\w]*(\.[A-Za-z_][\w]*)*$')
+_LAUNCHER_TEMPLATE = '''\
+# -*- coding: utf-8 -*-
+import sys
+
+from {module} import {import_name}
+
+if __name__ == '__main__':
+    sys.exit({function}())
+'''
+# Files of the wheel that are not installed as they are
+_SIGNATURES = ('RECORD', 'RECORD.jws', 'RECORD.p7s')
+
+Scheme = collections.namedtuple(
+    'Scheme', ['purelib', 'platlib', 'scripts', 'headers', 'data'])
+
+
+def script_header(interpreter):
+    """Return the lines starting a Python script run by ``interpreter``."""
+    header = '#!{0}\n'.format(interpreter)
+    if len(header) - 1 > MAX_SHEBANG_LENGTH:
+        # Same trick as pip: sh runs the interpreter with the script,
+        # for Python the second line is just a string
+        header = "#!/bin/sh\n'''exec' {0} \"$0\" \"$@\"\n' '''\n".format(
+            interpreter)
+    return header
+
+
+def launcher_script(interpreter, reference):
+    """Return a script calling the entry point ``reference`` directly,
+    or None if the reference cannot be called like that.
+    """
+    module, attrs = metadata.parse_object_reference(reference)
+    if not _DOTTED_NAME_RE.match(module) or not _DOTTED_NAME_RE.match(attrs):
+        return None
+    return script_header(interpreter) + _LAUNCHER_TEMPLATE.format(
+        module=module, import_name=attrs.split('.')[0], function=attrs)
+
+
+def _record_row(path, content, relative_to):
+    digest = base64.urlsafe_b64encode(hashlib.sha256(content).digest())
+    return (os.path.relpath(path, relative_to),
+            'sha256=' + digest.rstrip(b'=').decode('ascii'),
+            str(len(content)))
+
+
+def _read_headers(content):
+    headers = {}
+    for line in content.decode('utf-8').splitlines():
+        key, sep, value = line.partition(':')
+        if sep:
+            headers[key.strip().lower()] = value.strip()
+    return headers
+
+
+def _target(directory, relpath):
+    target = os.path.normpath(os.path.join(directory, relpath))
+    if not target.startswith(os.path.normpath(directory) + os.sep):
+        raise Exception('Refusing to install {0} outside of {1}'.format(
+            relpath, directory))
+    return target
+
+
+def _write(path, content, executable=False):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    if os.path.lexists(path):
+        os.unlink(path)
+    with open(path, 'wb') as fh:
+        fh.write(content)
+    if executable:
+        os.chmod(path, 0o755)
+
+
+def install_wheel(wheel_path, scheme, interpreter):
+    """Install a wheel according to ``scheme``, with its scripts run by
+    ``interpreter``. Returns the ``.dist-info`` directory.
+    """
+    with zipfile.ZipFile(wheel_path) as zf:
+        dist_infos = set(name.split('/', 1)[0] for name in zf.namelist()
+                         if name.split('/', 1)[0].endswith('.dist-info'))
+        if len(dist_infos) != 1:
+            raise Exception('{0} is not a valid wheel'.format(wheel_path))
+        dist_info_name = dist_infos.pop()
+        project = dist_info_name[:-len('.dist-info')].split('-')[0]
+        data_name = dist_info_name[:-len('.dist-info')] + '.data'
+        wheel = _read_headers(zf.read(dist_info_name + '/WHEEL'))
+        if wheel.get('root-is-purelib', 'true').lower() == 'true':
+            root = scheme.purelib
+        else:
+            root = scheme.platlib
+        dist_info = os.path.join(root, dist_info_name)
+
+        rows = []
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            name = info.filename
+            if name in ['{0}/{1}'.format(dist_info_name, signature)
+                        for signature in _SIGNATURES]:
+                continue
+            content = zf.read(info)
+            executable = bool((info.external_attr >> 16) & 0o111)
+            if name.startswith(data_name + '/'):
+                _, key, relpath = name.split('/', 2)
+                if key == 'headers':
+                    target = _target(os.path.join(scheme.headers, project),
+                                     relpath)
+                elif key in Scheme._fields:
+                    target = _target(getattr(scheme, key), relpath)
+                else:
+                    raise Exception('Unknown data directory {0} in {1}'.format(
+                        key, wheel_path))
+                if key == 'scripts':
+                    first, _, rest = content.partition(b'\n')
+                    if first.startswith(b'#!python'):
+                        # Like pip, arguments of the shebang are dropped
+                        content = (script_header(interpreter).encode('utf-8') +
+                                   rest)
+            else:
+                target = _target(root, name)
+            _write(target, content, executable)
+            rows.append(_record_row(target, content, root))
+
+        entry_points = metadata.entry_points(metadata.Distribution(
+            project, None, dist_info, root))
+        for group in ('console_scripts', 'gui_scripts'):
+            for name, reference in sorted(entry_points.get(group, {}).items()):
+                script = launcher_script(interpreter, reference)
+                if script is None:
+                    raise Exception('Cannot generate a script for {0} = {1}'
+                                    .format(name, reference))
+                target = _target(scheme.scripts, name)
+                _write(target, script.encode('utf-8'), True)
+                rows.append(_record_row(target, script.encode('utf-8'), root))
+
+    for name, content in (('INSTALLER', INSTALLER_NAME + '\n'),
+                          ('REQUESTED', '')):
+        target = os.path.join(dist_info, name)
+        _write(target, content.encode('utf-8'))
+        rows.append(_record_row(target, content.encode('utf-8'), root))
+    record = os.path.join(dist_info, 'RECORD')
+    rows.append((os.path.relpath(record, root), '', ''))
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator='\n').writerows(sorted(rows))
+    _write(record, buf.getvalue().encode('utf-8'))
+    return dist_info
+
+
+def uninstall(dist):
+    """Remove an installed distribution and the directories it leaves
+    empty.
+    """
+    directories = set()
+    for path in metadata.record_files(dist):
+        if os.path.lexists(path):
+            os.unlink(path)
+            directories.add(os.path.dirname(path))
+    if os.path.isdir(dist.path):
+        shutil.rmtree(dist.path)
+    for directory in sorted(directories, key=len, reverse=True):
+        while (directory.startswith(dist.site_packages + os.sep) and
+               os.path.isdir(directory) and not os.listdir(directory)):
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
+
+
+def install_wheels(wheel_paths, scheme, interpreter, jobs=None):
+    """Install several wheels at once, up to ``jobs`` at a time.
+
+    Unpacking is mostly decompression and file I/O, which do not hold
+    the GIL, so threads are enough to keep several CPUs busy.
+    """
+    with ThreadPoolExecutor(jobs) as executor:
+        return list(executor.map(
+            lambda path: install_wheel(path, scheme, interpreter),
+            wheel_paths))
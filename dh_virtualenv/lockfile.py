@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Fully pinned, hash-checked lock files for requirements."""
+from __future__ import absolute_import
+
+import re
+
+from .wheelhouse import normalize_name
+
+DIGEST_HEADER = '# requirements-sha256: '
+# Options from the requirements file that are needed to find the
+# locked distributions again
+_INDEX_OPTIONS_RE = re.compile(
+    r'^\s*(-i|-f|--index-url|--extra-index-url|--find-links|--trusted-host)\b')
+
+
+def read_digest(path):
+    """Return the requirements digest recorded in a lock file, or None."""
+    try:
+        with open(path) as fh:
+            for line in fh:
+                if line.startswith(DIGEST_HEADER):
+                    return line[len(DIGEST_HEADER):].strip()
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def pins_from_report(report):
+    """Extract ``(name, version, [hashes])`` from a ``pip install --report``.
+
+    Returns None if any of the installed distributions does not come
+    from an archive with a known hash (e.g. a local directory or a VCS
+    checkout), since those cannot be locked.
+    """
+    pins = []
+    for item in report.get('install', []):
+        archive_info = item.get('download_info', {}).get('archive_info')
+        if not archive_info:
+            return None
+        hashes = dict(archive_info.get('hashes', {}))
+        if 'sha256' not in hashes and 'hash' in archive_info:
+            algorithm, _, value = archive_info['hash'].partition('=')
+            hashes[algorithm] = value
+        if 'sha256' not in hashes:
+            return None
+        pins.append((normalize_name(item['metadata']['name']),
+                     item['metadata']['version'], [hashes['sha256']]))
+    return sorted(pins)
+
+
+def format_lock(requirements, digest, pins, source='requirements'):
+    """Render a lock file for ``pins``, created from the given contents
+    of a requirements file with the given ``digest``.
+    """
+    lines = [
+        '# Generated by dh-virtualenv from {0}, do not edit.'.format(source),
+        DIGEST_HEADER + digest,
+    ]
+    lines.extend(line.strip() for line in requirements.splitlines()
+                 if _INDEX_OPTIONS_RE.match(line))
+    for name, version, hashes in pins:
+        lines.append(' \\\n'.join(
+            ['{0}=={1}'.format(name, version)] +
+            ['    --hash=sha256:{0}'.format(h) for h in sorted(set(hashes))]))
+    return '\n'.join(lines) + '\n'
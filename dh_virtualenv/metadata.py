@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Helpers to read the metadata of distributions installed in a virtualenv."""
+from __future__ import absolute_import
+
+import collections
+import configparser
+import csv
+import glob
+import os
+
+from .wheelhouse import normalize_name
+
+Distribution = collections.namedtuple(
+    'Distribution', ['name', 'version', 'path', 'site_packages'])
+
+
+def site_packages_dirs(venv_dir):
+    """Return the ``site-packages`` directories of a virtualenv."""
+    return [path for path in
+            sorted(glob.glob(os.path.join(venv_dir, 'lib', '*', 'site-packages')))
+            if not os.path.islink(path)]
+
+
+def _read_headers(path):
+    headers = {}
+    try:
+        with open(path, encoding='utf-8', errors='replace') as fh:
+            for line in fh:
+                if not line.strip():
+                    break
+                key, sep, value = line.partition(':')
+                if sep and not key.startswith((' ', '\t')):
+                    headers.setdefault(key.strip().lower(), value.strip())
+    except (IOError, OSError):
+        pass
+    return headers
+
+
+def distributions(venv_dir):
+    """Return the distributions installed in a virtualenv, as found by
+    their ``.dist-info`` directories.
+    """
+    found = []
+    for site_packages in site_packages_dirs(venv_dir):
+        for entry in sorted(os.listdir(site_packages)):
+            if not entry.endswith('.dist-info'):
+                continue
+            path = os.path.join(site_packages, entry)
+            headers = _read_headers(os.path.join(path, 'METADATA'))
+            name, _, version = entry[:-len('.dist-info')].partition('-')
+            found.append(Distribution(
+                normalize_name(headers.get('name', name)),
+                headers.get('version', version), path, site_packages))
+    return found
+
+
+def local_distributions(venv_dir):
+    """Return the names of the distributions that were installed from a
+    local directory, a file or a URL rather than from an index, as
+    recorded in their ``direct_url.json`` (PEP 610).
+    """
+    return set(dist.name for dist in distributions(venv_dir)
+               if os.path.exists(os.path.join(dist.path, 'direct_url.json')))
+
+
+def record_files(dist):
+    """Return the absolute, normalized paths listed in the ``RECORD``
+    of a distribution. Paths are relative to ``site-packages`` there,
+    scripts for example are listed as ``../../../bin/foo``.
+    """
+    try:
+        with open(os.path.join(dist.path, 'RECORD'), newline='',
+                  encoding='utf-8') as fh:
+            rows = list(csv.reader(fh))
+    except (IOError, OSError):
+        return []
+    return [os.path.normpath(os.path.join(dist.site_packages, row[0]))
+            for row in rows if row and row[0]]
+
+
+def entry_points(dist):
+    """Return the entry points of a distribution as a mapping of group
+    names to ``{name: object reference}`` mappings.
+    """
+    parser = configparser.ConfigParser(delimiters=('=',), interpolation=None)
+    parser.optionxform = str
+    try:
+        parser.read(os.path.join(dist.path, 'entry_points.txt'),
+                    encoding='utf-8')
+    except configparser.Error:
+        return {}
+    return dict((group, dict(parser.items(group)))
+                for group in parser.sections())
+
+
+def parse_object_reference(reference):
+    """Split an entry point reference like ``pkg.mod:obj.attr [extra]``
+    into the module name and the attribute path (which may be empty).
+    """
+    reference = reference.split('[', 1)[0].strip()
+    module, _, attrs = reference.partition(':')
+    return module.strip(), attrs.strip()
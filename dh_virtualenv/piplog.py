@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Turn the log pip writes with ``--log`` into a timeline."""
+from __future__ import absolute_import
+
+import collections
+import datetime
+import os
+import re
+
+from .wheelhouse import (SDIST_EXTENSIONS, normalize_name,
+                         parse_sdist_filename, parse_wheel_filename)
+
+_RECORD_RE = re.compile(
+    r'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d,\d{3}) (.*)$')
+# Events of the top-level pip process; output of nested pip processes
+# (like those installing build dependencies) is indented further
+_COLLECT_RE = re.compile(r'^(?:Collecting|Processing|Obtaining) (\S+)')
+_SOURCE_RE = re.compile(
+    r'^  Source in (\S+) has version \S+, which satisfies requirement '
+    r'([A-Za-z0-9][A-Za-z0-9._-]*)')
+_DOWNLOAD_RE = re.compile(
+    r'^  (Downloading|Using cached) (\S+)'
+    r'(?: \((\d+(?:\.\d+)?) (bytes|kB|MB|GB)\))?')
+_BUILD_RE = re.compile(
+    r"^  Building wheel for (\S+) \(([^)]+)\): "
+    r"(started|finished with status '(\w+)')")
+_CREATED_RE = re.compile(
+    r'^  Created wheel for (\S+): filename=(\S+) size=(\d+)')
+_INSTALLING = 'Installing collected packages: '
+_INSTALLED = 'Successfully installed '
+_NAME_RE = re.compile(r'^([A-Za-z0-9][A-Za-z0-9._-]*)')
+_UNITS = {'bytes': 1, 'kB': 1000, 'MB': 1000 ** 2, 'GB': 1000 ** 3}
+
+
+def parse_records(lines):
+    """Return the ``(datetime, message)`` records in pip's log.
+
+    Lines without a timestamp continue the previous record, and are
+    not needed here.
+    """
+    records = []
+    for line in lines:
+        match = _RECORD_RE.match(line.rstrip('\n'))
+        if match:
+            records.append((
+                datetime.datetime.strptime(match.group(1),
+                                           '%Y-%m-%dT%H:%M:%S,%f'),
+                match.group(2)))
+    return records
+
+
+def _key(requirement):
+    """Name the distribution a requirement or file refers to, falling
+    back to the requirement itself (e.g. for a local directory).
+    """
+    basename = os.path.basename(requirement.split('#', 1)[0])
+    parsed = parse_wheel_filename(basename) or parse_sdist_filename(basename)
+    if parsed is not None:
+        return parsed[0]
+    match = _NAME_RE.match(requirement)
+    if match is None or '/' in requirement or ':' in requirement:
+        return requirement
+    return normalize_name(match.group(1))
+
+
+def _source(filename):
+    if filename.endswith('.whl'):
+        return 'wheel'
+    if filename.endswith(SDIST_EXTENSIONS):
+        return 'sdist'
+    return 'directory'
+
+
+def _seconds(start, end):
+    return round((end - start).total_seconds(), 3)
+
+
+def parse_log(lines):
+    """Build the timeline of a single pip invocation from its log.
+
+    For every distribution, this has the time spent collecting it
+    (resolving, fetching metadata) apart from downloading, the size and
+    duration of the download (or whether a cached file was used), the
+    kind of file it came from, and the time spent building a wheel from
+    it. pip does not log when it installs the individual distributions,
+    so only the total time of the installation step is reported.
+    """
+    records = parse_records(lines)
+    distributions = collections.OrderedDict()
+    timeline = {'distributions': distributions, 'install_seconds': None,
+                'wall_seconds': 0.0}
+    if not records:
+        return timeline
+    timeline['wall_seconds'] = _seconds(records[0][0], records[-1][0])
+
+    def entry(key):
+        return distributions.setdefault(key, {
+            'source': None, 'resolve_seconds': 0.0, 'download_seconds': 0.0,
+            'download_bytes': 0, 'cached': False, 'build_seconds': None,
+            'build_backend': None, 'wheel_bytes': None, 'version': None})
+
+    collecting = None
+    collect_start = None
+    build_start = {}
+    install_start = None
+    for index, (when, message) in enumerate(records):
+        following = records[index + 1][0] if index + 1 < len(records) else when
+        match = _COLLECT_RE.match(message)
+        boundary = (match or message.startswith(_INSTALLING) or
+                    message.startswith('Building wheels for collected'))
+        if boundary and collecting is not None:
+            entry(collecting)['resolve_seconds'] += _seconds(collect_start, when)
+            collecting = None
+        if match:
+            collecting = _key(match.group(1))
+            collect_start = when
+            if message.startswith('Processing'):
+                entry(collecting)['source'] = _source(match.group(1))
+            else:
+                entry(collecting)
+            continue
+
+        match = _SOURCE_RE.match(message)
+        if match and match.group(1) in distributions:
+            name = normalize_name(match.group(2))
+            distributions[name] = distributions.pop(match.group(1))
+            if collecting == match.group(1):
+                collecting = name
+            continue
+
+        match = _DOWNLOAD_RE.match(message)
+        if match and collecting is not None:
+            item = entry(collecting)
+            item['source'] = _source(match.group(2))
+            if match.group(1) == 'Using cached':
+                item['cached'] = True
+                continue
+            duration = _seconds(when, following)
+            item['download_seconds'] += duration
+            # Keep downloading apart from the rest of the collection
+            item['resolve_seconds'] -= duration
+            if match.group(3):
+                item['download_bytes'] += int(
+                    float(match.group(3)) * _UNITS[match.group(4)])
+            continue
+
+        match = _BUILD_RE.match(message)
+        if match:
+            name = normalize_name(match.group(1))
+            if match.group(3) == 'started':
+                build_start[name] = when
+            elif name in build_start:
+                item = entry(name)
+                item['build_seconds'] = _seconds(build_start.pop(name), when)
+                item['build_backend'] = match.group(2)
+            continue
+
+        match = _CREATED_RE.match(message)
+        if match:
+            entry(normalize_name(match.group(1)))['wheel_bytes'] = int(
+                match.group(3))
+            continue
+
+        if message.startswith(_INSTALLING):
+            install_start = when
+        elif message.startswith(_INSTALLED):
+            if install_start is not None:
+                timeline['install_seconds'] = _seconds(install_start, when)
+            for installed in message[len(_INSTALLED):].split():
+                name, _, version = installed.rpartition('-')
+                if normalize_name(name) in distributions:
+                    distributions[normalize_name(name)]['version'] = version
+
+    if collecting is not None:
+        entry(collecting)['resolve_seconds'] += _seconds(
+            collect_start, records[-1][0])
+    for item in distributions.values():
+        item['resolve_seconds'] = round(item['resolve_seconds'], 3)
+        item['download_seconds'] = round(item['download_seconds'], 3)
+    return timeline
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Helpers to measure the start-up cost of the packaged software."""
+from __future__ import absolute_import
+
+import collections
+import os
+import re
+import signal
+import statistics
+import subprocess
+import threading
+import time
+
+ImportTime = collections.namedtuple(
+    'ImportTime', ['module', 'level', 'self_us', 'cumulative_us'])
+
+_IMPORTTIME_RE = re.compile(
+    r'^import time:\s*(?P<self>\d+)\s*\|\s*(?P<cumulative>\d+)\s*\|(?P<name>.*)$')
+
+
+def parse_importtime(lines):
+    """Parse the output of ``python -X importtime``.
+
+    Every imported module is reported after the modules it imports
+    itself, nested one level deeper (two more spaces of indentation).
+    Lines that are not part of the report are ignored.
+    """
+    imports = []
+    for line in lines:
+        match = _IMPORTTIME_RE.match(line.rstrip('\n'))
+        if not match:
+            continue
+        name = match.group('name')
+        module = name.lstrip()
+        imports.append(ImportTime(
+            module, (len(name) - len(module) - 1) // 2,
+            int(match.group('self')), int(match.group('cumulative'))))
+    return imports
+
+
+def evict_page_cache(root):
+    """Ask the kernel to drop the cached pages of all files below
+    ``root``, so the next run has to read them from disk again. Pages
+    of files that have not been written back yet stay cached.
+    """
+    for dirpath, dirs, files in os.walk(root):
+        for f in files:
+            path = os.path.join(dirpath, f)
+            if os.path.islink(path):
+                continue
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+def _exit_code(status):
+    # Like os.waitstatus_to_exitcode, which needs Python 3.9
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def run_measured(cmd, timeout=None):
+    """Run ``cmd`` with its output discarded, and return its exit
+    status, wall clock time in seconds, and peak memory usage in KiB.
+
+    The command runs in a new session without a terminal or input. If it
+    does not exit within ``timeout`` seconds, it is killed along with
+    the processes it started, and ``subprocess.TimeoutExpired`` raised.
+    """
+    expired = []
+
+    def kill():
+        expired.append(True)
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+    try:
+        _, status, rusage = os.wait4(process.pid, 0)
+    finally:
+        if timer is not None:
+            timer.cancel()
+    wall = time.perf_counter() - start
+    process.returncode = _exit_code(status)
+    if expired:
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    return process.returncode, wall, rusage.ru_maxrss
+
+
+def summarize(samples):
+    """Summarize ``(wall seconds, max RSS)`` samples of repeated runs."""
+    walls = [wall for wall, _ in samples]
+    return {
+        'wall_seconds': {'min': min(walls),
+                         'median': statistics.median(walls),
+                         'max': max(walls)},
+        'max_rss_kb': max(rss for _, rss in samples),
+    }
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Share the CPUs and memory of the build host between the compilers
+run while installing requirements.
+"""
+from __future__ import absolute_import
+
+import os
+import re
+
+# Memory assumed for each compiler process, by default
+DEFAULT_JOB_MEMORY = 2 * 1024 ** 3
+_MAKEFLAGS_JOBS_RE = re.compile(
+    r'^(-j\d*|--jobs(=\d+)?|--jobserver-(auth|fds)=.*)$')
+
+
+def parallel_option(build_options):
+    """Return N from ``parallel=N`` in ``DEB_BUILD_OPTIONS``, or None."""
+    for option in build_options.split():
+        key, _, value = option.partition('=')
+        if key == 'parallel' and value.isdigit() and int(value) > 0:
+            return int(value)
+    return None
+
+
+def available_cpus():
+    """Return the number of CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def available_memory(meminfo='/proc/meminfo'):
+    """Return the memory available to new processes in bytes, or None
+    if it cannot be told.
+    """
+    try:
+        with open(meminfo) as fh:
+            for line in fh:
+                key, _, value = line.partition(':')
+                if key == 'MemAvailable':
+                    return int(value.split()[0]) * 1024
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def compile_jobs(cpus, memory, job_memory, parallel=None, builds=1):
+    """Return how many compiler processes each of ``builds`` concurrent
+    builds may run, so that all of them together use no more than the
+    CPUs, ``parallel`` jobs and the available memory. At least one.
+    """
+    jobs = cpus
+    if parallel:
+        jobs = min(jobs, parallel)
+    if memory is not None:
+        jobs = min(jobs, memory // job_memory)
+    return max(1, jobs // max(1, builds))
+
+
+def build_env(jobs, makeflags=''):
+    """Return the environment variables telling make, CMake,
+    numpy.distutils and PyTorch's extension builder to run up to ``jobs``
+    compiler processes. Other flags in ``makeflags`` are kept.
+    """
+    flags = [flag for flag in makeflags.split()
+             if not _MAKEFLAGS_JOBS_RE.match(flag)]
+    flags.append('-j{0}'.format(jobs))
+    return {
+        'MAKEFLAGS': ' '.join(flags),
+        'MAX_JOBS': str(jobs),
+        'NPY_NUM_BUILD_JOBS': str(jobs),
+        'CMAKE_BUILD_PARALLEL_LEVEL': str(jobs),
+    }
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Serve a directory of distribution files as a PEP 503 simple index."""
+from __future__ import absolute_import
+
+import html
+import os
+import pathlib
+
+from .wheelhouse import parse_sdist_filename, parse_wheel_filename
+
+_PAGE = '''<!DOCTYPE html>
+<html>
+  <head><meta name="pypi:repository-version" content="1.0"><title>{title}</title></head>
+  <body>
+{links}
+  </body>
+</html>
+'''
+
+
+def _page(title, links):
+    return _PAGE.format(title=html.escape(title), links='\n'.join(
+        '    <a href="{0}">{1}</a><br>'.format(html.escape(href),
+                                               html.escape(text))
+        for href, text in links))
+
+
+def find_distributions(artifact_dir):
+    """Return a mapping of normalized project names to the sorted paths
+    of the wheels and source distributions below ``artifact_dir``.
+    """
+    projects = {}
+    for root, dirs, files in os.walk(artifact_dir):
+        dirs.sort()
+        for filename in files:
+            parsed = (parse_wheel_filename(filename) or
+                      parse_sdist_filename(filename))
+            if parsed is not None:
+                projects.setdefault(parsed[0], []).append(
+                    os.path.abspath(os.path.join(root, filename)))
+    for paths in projects.values():
+        paths.sort(key=os.path.basename)
+    return projects
+
+
+def build_index(artifact_dir, index_dir):
+    """Write a simple index of the distributions in ``artifact_dir`` to
+    ``index_dir``, linking to the files where they are. The output only
+    depends on the files present. Returns the number of projects.
+    """
+    projects = find_distributions(artifact_dir)
+    for name, paths in projects.items():
+        project_dir = os.path.join(index_dir, name)
+        os.makedirs(project_dir, exist_ok=True)
+        with open(os.path.join(project_dir, 'index.html'), 'w') as fh:
+            fh.write(_page('Links for ' + name, [
+                (pathlib.Path(path).as_uri(), os.path.basename(path))
+                for path in paths]))
+    with open(os.path.join(index_dir, 'index.html'), 'w') as fh:
+        fh.write(_page('Simple index', [
+            (name + '/', name) for name in sorted(projects)]))
+    return len(projects)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Resource usage accounting for the phases of a package build."""
+from __future__ import absolute_import
+
+import contextlib
+import logging
+import resource
+import time
+
+log = logging.getLogger(__name__)
+
+
+class PhaseTimer(object):
+    """Record wall clock time, CPU time and memory usage of build phases.
+
+    CPU time covers this process and all child processes (pip, compilers,
+    ...) that finished during the phase. Peak memory is the largest
+    resident set size of any child process waited for so far, as
+    reported by ``getrusage(RUSAGE_CHILDREN)``; it is a high-water mark,
+    so it only grows when a phase's children exceed all earlier ones.
+    """
+
+    def __init__(self):
+        self.phases = []
+
+    @staticmethod
+    def _sample():
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return (time.time(), time.process_time(),
+                children.ru_utime + children.ru_stime, children.ru_maxrss)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context manager measuring the phase called ``name``."""
+        start = self._sample()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            end = self._sample()
+            record = {
+                'name': name,
+                'wall_seconds': round(end[0] - start[0], 3),
+                'cpu_seconds': round(end[1] - start[1], 3),
+                'children_cpu_seconds': round(end[2] - start[2], 3),
+                'children_max_rss_kb': end[3],
+                'failed': failed,
+            }
+            self.phases.append(record)
+            log.debug('%s took %.1fs wall, %.1fs CPU (children %.1fs)',
+                      name, record['wall_seconds'], record['cpu_seconds'],
+                      record['children_cpu_seconds'])
+
+    def report(self):
+        """Return all recorded phases in a JSON serializable form."""
+        return {
+            'phases': self.phases,
+            'wall_seconds': round(
+                sum(p['wall_seconds'] for p in self.phases), 3),
+        }
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+
+"""Persistent wheel cache shared between package builds."""
+from __future__ import absolute_import
+
+import hashlib
+import os
+import re
+import tempfile
+
+from . import cache
+
+_WHEEL_RE = re.compile(r'^(?P<name>[^-]+)-(?P<version>[^-]+)(-\d[^-]*)?'
+                       r'-[^-]+-[^-]+-[^-]+\.whl$')
+SDIST_EXTENSIONS = ('.tar.gz', '.tar.bz2', '.tar.xz', '.tgz', '.zip')
+
+
+def normalize_name(name):
+    """Normalize a project name as described in PEP 503."""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def parse_wheel_filename(filename):
+    """Return the normalized ``(name, version)`` of a wheel file, or None."""
+    match = _WHEEL_RE.match(os.path.basename(filename))
+    if not match:
+        return None
+    return normalize_name(match.group('name')), match.group('version').lower()
+
+
+def parse_sdist_filename(filename):
+    """Return the normalized ``(name, version)`` of a source
+    distribution file, or None.
+    """
+    basename = os.path.basename(filename)
+    for extension in SDIST_EXTENSIONS:
+        if basename.endswith(extension):
+            name, sep, version = basename[:-len(extension)].rpartition('-')
+            if sep and name:
+                return normalize_name(name), version.lower()
+    return None
+
+
+def parse_pins(lines):
+    """Extract ``(name, version)`` tuples from ``pip freeze`` output.
+
+    Editable installs and direct URL references cannot be fetched from
+    an index, so they are skipped.
+    """
+    pins = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith(('#', '-')) or '==' not in line:
+            continue
+        name, version = line.split('==', 1)
+        pins.append((normalize_name(name), version.strip().lower()))
+    return pins
+
+
+def requirements_key(*parts):
+    """Hash the given strings into a stable manifest key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class Wheelhouse(object):
+    """A directory of wheels for one interpreter ABI and platform.
+
+    Wheels are addressed by their file name, which already encodes the
+    project name, version and compatibility tags.  The directory itself
+    is keyed by ``tag`` so wheels built against different interpreters
+    never mix.  Manifests record the pinned set of distributions a given
+    requirements set resolved to, so later builds can tell whether the
+    wheelhouse can satisfy them without consulting an index.
+    """
+
+    def __init__(self, root, tag):
+        self.path = os.path.join(root, 'wheels', tag)
+        self.manifest_dir = os.path.join(self.path, 'manifests')
+
+    def wheels(self):
+        """Return a mapping of ``(name, version)`` to wheel paths."""
+        if not os.path.isdir(self.path):
+            return {}
+        found = {}
+        for filename in sorted(os.listdir(self.path)):
+            key = parse_wheel_filename(filename)
+            if key is not None:
+                found[key] = os.path.join(self.path, filename)
+        return found
+
+    def missing(self, pins):
+        """Return the pins that have no wheel in the wheelhouse."""
+        available = self.wheels()
+        return [pin for pin in pins if pin not in available]
+
+    def manifest_path(self, key):
+        return os.path.join(self.manifest_dir, key + '.txt')
+
+    def load_manifest(self, key):
+        """Return the pins recorded for ``key``, or None if unknown."""
+        try:
+            with open(self.manifest_path(key)) as fh:
+                return parse_pins(fh)
+        except (IOError, OSError):
+            return None
+
+    def save_manifest(self, key, pins):
+        """Atomically record ``pins`` as the resolution of ``key``."""
+        if not os.path.isdir(self.manifest_dir):
+            os.makedirs(self.manifest_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=self.manifest_dir)
+        with os.fdopen(fd, 'w') as fh:
+            fh.writelines('{0}=={1}\n'.format(*pin) for pin in sorted(pins))
+        os.rename(tmp_path, self.manifest_path(key))
+
+    def is_complete(self, key):
+        """Check whether every pin recorded for ``key`` has a wheel."""
+        pins = self.load_manifest(key)
+        return pins is not None and not self.missing(pins)
+
+    def pip_args(self, key):
+        """Return the pip arguments to install from the wheelhouse."""
+        args = ['--find-links={0}'.format(self.path)]
+        if self.is_complete(key):
+            args.insert(0, '--no-index')
+        return args
+
+    def staging_dir(self):
+        """Create a scratch directory on the wheelhouse's file system."""
+        return cache.staging_dir(self.path)
+
+    def add(self, wheel_path):
+        """Move a wheel from a staging directory into the wheelhouse."""
+        cache.publish(wheel_path,
+                      os.path.join(self.path, os.path.basename(wheel_path)))
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+import functools
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+
+from nose.tools import eq_, ok_
+
+AUTOSCRIPTS = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'autoscripts')
+
+
+def temporary_dir(fn):
+    """Pass a temporary directory to the fn, and remove it afterwards."""
+    @functools.wraps(fn)
+    def _inner(*args, **kwargs):
+        tempdir = tempfile.mkdtemp()
+        try:
+            return fn(tempdir, *args, **kwargs)
+        finally:
+            shutil.rmtree(tempdir)
+    return _inner
+
+
+def replace_file(path, content):
+    """Replace the file at ``path`` like a package upgrade would, rather
+    than writing to it, which would change all its hard links too.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as fh:
+        fh.write(content)
+    os.chmod(tmp_path, 0o755)
+    os.rename(tmp_path, path)
+
+
+def read(path):
+    with open(path) as fh:
+        return fh.read()
+
+
+def run_autoscript(tempdir, when, *args):
+    """Run the autoscript for ``when`` for the package ``foo``, with the
+    registry and interpreters in ``tempdir``, and return its output.
+    """
+    with open(os.path.join(AUTOSCRIPTS, when + '-dh-virtualenv')) as fh:
+        script = fh.read()
+    script = script.replace('#ARGS#', '\n'.join([
+        "dh_venv_install_dir='{0}'".format(os.path.join(tempdir, 'venv')),
+        "dh_venv_interpreter_dir='{0}'".format(os.path.join(tempdir, 'bin')),
+        "dh_venv_package='foo'",
+        "dh_venv_registry='{0}'".format(os.path.join(tempdir, 'registry')),
+    ]))
+    path = os.path.join(tempdir, when)
+    with open(path, 'w') as fh:
+        fh.write(script)
+    env = dict((key, value) for key, value in os.environ.items()
+               if key != 'DH_VERBOSE')
+    return subprocess.check_output(['sh', path] + list(args), env=env,
+                                   stderr=subprocess.STDOUT).decode('utf-8')
+
+
+def make_venv(tempdir):
+    """Create an interpreter, and a virtualenv with an older copy of it."""
+    os.makedirs(os.path.join(tempdir, 'bin'))
+    replace_file(os.path.join(tempdir, 'bin', 'python3.99'), 'new')
+    venv_bin = os.path.join(tempdir, 'venv', 'bin')
+    os.makedirs(venv_bin)
+    os.makedirs(os.path.join(tempdir, 'venv', 'lib', 'python3.99'))
+    replace_file(os.path.join(venv_bin, 'python3.99'), 'old')
+    os.symlink('python3.99', os.path.join(venv_bin, 'python'))
+    return os.path.join(venv_bin, 'python3.99')
+
+
+def registry_entry(tempdir):
+    return read(os.path.join(tempdir, 'registry', 'venvs', 'foo')).split()
+
+
+def checksum(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+@temporary_dir
+def test_postinst_registers_and_updates(tempdir):
+    venv_python = make_venv(tempdir)
+    output = run_autoscript(tempdir, 'postinst', 'configure')
+    ok_('Successfully updated {0}'.format(venv_python) in output)
+    eq_('new', read(venv_python))
+    eq_('old', read(venv_python + ',orig'))
+    eq_(['python3.99', checksum('new'), os.path.join(tempdir, 'venv')],
+        registry_entry(tempdir))
+    ok_(os.path.islink(os.path.join(tempdir, 'venv', 'bin', 'python')))
+
+
+@temporary_dir
+def test_postinst_skips_current_virtualenvs(tempdir):
+    venv_python = make_venv(tempdir)
+    run_autoscript(tempdir, 'postinst', 'configure')
+
+    # Not even compared to the interpreter again
+    replace_file(venv_python, 'changed')
+    output = run_autoscript(tempdir, 'postinst', 'triggered',
+                            '/usr/bin/python3.99')
+    eq_('', output)
+    eq_('changed', read(venv_python))
+    eq_(checksum('new'), registry_entry(tempdir)[1])
+
+
+@temporary_dir
+def test_postinst_updates_after_interpreter_change(tempdir):
+    venv_python = make_venv(tempdir)
+    run_autoscript(tempdir, 'postinst', 'configure')
+
+    replace_file(os.path.join(tempdir, 'bin', 'python3.99'), 'newer')
+    output = run_autoscript(tempdir, 'postinst', 'triggered',
+                            'dh-virtualenv-interpreter-update')
+    ok_('Successfully updated {0}'.format(venv_python) in output)
+    eq_('newer', read(venv_python))
+    # The backup is only made once
+    eq_('old', read(venv_python + ',orig'))
+    eq_(checksum('newer'), registry_entry(tempdir)[1])
+    eq_([checksum('newer')], read(os.path.join(
+        tempdir, 'registry', 'interpreters', 'python3.99')).split()[1:])
+
+
+@temporary_dir
+def test_prerm_unregisters(tempdir):
+    venv_python = make_venv(tempdir)
+    run_autoscript(tempdir, 'postinst', 'configure')
+    run_autoscript(tempdir, 'prerm', 'upgrade', '1.0')
+    ok_(os.path.exists(os.path.join(tempdir, 'registry', 'venvs', 'foo')))
+
+    run_autoscript(tempdir, 'prerm', 'remove')
+    eq_([], os.listdir(os.path.join(tempdir, 'registry', 'venvs')))
+    ok_(not os.path.exists(venv_python + ',orig'))
+
+
+@temporary_dir
+def test_postrm_purge(tempdir):
+    venvs = os.path.join(tempdir, 'registry', 'venvs')
+    os.makedirs(venvs)
+    for name in ('foo', 'foo,new', 'bar'):
+        replace_file(os.path.join(venvs, name), 'python3.99 unknown /venv')
+
+    run_autoscript(tempdir, 'postrm', 'remove')
+    eq_(['bar', 'foo', 'foo,new'], sorted(os.listdir(venvs)))
+
+    # Other virtualenvs stay registered
+    run_autoscript(tempdir, 'postrm', 'purge')
+    eq_(['bar'], os.listdir(venvs))
+
+    os.unlink(os.path.join(venvs, 'bar'))
+    replace_file(os.path.join(venvs, 'foo'), 'python3.99 unknown /venv')
+    run_autoscript(tempdir, 'postrm', 'purge')
+    ok_(not os.path.exists(venvs))
+    ok_(os.path.isdir(os.path.join(tempdir, 'registry')))
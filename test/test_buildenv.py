@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from nose.tools import eq_, ok_
+
+from dh_virtualenv import buildenv
+
+PYPROJECT = '''\
+[build-system]
+requires = ["wheel", "setuptools>=61", "Cython", "setuptools>=61"]
+build-backend = "setuptools.build_meta"
+'''
+
+
+def test_parse_build_requires():
+    eq_(['Cython', 'setuptools>=61', 'wheel'],
+        buildenv.parse_build_requires(PYPROJECT))
+    eq_(['setuptools>=40.8.0'],
+        buildenv.parse_build_requires('[project]\nname = "foo"\n'))
+    try:
+        buildenv.parse_build_requires('[build-system]\nrequires = "foo"\n')
+    except ValueError:
+        pass
+    else:
+        ok_(False, 'Accepted requirements that are not a list')
+
+
+def test_project_build_requires():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        eq_(None, buildenv.project_build_requires(tmpdir))
+        with open(os.path.join(tmpdir, 'pyproject.toml'), 'w') as fh:
+            fh.write(PYPROJECT)
+        eq_(['Cython', 'setuptools>=61', 'wheel'],
+            buildenv.project_build_requires(tmpdir))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_project_name():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        eq_(None, buildenv.project_name(tmpdir))
+        with open(os.path.join(tmpdir, 'setup.cfg'), 'w') as fh:
+            fh.write('[metadata]\nname = Foo_Bar\n')
+        eq_('foo-bar', buildenv.project_name(tmpdir))
+        with open(os.path.join(tmpdir, 'pyproject.toml'), 'w') as fh:
+            fh.write(PYPROJECT + '[project]\nname = "foo.baz"\n')
+        eq_('foo-baz', buildenv.project_name(tmpdir))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_sdist_build_requires():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        tar_path = os.path.join(tmpdir, 'foo-1.0.tar.gz')
+        with tarfile.open(tar_path, 'w:gz') as tf:
+            for name, content in (('foo-1.0/tests/pyproject.toml', b'x = '),
+                                  ('foo-1.0/pyproject.toml', PYPROJECT.encode())):
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                tf.addfile(info, io.BytesIO(content))
+        eq_(['Cython', 'setuptools>=61', 'wheel'],
+            buildenv.sdist_build_requires(tar_path))
+
+        zip_path = os.path.join(tmpdir, 'foo-1.0.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            zf.writestr('foo-1.0/setup.py', '')
+        eq_(None, buildenv.sdist_build_requires(zip_path))
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            zf.writestr('foo-1.0/pyproject.toml', 'invalid = ')
+        eq_(None, buildenv.sdist_build_requires(zip_path))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_environment():
+    env = buildenv.environment('/cache/env', {'PATH': '/usr/bin', 'FOO': '1'})
+    eq_({'PATH': '/cache/env/site/bin:/usr/bin', 'FOO': '1',
+         'PYTHONPATH': '/cache/env/site'}, env)
+    env = buildenv.environment('/cache/env', {'PYTHONPATH': '/src'})
+    eq_('/cache/env/site:/src', env['PYTHONPATH'])
+
+
+def test_build_env_cache():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        cache = buildenv.BuildEnvCache(tmpdir, 'cpython-311-linux-x86_64')
+        requires = ['setuptools>=61', 'wheel']
+        env_dir = cache.env_dir(requires)
+        ok_(env_dir.startswith(os.path.join(
+            tmpdir, 'build-envs', 'cpython-311-linux-x86_64', '')))
+        ok_(env_dir != cache.env_dir(['setuptools>=61']))
+
+        with cache.prepare(requires) as staging:
+            os.makedirs(os.path.join(staging, 'site'))
+        ok_(os.path.isdir(os.path.join(env_dir, 'site')))
+        with open(os.path.join(env_dir, 'requires.txt')) as fh:
+            eq_('setuptools>=61\nwheel\n', fh.read())
+
+        # Another build was faster
+        with cache.prepare(requires) as staging:
+            pass
+        ok_(not os.path.exists(staging))
+        ok_(os.path.isdir(os.path.join(env_dir, 'site')))
+    finally:
+        shutil.rmtree(tmpdir)
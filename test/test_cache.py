@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_, assert_raises
+
+from dh_virtualenv import cache
+
+
+def test_entry():
+    root = tempfile.mkdtemp()
+    try:
+        path = os.path.join(root, 'envs', 'foo')
+        with cache.entry(path) as staging:
+            eq_(os.path.join(root, 'envs'), os.path.dirname(staging))
+            ok_(not os.path.exists(path))
+            with open(os.path.join(staging, 'foo'), 'w') as fh:
+                fh.write('first')
+        eq_(['foo'], os.listdir(os.path.join(root, 'envs')))
+
+        # Another build was faster
+        with cache.entry(path) as staging:
+            with open(os.path.join(staging, 'foo'), 'w') as fh:
+                fh.write('second')
+        eq_(['foo'], os.listdir(os.path.join(root, 'envs')))
+        with open(os.path.join(path, 'foo')) as fh:
+            eq_('first', fh.read())
+    finally:
+        shutil.rmtree(root)
+
+
+def test_entry_failed():
+    root = tempfile.mkdtemp()
+    try:
+        path = os.path.join(root, 'foo')
+
+        def prepare():
+            with cache.entry(path):
+                raise ValueError('failed')
+
+        assert_raises(ValueError, prepare)
+        eq_([], os.listdir(root))
+    finally:
+        shutil.rmtree(root)
+
+
+def test_publish_file():
+    root = tempfile.mkdtemp()
+    try:
+        staging = cache.staging_dir(os.path.join(root, 'wheels'))
+        for content in ('first', 'second'):
+            staged = os.path.join(staging, 'foo.whl')
+            with open(staged, 'w') as fh:
+                fh.write(content)
+            cache.publish(staged, os.path.join(root, 'wheels', 'foo.whl'))
+        with open(os.path.join(root, 'wheels', 'foo.whl')) as fh:
+            eq_('second', fh.read())
+        eq_([], os.listdir(staging))
+    finally:
+        shutil.rmtree(root)
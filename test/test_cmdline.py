@@ -192,3 +192,46 @@ def test_builtin_venv_and_setuptools_conflict():
             parser.parse_args(args)
             ok_(error_message in f.getvalue())
             sysexit.assert_called_once_with(2)
+
+
+def test_jobs_option():
+    parser = cmdline.get_default_parser()
+    opts, args = parser.parse_args()
+    eq_(1, opts.jobs)
+    opts, args = parser.parse_args(['-O--jobs', '4'])
+    eq_(4, opts.jobs)
+
+
+def test_bytecode_options():
+    parser = cmdline.get_default_parser()
+    opts, args = parser.parse_args([])
+    eq_(False, opts.compile_bytecode)
+    eq_([], opts.bytecode_optimize)
+    eq_('checked-hash', opts.bytecode_invalidation_mode)
+    opts, args = parser.parse_args([
+        '--compile-bytecode', '--bytecode-optimize', '1',
+        '--bytecode-optimize', '2',
+        '--bytecode-invalidation-mode', 'unchecked-hash'])
+    eq_(True, opts.compile_bytecode)
+    eq_(['1', '2'], opts.bytecode_optimize)
+    eq_('unchecked-hash', opts.bytecode_invalidation_mode)
+
+
+def test_max_size_option():
+    parser = cmdline.get_default_parser()
+    opts, args = parser.parse_args([])
+    eq_(None, opts.max_size)
+    opts, args = parser.parse_args(['--max-size', '1000'])
+    eq_(1000, opts.max_size)
+    opts, args = parser.parse_args(['--max-size', '400M'])
+    eq_(400 * 1024 * 1024, opts.max_size)
+
+
+@patch('sys.exit')
+def test_max_size_option_invalid(exit_):
+    parser = cmdline.get_default_parser()
+    f = get_mocked_stderr()
+    with patch('sys.stderr', f):
+        parser.parse_args(['--max-size', 'lots'])
+    ok_('--max-size expects a size in bytes' in f.getvalue())
+    exit_.assert_called_once_with(2)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+from nose.tools import eq_, ok_
+
+from dh_virtualenv import compilercache
+
+
+_FAKE_CCACHE = """\
+#!/bin/sh
+printf '# source.c\\n%s\\n' "$1" >>"$CCACHE_STATSLOG"
+"""
+
+
+def test_wrapper_logs_compilations():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        wrapper = os.path.join(tmpdir, 'compile')
+        log_path = os.path.join(tmpdir, 'compile.log')
+        compilercache.write_wrapper(wrapper, 'env', log_path)
+        eq_(b'FOO=bar\n', subprocess.check_output(
+            [wrapper, '-i', 'FOO=bar']))
+        eq_(1, subprocess.call([wrapper, 'false']))
+
+        compilations = compilercache.read_compilations(log_path)
+        eq_([None, None], [outcome for _, outcome in compilations])
+        ok_(all(0 <= seconds < 10 for seconds, _ in compilations))
+
+        fake_ccache = os.path.join(tmpdir, 'ccache')
+        with open(fake_ccache, 'w') as fh:
+            fh.write(_FAKE_CCACHE)
+        os.chmod(fake_ccache, 0o755)
+        compilercache.write_wrapper(wrapper, fake_ccache, log_path)
+        for counter in ('cache_miss', 'preprocessed_cache_hit',
+                        'called_for_preprocessing'):
+            subprocess.check_call([wrapper, counter])
+        eq_([None, None, 'miss', 'hit', None],
+            [outcome for _, outcome in
+             compilercache.read_compilations(log_path)])
+        # The per-compilation statistics are removed
+        eq_(['ccache', 'compile', 'compile.log'], sorted(os.listdir(tmpdir)))
+    finally:
+        shutil.rmtree(tmpdir)
+    eq_([], compilercache.read_compilations(log_path))
+
+
+def test_is_wrapped():
+    ok_(compilercache.is_wrapped('/usr/bin/ccache gcc -pthread'))
+    ok_(compilercache.is_wrapped('sccache cc'))
+    ok_(not compilercache.is_wrapped('gcc -pthread'))
+    ok_(not compilercache.is_wrapped(''))
+
+
+def test_parse_stats():
+    eq_((7, 3), compilercache.parse_stats(
+        'ccache',
+        'stats_updated_timestamp\t1700000000\n'
+        'direct_cache_hit\t5\n'
+        'preprocessed_cache_hit\t2\n'
+        'cache_miss\t3\n'
+        'called_for_link\t4\n'))
+    eq_((0, 0), compilercache.parse_stats('ccache', ''))
+    eq_((6, 1), compilercache.parse_stats('sccache', json.dumps({
+        'stats': {
+            'cache_hits': {'counts': {'C/C++': 5, 'Rust': 1}},
+            'cache_misses': {'counts': {'C/C++': 1}},
+        },
+    })))
+
+
+def test_summarize():
+    # Counted per compilation: hits took 0.5s, misses 2.0s on average
+    eq_({'hits': 2, 'misses': 2, 'hit_rate': 0.5, 'counted_for': 'build',
+         'compilations': 5, 'compile_seconds': 6.0, 'saved_seconds': 3.0},
+        compilercache.summarize((10, 5), (16, 7), [
+            (1.5, 'miss'), (2.5, 'miss'), (0.5, 'hit'), (0.5, 'hit'),
+            (1.0, None)]))
+    # Otherwise from the counters of the tool, without estimate
+    eq_({'hits': 6, 'misses': 2, 'hit_rate': 0.75, 'counted_for': 'cache',
+         'compilations': 2, 'compile_seconds': 4.0, 'saved_seconds': None},
+        compilercache.summarize((10, 5), (16, 7), [(2.0, None)] * 2))
+    eq_({'hits': 0, 'misses': 0, 'hit_rate': None, 'counted_for': 'cache',
+         'compilations': 0, 'compile_seconds': 0, 'saved_seconds': None},
+        compilercache.summarize((1, 1), (1, 1), []))
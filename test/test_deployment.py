@@ -18,16 +18,22 @@
 # <http://www.gnu.org/licenses/>.
 
 import functools
+import io
+import json
 import os
 import shutil
+import subprocess
+import sys
+import tarfile
 import tempfile
 import textwrap
 import contextlib
 
 from mock import patch, call, ANY
 
-from nose.tools import eq_
-from dh_virtualenv import Deployment
+from nose.tools import eq_, ok_, assert_raises
+from dh_virtualenv import Deployment, lockfile
+from dh_virtualenv.deployment import _SCRIPT_HEADER_SIZE, _file_digest
 from dh_virtualenv.cmdline import get_default_parser
 
 
@@ -67,6 +73,20 @@ def temporary_dir(fn):
     return _inner
 
 
+def write_file(root, name, content, mode=None):
+    """Write ``content`` to the file ``name`` below ``root``, creating
+    missing directories, and return its path.
+    """
+    path = os.path.join(root, name)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'wb' if isinstance(content, bytes) else 'w') as fh:
+        fh.write(content)
+    if mode is not None:
+        os.chmod(path, mode)
+    return path
+
+
 def create_new_style_shebang(executable):
     shebang = '#!/bin/sh\n'
     shebang += "'''exec' " + executable + ' "$0" "$@"' + '\n'
@@ -568,3 +588,1226 @@ def test_find_script_files_long_shebang(bin_dir):
 
     found_files = sorted(d.find_script_files())
     eq_(found_files, script_files)
+
+
+@patch('os.path.exists', lambda x: False)
+@patch('subprocess.check_call')
+def test_install_dependencies_with_wheelhouse(callmock):
+    d = Deployment('test', wheelhouse=True, cache_dir='/cache')
+    d.pip_prefix = ['pip']
+    d.pip_args = ['install']
+    d._interpreter_tag = 'cpython-38-linux-x86_64'
+    with patch('dh_virtualenv.deployment.Deployment.installed_pins',
+               return_value=[('six', '1.15.0')]):
+        d.install_dependencies()
+    eq_(d.wheelhouse.path, '/cache/wheels/cpython-38-linux-x86_64')
+    eq_(['install', '--find-links=' + d.wheelhouse.path], d.pip_args)
+    eq_([('six', '1.15.0')], d._requirement_pins)
+
+
+@patch('tempfile.NamedTemporaryFile', FakeTemporaryFile)
+@patch('subprocess.check_call')
+def test_update_wheelhouse(callmock):
+    cache_dir = tempfile.mkdtemp()
+    try:
+        d = Deployment('test', wheelhouse=True, cache_dir=cache_dir)
+        d._interpreter_tag = 'tag'
+        with patch('os.path.exists', lambda x: False), \
+                patch('dh_virtualenv.deployment.Deployment.installed_pins',
+                      return_value=[('six', '1.15.0')]):
+            d.install_dependencies()
+            d.update_wheelhouse()
+        callmock.assert_called_once_with([
+            PY_CMD, PIP_CMD, 'wheel', '--no-deps', ANY,
+            '--find-links=' + d.wheelhouse.path, LOG_ARG, 'six==1.15.0'])
+        # Nothing was built, so the requirements are not recorded yet
+        eq_(None, d.wheelhouse.load_manifest(d._wheelhouse_key))
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+@patch('tempfile.NamedTemporaryFile', FakeTemporaryFile)
+@patch('subprocess.check_call')
+def test_update_wheelhouse_skips_local_distributions(callmock):
+    tmpdir = tempfile.mkdtemp()
+    try:
+        source_dir = os.path.join(tmpdir, 'src')
+        os.makedirs(source_dir)
+        with open(os.path.join(source_dir, 'setup.cfg'), 'w') as fh:
+            fh.write('[metadata]\nname = myproject\n')
+        d = Deployment('test', wheelhouse=True,
+                       cache_dir=os.path.join(tmpdir, 'cache'),
+                       sourcedirectory=source_dir)
+        d._interpreter_tag = 'tag'
+        d.package_dir = os.path.join(tmpdir, 'venv')
+        dist_info = os.path.join(d.package_dir, 'lib', 'python3.11',
+                                 'site-packages', 'vendored-2.0.dist-info')
+        os.makedirs(dist_info)
+        with open(os.path.join(dist_info, 'direct_url.json'), 'w') as fh:
+            fh.write('{"url": "file:///src/vendored", "dir_info": {}}')
+        with patch('dh_virtualenv.deployment.Deployment.installed_pins',
+                   return_value=[('myproject', '1.0'), ('six', '1.15.0'),
+                                 ('vendored', '2.0')]):
+            with patch('os.path.exists', lambda x: False):
+                d.install_dependencies()
+            d.update_wheelhouse()
+        eq_(1, callmock.call_count)
+        eq_('six==1.15.0', callmock.call_args[0][0][-1])
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+@temporary_dir
+@patch('tempfile.NamedTemporaryFile', FakeTemporaryFile)
+@patch('subprocess.check_call')
+def test_complete_wheelhouse_only_for_requirements(tempdir, callmock):
+    requirements = write_file(tempdir, 'requirements.txt', 'six\n')
+
+    def deployment():
+        d = Deployment('test', wheelhouse=True, sourcedirectory=tempdir,
+                       cache_dir=os.path.join(tempdir, 'cache'),
+                       preinstall=['wheel'])
+        d._interpreter_tag = 'tag'
+        return d
+
+    # As recorded by an earlier build
+    d = deployment()
+    d.setup_wheelhouse(requirements)
+    write_file(d.wheelhouse.path, 'six-1.16.0-py2.py3-none-any.whl', '')
+    d.wheelhouse.save_manifest(d._wheelhouse_key, [('six', '1.16.0')])
+
+    d = deployment()
+    with patch('dh_virtualenv.deployment.Deployment.installed_pins',
+               return_value=[('six', '1.16.0')]):
+        d.install_dependencies()
+    find_links = '--find-links=' + d.wheelhouse.path
+    eq_([call([PY_CMD, PIP_CMD, 'install', LOG_ARG, find_links,
+               '--no-index', 'wheel']),
+         call([PY_CMD, PIP_CMD, 'install', LOG_ARG, find_links,
+               '--no-index', '-r', requirements])],
+        callmock.call_args_list)
+
+    # The package's build requirements may not be in the wheelhouse
+    d.install_package()
+    callmock.assert_called_with([PY_CMD, PIP_CMD, 'install', LOG_ARG,
+                                 find_links, '.'], cwd=tempdir)
+
+
+def test_default_cache_dir():
+    with patch.dict(os.environ, {'DH_VIRTUALENV_CACHE_DIR': '/srv/cache'}):
+        eq_('/srv/cache', Deployment('test').cache_dir)
+    with patch.dict(os.environ, {'DH_VIRTUALENV_CACHE_DIR': '',
+                                 'XDG_CACHE_HOME': '/xdg'}):
+        eq_('/xdg/dh-virtualenv', Deployment('test').cache_dir)
+
+
+@patch('subprocess.check_call')
+def test_create_venv_from_cached_base_venv(callmock):
+    cache_dir = tempfile.mkdtemp()
+    try:
+        d = Deployment('test', cache_dir=cache_dir, cache_base_venv=True)
+        d.create_virtualenv()
+        entry = d.base_virtualenv(['virtualenv'])
+        eq_(os.path.join(cache_dir, 'venvs'), os.path.dirname(entry))
+        with open(os.path.join(entry, 'origin')) as fh:
+            origin = fh.read()
+        callmock.assert_has_calls([
+            call(['virtualenv', origin]),
+            call(['cp', '-a', '--reflink=auto',
+                  os.path.join(entry, 'venv', '.'), TEST_VENV_PATH]),
+        ])
+
+        # The second build only copies the base virtualenv
+        callmock.reset_mock()
+        Deployment('test', cache_dir=cache_dir,
+                   cache_base_venv=True).create_virtualenv()
+        callmock.assert_called_once_with([
+            'cp', '-a', '--reflink=auto',
+            os.path.join(entry, 'venv', '.'), TEST_VENV_PATH])
+    finally:
+        shutil.rmtree(cache_dir)
+        shutil.rmtree('debian/test')
+
+
+@temporary_dir
+def test_clone_base_virtualenv_fixes_paths(tempdir):
+    entry = os.path.join(tempdir, 'entry')
+    origin = os.path.join(entry, 'venv')
+    os.makedirs(os.path.join(origin, 'bin'))
+    with open(os.path.join(entry, 'origin'), 'w') as fh:
+        fh.write(origin)
+    with open(os.path.join(origin, 'bin', 'activate'), 'w') as fh:
+        fh.write('VIRTUAL_ENV="{0}"\n'.format(origin))
+    os.symlink('/usr/bin/python3', os.path.join(origin, 'bin', 'python'))
+
+    d = Deployment('test')
+    d.package_dir = os.path.join(tempdir, 'debian', 'venv')
+    d.bin_dir = os.path.join(d.package_dir, 'bin')
+    d.clone_base_virtualenv(entry)
+
+    with open(os.path.join(d.bin_dir, 'activate')) as fh:
+        eq_('VIRTUAL_ENV="{0}"\n'.format(d.package_dir), fh.read())
+    eq_('/usr/bin/python3', os.readlink(os.path.join(d.bin_dir, 'python')))
+
+
+@temporary_dir
+def test_fix_shebangs_keeps_mode_and_skips_other_files(bin_dir):
+    d = Deployment('test')
+    d.bin_dir = bin_dir
+    script = os.path.join(bin_dir, 'script')
+    with open(script, 'w') as f:
+        f.write('#!/usr/bin/python3 -u\nprint("#!/usr/bin/python")\n')
+    os.chmod(script, 0o755)
+    binary = os.path.join(bin_dir, 'binary')
+    with open(binary, 'wb') as f:
+        f.write(b'\x7fELF\x00\x01/usr/bin/python\n')
+    os.symlink('/usr/bin/python3', os.path.join(bin_dir, 'python'))
+
+    eq_({script}, d.find_script_files())
+    d.fix_shebangs()
+
+    with open(script) as f:
+        eq_('#!/opt/venvs/test/bin/python3 -u\nprint("#!/usr/bin/python")\n',
+            f.read())
+    eq_(0o755, os.stat(script).st_mode & 0o777)
+    with open(binary, 'rb') as f:
+        eq_(b'\x7fELF\x00\x01/usr/bin/python\n', f.read())
+    eq_('/usr/bin/python3', os.readlink(os.path.join(bin_dir, 'python')))
+
+
+@temporary_dir
+def test_fix_shebangs_keeps_long_second_line(bin_dir):
+    d = Deployment('test')
+    d.bin_dir = bin_dir
+    script = os.path.join(bin_dir, 'script')
+    long_line = '# ' + 'x' * 2 * _SCRIPT_HEADER_SIZE
+    with open(script, 'w') as f:
+        f.write('#!/usr/bin/python\n' + long_line + '\nprint("ok")\n')
+
+    d.fix_shebangs()
+
+    with open(script) as f:
+        eq_('#!/opt/venvs/test/bin/python\n' + long_line + '\nprint("ok")\n',
+            f.read())
+
+
+@patch('os.path.exists', lambda x: True)
+@patch('subprocess.check_call')
+def test_install_dependencies_records_phases(callmock):
+    d = Deployment('test', upgrade_pip=True, preinstall=['foobar'])
+    d.install_dependencies()
+    eq_(['pip_upgrade', 'preinstall', 'requirements'],
+        [p['name'] for p in d.timings.phases])
+
+
+@temporary_dir
+def test_write_report(tempdir):
+    d = Deployment('test')
+    with patch('dh_virtualenv.deployment.os.path.join',
+               return_value=os.path.join(tempdir, 'report.json')):
+        eq_(os.path.join(tempdir, 'report.json'), d.report_path('timings'))
+        d.write_report('timings', {'phases': []})
+    with open(os.path.join(tempdir, 'report.json')) as fh:
+        eq_({'package': 'test', 'phases': []}, json.load(fh))
+
+
+@patch('tempfile.NamedTemporaryFile', FakeTemporaryFile)
+def test_compile_bytecode_disables_pip_compilation():
+    d = Deployment('test', compile_bytecode=True)
+    eq_(['install', LOG_ARG, '--no-compile'], d.pip_args)
+    eq_(['install', LOG_ARG, '--no-compile'], d.pip_upgrade_args)
+
+
+@patch('subprocess.call', return_value=0)
+def test_byte_compile(callmock):
+    d = Deployment('test', compile_bytecode=True, bytecode_optimize=['0', '2'],
+                   bytecode_invalidation_mode='unchecked-hash')
+    d.byte_compile()
+    callmock.assert_called_once_with([
+        PY_CMD, '-m', 'compileall', '-q', '-j', '0',
+        '--invalidation-mode', 'unchecked-hash',
+        '-s', os.path.abspath(TEST_VENV_PATH), '-p', '/opt/venvs/test',
+        '-o', '0', '-o', '2', os.path.abspath(TEST_VENV_PATH + '/lib')])
+
+
+@temporary_dir
+def test_deduplicate(deployment_dir):
+    d = Deployment('test')
+    d.package_dir = deployment_dir
+
+    a = write_file(deployment_dir, 'a/LICENSE', 'same')
+    b = write_file(deployment_dir, 'b/LICENSE', 'same')
+    c = write_file(deployment_dir, 'c/LICENSE', 'same')
+    executable = write_file(deployment_dir, 'bin/LICENSE', 'same', 0o755)
+    other = write_file(deployment_dir, 'a/other', 'diff')
+    os.symlink('LICENSE', os.path.join(deployment_dir, 'a', 'link'))
+
+    eq_(8, d.deduplicate())
+    eq_(os.stat(a).st_ino, os.stat(b).st_ino)
+    eq_(os.stat(a).st_ino, os.stat(c).st_ino)
+    ok_(os.stat(a).st_ino != os.stat(executable).st_ino)
+    ok_(os.stat(a).st_ino != os.stat(other).st_ino)
+    eq_('LICENSE', os.readlink(os.path.join(deployment_dir, 'a', 'link')))
+    # Running again finds nothing left to do
+    eq_(0, d.deduplicate())
+
+
+@temporary_dir
+@patch('subprocess.check_call')
+def test_install_dependencies_with_requirements_lock(sourcedir, callmock):
+    with open(os.path.join(sourcedir, 'requirements.txt'), 'w') as fh:
+        fh.write('six\n')
+    d = Deployment('test', sourcedirectory=sourcedir,
+                   requirements_lock='requirements.lock')
+    d.pip_prefix = ['pip']
+    d.pip_args = ['install']
+    d.install_dependencies()
+    callmock.assert_called_with([
+        'pip', 'install', '--report', d.pip_report_file.name,
+        '-r', os.path.join(sourcedir, 'requirements.txt')])
+
+    with open(d.pip_report_file.name, 'w') as fh:
+        json.dump({'install': [{
+            'metadata': {'name': 'six', 'version': '1.16.0'},
+            'download_info': {'archive_info': {'hashes': {'sha256': 'abc'}}},
+        }]}, fh)
+    d.write_requirements_lock()
+
+    d = Deployment('test', sourcedirectory=sourcedir,
+                   requirements_lock='requirements.lock')
+    d.pip_prefix = ['pip']
+    d.pip_args = ['install']
+    d.install_dependencies()
+    callmock.assert_called_with([
+        'pip', 'install', '--no-deps', '--require-hashes',
+        '-r', os.path.join(sourcedir, 'requirements.lock')])
+    eq_(None, d.pip_report_file)
+
+
+@temporary_dir
+def test_requirements_lock_needs_recent_pip(sourcedir):
+    write_file(sourcedir, 'requirements.txt', 'six\n')
+    d = Deployment('test', sourcedirectory=sourcedir,
+                   requirements_lock='requirements.lock')
+    d.package_dir = os.path.join(sourcedir, 'venv')
+    write_file(d.package_dir, 'lib/python3/site-packages/'
+               'pip-22.1.2.dist-info/METADATA', 'Name: pip\nVersion: 22.1.2\n')
+    try:
+        d._requirements_command(os.path.join(sourcedir, 'requirements.txt'))
+    except Exception as exc:
+        ok_('needs pip 22.2 or later' in str(exc))
+    else:
+        ok_(False, 'Expected pip 22.1.2 to be rejected')
+
+
+@temporary_dir
+def test_fingerprint(sourcedir):
+    write_file(sourcedir, 'requirements.txt', 'six\n')
+    write_file(sourcedir, 'setup.py', 'pass\n')
+    d = Deployment('test', sourcedirectory=sourcedir)
+    fingerprint = d.fingerprint()
+    eq_(fingerprint, Deployment('test', sourcedirectory=sourcedir).fingerprint())
+
+    # Packaging metadata, VCS metadata and build artifacts do not count
+    write_file(sourcedir, 'debian/changelog', 'foo\n')
+    write_file(sourcedir, '.git/HEAD', 'foo\n')
+    write_file(sourcedir, 'build/lib/foo.py', 'foo\n')
+    write_file(sourcedir, 'foo.egg-info/PKG-INFO', 'foo\n')
+    eq_(fingerprint, d.fingerprint())
+
+    ok_(fingerprint != Deployment('test', sourcedirectory=sourcedir,
+                                  extras=['foo']).fingerprint())
+    write_file(sourcedir, 'requirements.txt', 'six\nmock\n')
+    ok_(fingerprint != d.fingerprint())
+    fingerprint = d.fingerprint()
+    write_file(sourcedir, 'foo/__init__.py', 'pass\n')
+    ok_(fingerprint != d.fingerprint())
+
+
+@temporary_dir
+def test_fingerprint_offline(tempdir):
+    sourcedir = os.path.join(tempdir, 'src')
+    offline = os.path.join(tempdir, 'wheels')
+    write_file(sourcedir, 'requirements.txt', 'six\n')
+    write_file(offline, 'six-1.16.0-py2.py3-none-any.whl', 'six')
+
+    def fingerprint():
+        return Deployment('test', sourcedirectory=sourcedir,
+                          offline=offline).fingerprint()
+
+    # Each Deployment serves the offline files from its own index
+    first = fingerprint()
+    eq_(first, fingerprint())
+    ok_(first != Deployment('test', sourcedirectory=sourcedir).fingerprint())
+
+    write_file(offline, 'six-1.16.0-py2.py3-none-any.whl', 'changed')
+    ok_(first != fingerprint())
+
+
+@temporary_dir
+def test_previous_fingerprint(tempdir):
+    d = Deployment('test')
+    d.package_dir = os.path.join(tempdir, 'venv')
+    with patch.object(Deployment, 'fingerprint_path',
+                      return_value=os.path.join(tempdir, 'fingerprint')):
+        eq_(None, d.previous_fingerprint())
+        d.save_fingerprint('abc')
+        # Without a virtualenv, there is nothing to reuse
+        eq_(None, d.previous_fingerprint())
+        os.mkdir(d.package_dir)
+        eq_('abc', d.previous_fingerprint())
+        d.forget_fingerprint()
+        eq_(None, d.previous_fingerprint())
+
+
+@temporary_dir
+@patch('subprocess.call', return_value=0)
+def test_prune(deployment_dir, callmock):
+    site_packages = os.path.join(deployment_dir, 'lib/python3/site-packages')
+    write_file(site_packages, 'foo/__init__.py', 'pass\n')
+    write_file(site_packages, 'foo/tests/test_foo.py', '1234')
+    write_file(site_packages, 'foo/tests/data/bar.txt', '12')
+    write_file(site_packages, 'foo/__init__.pyi', '123')
+    write_file(site_packages, 'foo/_speedups.pyx', '1')
+    speedups = write_file(site_packages, 'foo/_speedups.so', 'x')
+    rules_file = write_file(deployment_dir, 'prune-rules',
+                            '# Sources\n\n*.pyx\n')
+
+    d = Deployment('test', prune=['*/tests/', '*.pyi', 'strip:*.so'],
+                   prune_file=rules_file)
+    d.package_dir = deployment_dir
+    eq_({'*/tests/': 6, '*.pyi': 3, 'strip:*.so': 0, '*.pyx': 1}, d.prune())
+
+    eq_(['__init__.py', '_speedups.so'],
+        sorted(os.listdir(os.path.join(site_packages, 'foo'))))
+    callmock.assert_called_once_with(['strip', '--strip-debug', speedups])
+
+
+@temporary_dir
+def test_check_footprint(tempdir):
+    deployment_dir = os.path.join(tempdir, 'venv')
+    site_packages = os.path.join(deployment_dir, 'lib/python3/site-packages')
+    write_file(site_packages, 'foo-1.0.dist-info/RECORD',
+               'foo.py,,\nfoo-1.0.dist-info/RECORD,,\n../../../bin/foo,,\n')
+    write_file(site_packages, 'foo.py', '1234')
+    write_file(site_packages, '__pycache__/foo.cpython-311.pyc', '12')
+    write_file(deployment_dir, 'bin/foo', '123')
+    write_file(deployment_dir, 'pyvenv.cfg', '1')
+
+    d = Deployment('test', footprint_report=True)
+    d.package_dir = deployment_dir
+    with patch.object(Deployment, 'report_path',
+                      return_value=os.path.join(tempdir, 'footprint.json')):
+        report = d.check_footprint()
+        record_size = len('foo.py,,\nfoo-1.0.dist-info/RECORD,,\n'
+                          '../../../bin/foo,,\n')
+        eq_({'foo': {'version': '1.0', 'bytes': 9 + record_size, 'files': 4}},
+            report['distributions'])
+        eq_({'bytes': 1, 'files': 1}, report['unattributed'])
+        eq_(10 + record_size, report['total_bytes'])
+        ok_('changes' not in report)
+
+        write_file(deployment_dir, 'bin/foo', '123456')
+        d.max_size = 1000
+        report = d.check_footprint()
+        eq_({'foo': 3}, report['changes'])
+        eq_(10 + record_size, report['previous_total_bytes'])
+        with open(os.path.join(tempdir, 'footprint.json')) as fh:
+            eq_(13 + record_size, json.load(fh)['total_bytes'])
+
+        d.max_size = 10
+        try:
+            d.check_footprint()
+        except Exception as exc:
+            ok_('exceeding the maximum size of 10 bytes' in str(exc))
+        else:
+            ok_(False, 'Expected the size budget to be exceeded')
+
+
+@temporary_dir
+def test_profile_imports(deployment_dir):
+    site_packages = os.path.join(deployment_dir, 'lib/python3/site-packages')
+    write_file(site_packages, 'foo-1.0.dist-info/entry_points.txt',
+               '[console_scripts]\nfoo = foo.cli:main\n'
+               'foo-admin = foo.cli:admin\n')
+    write_file(site_packages, 'pip-23.0.dist-info/entry_points.txt',
+               '[console_scripts]\npip = pip._internal.cli.main:main\n')
+
+    def importtime(code):
+        lines = ['import time:       100 |        100 | site']
+        if code == 'import foo.cli':
+            lines += ['import time:       500 |        500 |   json',
+                      'import time:       100 |        600 | foo',
+                      'import time:       300 |        300 | foo.cli']
+        return 0, lines
+
+    d = Deployment('test', max_import_time=0.0005)
+    d.package_dir = deployment_dir
+    eq_(['foo.cli'], d.entry_point_modules())
+    with patch.object(Deployment, '_importtime', side_effect=importtime):
+        try:
+            d.profile_imports()
+        except Exception as exc:
+            eq_('Importing foo.cli takes longer than 0.0005s', str(exc))
+        else:
+            ok_(False, 'Expected the import time limit to be exceeded')
+
+        d.max_import_time = 1
+        report = d.profile_imports()
+    eq_({'entry_points': {'foo.cli': {
+        'cumulative_us': 900,
+        'imports': [
+            {'module': 'foo', 'self_us': 100, 'cumulative_us': 600},
+            {'module': 'json', 'self_us': 500, 'cumulative_us': 500},
+            {'module': 'foo.cli', 'self_us': 300, 'cumulative_us': 300},
+        ]}}}, report)
+
+
+@temporary_dir
+@patch('dh_virtualenv.profiling.evict_page_cache')
+@patch('dh_virtualenv.profiling.run_measured', return_value=(0, 0.5, 1000))
+def test_benchmark(tempdir, run_measured, evict):
+    deployment_dir = os.path.join(tempdir, 'venv')
+    site_packages = os.path.join(deployment_dir, 'lib/python3/site-packages')
+    os.makedirs(os.path.join(site_packages, 'pip-23.0.dist-info'))
+    with open(os.path.join(site_packages, 'pip-23.0.dist-info/RECORD'),
+              'w') as fh:
+        fh.write('../../../bin/pip,,\n')
+    scripts = set([os.path.join(deployment_dir, 'bin', 'foo'),
+                   os.path.join(deployment_dir, 'bin', 'pip')])
+
+    d = Deployment('test', benchmark_scripts=True, benchmark_runs=2,
+                   benchmark_args='--version -v')
+    d.package_dir = deployment_dir
+    report_path = os.path.join(tempdir, 'benchmark.json')
+    with patch.object(Deployment, 'find_script_files', return_value=scripts), \
+            patch.object(Deployment, 'report_path', return_value=report_path):
+        report = d.benchmark()
+        summary = {'wall_seconds': {'min': 0.5, 'median': 0.5, 'max': 0.5},
+                   'max_rss_kb': 1000}
+        eq_({'args': ['--version', '-v'], 'runs': 2, 'scripts': {
+            'foo': {'cold': summary, 'warm': summary, 'exit_status': 0}}},
+            report)
+        # Two cold runs, one warm-up and two warm runs
+        eq_(5, run_measured.call_count)
+        run_measured.assert_called_with([
+            d.venv_bin('python'), os.path.join(deployment_dir, 'bin', 'foo'),
+            '--version', '-v'], 30)
+        eq_(2, evict.call_count)
+
+        run_measured.return_value = (0, 0.25, 1000)
+        report = d.benchmark()
+        eq_({'cold': -0.25, 'warm': -0.25}, report['scripts']['foo']['changes'])
+        with open(report_path) as fh:
+            eq_(dict(report, package='test'), json.load(fh))
+
+        # Scripts that hang are given up on after the first run
+        run_measured.reset_mock()
+        run_measured.side_effect = subprocess.TimeoutExpired('foo', 30)
+        report = d.benchmark()
+        eq_({'foo': {'timed_out': True}}, report['scripts'])
+        eq_(1, run_measured.call_count)
+
+
+@temporary_dir
+def test_generate_launchers(deployment_dir):
+    site_packages = os.path.join(deployment_dir, 'lib/python3/site-packages')
+    os.makedirs(os.path.join(site_packages, 'foo-1.0.dist-info'))
+    os.makedirs(os.path.join(deployment_dir, 'bin'))
+    with open(os.path.join(site_packages, 'foo-1.0.dist-info',
+                           'entry_points.txt'), 'w') as fh:
+        fh.write('[console_scripts]\n'
+                 'foo = foo.cli:main\n'
+                 'foo-admin = foo.admin:Admin.run [admin]\n'
+                 'broken = foo.cli\n'
+                 '[gui_scripts]\n'
+                 'foo-gui = foo.gui:main\n')
+    with open(os.path.join(deployment_dir, 'bin', 'foo'), 'w') as fh:
+        fh.write('#!/usr/bin/python\nimport pkg_resources\n')
+
+    d = Deployment('test', fast_launchers=True)
+    d.package_dir = deployment_dir
+    d.bin_dir = os.path.join(deployment_dir, 'bin')
+    eq_(['foo', 'foo-admin', 'foo-gui'], d.generate_launchers())
+
+    with open(os.path.join(deployment_dir, 'bin', 'foo-admin')) as fh:
+        eq_(textwrap.dedent('''\
+            #!/opt/venvs/test/bin/python
+            # -*- coding: utf-8 -*-
+            import sys
+
+            from foo.admin import Admin
+
+            if __name__ == '__main__':
+                sys.exit(Admin.run())
+            '''), fh.read())
+    eq_(0o755, os.stat(os.path.join(deployment_dir, 'bin', 'foo')).st_mode & 0o777)
+    ok_(not os.path.exists(os.path.join(deployment_dir, 'bin', 'broken')))
+
+    # Launchers already point to the right interpreter
+    d.fix_shebangs()
+    with open(os.path.join(deployment_dir, 'bin', 'foo')) as fh:
+        eq_('#!/opt/venvs/test/bin/python\n', fh.readline())
+
+
+@temporary_dir
+def test_generate_launchers_with_long_path(deployment_dir):
+    site_packages = os.path.join(deployment_dir, 'lib/python3/site-packages')
+    os.makedirs(os.path.join(site_packages, 'foo-1.0.dist-info'))
+    os.makedirs(os.path.join(deployment_dir, 'bin'))
+    with open(os.path.join(site_packages, 'foo-1.0.dist-info',
+                           'entry_points.txt'), 'w') as fh:
+        fh.write('[console_scripts]\nfoo = foo.cli:main\n')
+
+    with patch.dict(os.environ, {'DH_VIRTUALENV_INSTALL_ROOT': 127 * 'p'}):
+        d = Deployment('test', fast_launchers=True)
+    d.package_dir = deployment_dir
+    d.bin_dir = os.path.join(deployment_dir, 'bin')
+    d.generate_launchers()
+    with open(os.path.join(deployment_dir, 'bin', 'foo')) as fh:
+        eq_(['#!/bin/sh\n',
+             "'''exec' " + 127 * 'p' + '/test/bin/python "$0" "$@"\n',
+             "' '''\n"], fh.readlines()[:3])
+
+
+@temporary_dir
+@patch('dh_virtualenv.profiling.run_measured')
+def test_consolidate_pth_files(deployment_dir, run_measured):
+    site_packages = os.path.join(deployment_dir, 'lib/python3/site-packages')
+    os.makedirs(os.path.join(site_packages, 'foo'))
+    write_file(site_packages, 'a.pth', '# Foo\nfoo\n\nmissing\n/usr/lib/foo\n')
+    write_file(site_packages, 'b.pth', './foo\n/usr/lib/foo\n')
+    write_file(site_packages, 'distutils-precedence.pth',
+               'import os; os.environ\n')
+    write_file(site_packages, 'z.pth', 'foo\n')
+
+    # 100 ms before, 60 ms after consolidating
+    run_measured.side_effect = (
+        [(0, 0.1, 0)] * 10 + [(0, 0.06, 0)] * 10)
+    d = Deployment('test', consolidate_pth=True)
+    d.package_dir = deployment_dir
+    saved = d.consolidate_pth_files()
+    ok_(abs(saved - 0.04) < 1e-9)
+
+    eq_(['a.pth', 'distutils-precedence.pth', 'foo', 'z.pth'],
+        sorted(os.listdir(site_packages)))
+    with open(os.path.join(site_packages, 'a.pth')) as fh:
+        eq_('# Generated by dh-virtualenv from a.pth, b.pth\n'
+            'foo\n/usr/lib/foo\n', fh.read())
+
+    # Nothing left to do on a second run
+    eq_(0, d.consolidate_pth_files())
+
+
+@temporary_dir
+@patch('dh_virtualenv.profiling.run_measured', return_value=(0, 0.1, 0))
+def test_consolidate_pth_files_around_code(deployment_dir, run_measured):
+    # As left behind by virtualenv, setuptools and namespace packages
+    site_packages = os.path.join(deployment_dir, 'lib/python3/site-packages')
+    os.makedirs(os.path.join(site_packages, 'foo'))
+    files = [
+        ('_virtualenv.pth', 'import _virtualenv\n'),
+        ('__editable__.bar-1.0.pth', '/src/bar\n'),
+        ('distutils-precedence.pth',
+         "import os; var = 'SETUPTOOLS_USE_DISTUTILS'; enabled = "
+         "os.environ.get(var, 'local') == 'local'; enabled and "
+         "__import__('_distutils_hack').add_shim(); \n"),
+        ('easy-install.pth', './foo\n'),
+        ('foo.pth', '/usr/lib/foo\n'),
+        ('google_auth-1.0-py3.11-nspkg.pth',
+         "import sys, types, os;has_mfs = sys.version_info > (3, 5)\n"),
+        ('protobuf.pth', '/usr/lib/protobuf\n'),
+        ('zope.pth', '/usr/lib/zope\n'),
+    ]
+    for name, content in files:
+        write_file(site_packages, name, content)
+
+    d = Deployment('test', consolidate_pth=True)
+    d.package_dir = deployment_dir
+    d.consolidate_pth_files()
+
+    eq_(['__editable__.bar-1.0.pth', '_virtualenv.pth',
+         'distutils-precedence.pth', 'easy-install.pth', 'foo',
+         'google_auth-1.0-py3.11-nspkg.pth', 'protobuf.pth'],
+        sorted(os.listdir(site_packages)))
+    for name, content in files[:3] + files[5:6]:
+        with open(os.path.join(site_packages, name)) as fh:
+            eq_(content, fh.read())
+    with open(os.path.join(site_packages, 'easy-install.pth')) as fh:
+        eq_('# Generated by dh-virtualenv from easy-install.pth, foo.pth\n'
+            './foo\n/usr/lib/foo\n', fh.read())
+    with open(os.path.join(site_packages, 'protobuf.pth')) as fh:
+        eq_('# Generated by dh-virtualenv from protobuf.pth, zope.pth\n'
+            '/usr/lib/protobuf\n/usr/lib/zope\n', fh.read())
+
+
+@temporary_dir
+def test_consolidate_pth_files_measures_startup(deployment_dir):
+    site_packages = os.path.join(deployment_dir, 'lib/python3/site-packages')
+    os.makedirs(site_packages)
+    os.makedirs(os.path.join(deployment_dir, 'bin'))
+    os.symlink(sys.executable, os.path.join(deployment_dir, 'bin', 'python'))
+    write_file(site_packages, 'a.pth', '/usr/lib/a\n')
+    write_file(site_packages, 'b.pth', '/usr/lib/b\n')
+
+    d = Deployment('test', consolidate_pth=True)
+    d.package_dir = deployment_dir
+    d.bin_dir = os.path.join(deployment_dir, 'bin')
+    saved = d.consolidate_pth_files()
+    ok_(isinstance(saved, float))
+    eq_(['a.pth'], os.listdir(site_packages))
+
+
+@temporary_dir
+def test_relocate_build_paths(tempdir):
+    deployment_dir = os.path.join(tempdir, 'venv')
+    site_packages = os.path.join(deployment_dir, 'lib/python3/site-packages')
+    os.makedirs(os.path.join(site_packages, 'foo-1.0.dist-info'))
+    os.makedirs(os.path.join(deployment_dir, 'bin'))
+
+    direct_url = write_file(site_packages, 'foo-1.0.dist-info/direct_url.json',
+                            '{"url": "file://%s/src"}' % deployment_dir,
+                            0o600)
+    write_file(deployment_dir, 'pyvenv.cfg', 'home = /usr/bin\n')
+    write_file(site_packages, '_foo.so',
+               b'\x7fELF\0' + deployment_dir.encode() + b'\0')
+    write_file(site_packages, 'empty', '')
+    os.symlink(os.path.join(deployment_dir, 'lib'),
+               os.path.join(deployment_dir, 'lib64'))
+    os.symlink('/usr/bin/python3', os.path.join(deployment_dir, 'bin/python'))
+
+    d = Deployment('test', relocate=True)
+    d.package_dir = deployment_dir
+    report_path = os.path.join(tempdir, 'relocation.json')
+    with patch.object(Deployment, 'report_path', return_value=report_path):
+        report = d.relocate_build_paths()
+    eq_({'rewritten': ['lib/python3/site-packages/foo-1.0.dist-info/'
+                       'direct_url.json'],
+         'binary': {'lib/python3/site-packages/_foo.so': 1},
+         'symlinks': ['lib64']}, report)
+
+    with open(direct_url) as fh:
+        eq_('{"url": "file:///opt/venvs/test/src"}', fh.read())
+    eq_(0o600, os.stat(direct_url).st_mode & 0o777)
+    eq_('lib', os.readlink(os.path.join(deployment_dir, 'lib64')))
+    eq_('/usr/bin/python3', os.readlink(os.path.join(deployment_dir,
+                                                     'bin/python')))
+    with open(report_path) as fh:
+        eq_(dict(report, package='test'), json.load(fh))
+
+
+@patch('subprocess.check_call')
+def test_run_pip_records_timeline(callmock):
+    d = Deployment('test', pip_timeline_report=True)
+
+    def log(cmd, **kwargs):
+        with open(d.log_file.name, 'a') as fh:
+            fh.write('2024-01-01T10:00:00,000 Collecting six\n'
+                     '2024-01-01T10:00:01,500 Installing collected packages: '
+                     'six\n'
+                     '2024-01-01T10:00:02,000 Successfully installed '
+                     'six-1.16.0\n')
+    callmock.side_effect = log
+    d._run_pip(['pip', 'install', 'six'], 'preinstall', cwd='/')
+    callmock.assert_called_once_with(['pip', 'install', 'six'], cwd='/')
+    d._run_pip(['pip', 'install', 'six'], 'requirements')
+
+    eq_(['preinstall', 'requirements'], [t['label'] for t in d.pip_timeline])
+    for timeline in d.pip_timeline:
+        eq_(2.0, timeline['wall_seconds'])
+        eq_(1.5, timeline['distributions']['six']['resolve_seconds'])
+
+
+@patch('subprocess.check_call')
+def test_run_pip_without_timeline(callmock):
+    d = Deployment('test')
+    with patch('dh_virtualenv.piplog.parse_log') as parse_log:
+        d._run_pip(['pip', 'install', 'six'], 'requirements')
+    eq_(0, parse_log.call_count)
+    eq_([], d.pip_timeline)
+
+
+@patch('subprocess.check_call',
+       side_effect=subprocess.CalledProcessError(1, ['pip']))
+def test_run_pip_failure_not_hidden_by_timeline(callmock):
+    d = Deployment('test', pip_timeline_report=True)
+    with patch('dh_virtualenv.piplog.parse_log', side_effect=ValueError), \
+            patch('dh_virtualenv.deployment.log') as log:
+        assert_raises(subprocess.CalledProcessError, d._run_pip,
+                      ['pip', 'install', 'six'], 'requirements')
+    eq_([], d.pip_timeline)
+    eq_(1, log.warning.call_count)
+
+
+@temporary_dir
+@patch('subprocess.check_call')
+@patch('tempfile.NamedTemporaryFile', FakeTemporaryFile)
+def test_offline(artifacts, callmock):
+    open(os.path.join(artifacts, 'six-1.16.0-py2.py3-none-any.whl'), 'w').close()
+    with patch.dict(os.environ, {'PIP_EXTRA_INDEX_URL': 'https://example.com',
+                                 'HOME': '/home/test'}):
+        d = Deployment('test', offline=artifacts, preinstall=['six'],
+                       index_url='https://example.com/simple',
+                       extra_urls=['https://example.org/simple'])
+    index_url = 'file://' + d._offline_index.name
+    eq_(['install', '--index-url=' + index_url, LOG_ARG], d.pip_args)
+    ok_('PIP_EXTRA_INDEX_URL' not in d.pip_env)
+    eq_('/home/test', d.pip_env['HOME'])
+    eq_(os.devnull, d.pip_env['PIP_CONFIG_FILE'])
+    eq_('http://127.0.0.1:9', d.pip_env['https_proxy'])
+
+    d.install_dependencies()
+    callmock.assert_called_once_with(
+        [PY_CMD, PIP_CMD, 'install', '--index-url=' + index_url, LOG_ARG,
+         'six'], env=d.pip_env)
+    ok_(os.path.exists(os.path.join(d._offline_index.name, 'six',
+                                    'index.html')))
+
+
+@temporary_dir
+@patch('tempfile.NamedTemporaryFile', FakeTemporaryFile)
+def test_prebuild_wheels(tempdir):
+    requirements = os.path.join(tempdir, 'requirements.txt')
+    d = Deployment('test', prebuild_wheels=True, prebuild_jobs=2)
+    builds = []
+
+    def download(cmd, **kwargs):
+        download_dir = cmd[cmd.index('--dest') + 1]
+        for name in ('six-1.16.0-py2.py3-none-any.whl', 'PyYAML-6.0.tar.gz',
+                     'broken-1.0.tar.gz'):
+            open(os.path.join(download_dir, name), 'w').close()
+
+    def build(cmd, stdout, stderr, env):
+        builds.append(cmd[-1])
+        stdout.write('building\n')
+        if 'broken' in cmd[-1]:
+            return 1
+        wheel_dir = cmd[cmd.index('--wheel-dir') + 1]
+        open(os.path.join(wheel_dir, 'PyYAML-6.0-cp311-cp311-linux_x86_64.whl'),
+             'w').close()
+        return 0
+
+    with patch('subprocess.check_call', side_effect=download) as callmock, \
+            patch('subprocess.call', side_effect=build), \
+            patch.object(Deployment, 'prebuild_log_dir',
+                         return_value=os.path.join(tempdir, 'logs')):
+        d.prebuild_wheels(requirements)
+    prebuild_dir = d._prebuild_dir.name
+    callmock.assert_called_once_with([
+        PY_CMD, PIP_CMD, 'download', '--dest',
+        os.path.join(prebuild_dir, 'downloads'), LOG_ARG, '-r', requirements])
+    eq_(sorted([os.path.join(prebuild_dir, 'downloads', 'PyYAML-6.0.tar.gz'),
+                os.path.join(prebuild_dir, 'downloads', 'broken-1.0.tar.gz')]),
+        sorted(builds))
+    eq_(['broken-1.0.log', 'pyyaml-6.0.log'],
+        sorted(os.listdir(os.path.join(tempdir, 'logs'))))
+    eq_(['install', LOG_ARG,
+         '--find-links=' + os.path.join(prebuild_dir, 'wheels'),
+         '--find-links=' + os.path.join(prebuild_dir, 'downloads')],
+        d.pip_args)
+
+
+@temporary_dir
+@patch('tempfile.NamedTemporaryFile', FakeTemporaryFile)
+def test_prebuild_wheels_into_wheelhouse(tempdir):
+    requirements = os.path.join(tempdir, 'requirements.txt')
+    d = Deployment('test', prebuild_wheels=True, wheelhouse=True,
+                   cache_dir=os.path.join(tempdir, 'cache'))
+    d._interpreter_tag = 'tag'
+    d.setup_wheelhouse(requirements)
+    wheel_dirs = []
+
+    def download(cmd, **kwargs):
+        download_dir = cmd[cmd.index('--dest') + 1]
+        open(os.path.join(download_dir, 'PyYAML-6.0.tar.gz'), 'w').close()
+
+    def build(cmd, stdout, stderr, env):
+        wheel_dir = cmd[cmd.index('--wheel-dir') + 1]
+        wheel_dirs.append(wheel_dir)
+        open(os.path.join(wheel_dir, 'PyYAML-6.0-cp311-cp311-linux_x86_64.whl'),
+             'w').close()
+        return 0
+
+    with patch('subprocess.check_call', side_effect=download), \
+            patch('subprocess.call', side_effect=build), \
+            patch.object(Deployment, 'prebuild_log_dir',
+                         return_value=os.path.join(tempdir, 'logs')):
+        d.prebuild_wheels(requirements)
+    # Built next to the wheelhouse, so they are only renamed into it
+    wheel_dir, = wheel_dirs
+    eq_(d.wheelhouse.path, os.path.dirname(wheel_dir))
+    ok_(not os.path.exists(wheel_dir))
+    eq_([('pyyaml', '6.0')], list(d.wheelhouse.wheels()))
+    eq_(['install', LOG_ARG, '--find-links=' + d.wheelhouse.path,
+         '--find-links=' + os.path.join(d._prebuild_dir.name, 'downloads')],
+        d.pip_args)
+
+
+@temporary_dir
+@patch('tempfile.NamedTemporaryFile', FakeTemporaryFile)
+def test_install_requirement_wheels(deployment_dir):
+    site_packages = os.path.join(deployment_dir, 'lib/python3/site-packages')
+    for name, version in (('six', '1.16.0'), ('PyYAML', '5.4')):
+        dist_info = os.path.join(site_packages,
+                                 '{0}-{1}.dist-info'.format(name, version))
+        os.makedirs(dist_info)
+        with open(os.path.join(dist_info, 'METADATA'), 'w') as fh:
+            fh.write('Name: {0}\nVersion: {1}\n'.format(name, version))
+    requirements = os.path.join(deployment_dir, 'requirements.txt')
+    d = Deployment('test', installer='builtin', verbose=True,
+                   compile_bytecode=True, extra_pip_arg=['--prefer-binary'])
+    d.package_dir = deployment_dir
+    d.pip_args.append('--find-links=/wheels')
+    wheel_dirs = []
+
+    def wheel(cmd, **kwargs):
+        wheel_dir = cmd[cmd.index('--wheel-dir') + 1]
+        wheel_dirs.append(wheel_dir)
+        for name in ('six-1.16.0-py2.py3-none-any.whl',
+                     'PyYAML-6.0-cp311-cp311-linux_x86_64.whl'):
+            open(os.path.join(wheel_dir, name), 'w').close()
+
+    with patch('subprocess.check_call', side_effect=wheel) as callmock, \
+            patch('dh_virtualenv.installer.install_wheels') as install_wheels, \
+            patch('dh_virtualenv.installer.uninstall') as uninstall, \
+            patch.object(Deployment, 'install_scheme') as install_scheme:
+        d.install_dependencies()
+        ok_(not callmock.called)
+        open(requirements, 'w').close()
+        d.sourcedirectory = deployment_dir
+        d.install_dependencies()
+
+    wheel_dir, = wheel_dirs
+    callmock.assert_called_once_with([
+        PY_CMD, PIP_CMD, 'wheel', '--wheel-dir', wheel_dir, '-v', LOG_ARG,
+        '--prefer-binary', '--find-links=/wheels', '-r', requirements])
+    eq_('pyyaml', uninstall.call_args[0][0].name)
+    install_wheels.assert_called_once_with(
+        [os.path.join(wheel_dir, 'PyYAML-6.0-cp311-cp311-linux_x86_64.whl')],
+        install_scheme.return_value, '/opt/venvs/test/bin/python')
+    ok_(not os.path.exists(wheel_dir))
+
+
+@temporary_dir
+@patch('tempfile.NamedTemporaryFile', FakeTemporaryFile)
+@patch('subprocess.check_call')
+@patch('dh_virtualenv.installer.install_wheels')
+@patch.object(Deployment, 'install_scheme')
+def test_install_requirement_wheels_locked(sourcedir, install_scheme,
+                                           install_wheels, callmock):
+    requirements = write_file(sourcedir, 'requirements.txt', 'six\n')
+    lock = write_file(sourcedir, 'requirements.lock', lockfile.format_lock(
+        'six\n', _file_digest(requirements),
+        [('six', '1.16.0', ['abc'])]))
+    d = Deployment('test', installer='builtin', sourcedirectory=sourcedir,
+                   requirements_lock='requirements.lock')
+    d.install_requirement_wheels(requirements)
+    eq_(['--no-deps', '--require-hashes', '-r', lock],
+        callmock.call_args[0][0][-4:])
+
+    # Without resolving them again, the lock cannot be updated
+    write_file(sourcedir, 'requirements.txt', 'six\nmock\n')
+    with patch('dh_virtualenv.deployment.log') as log:
+        d.install_requirement_wheels(requirements)
+    eq_([LOG_ARG, '-r', requirements], callmock.call_args[0][0][-3:])
+    ok_(log.warning.called)
+
+
+@patch('dh_virtualenv.scheduler.available_memory', return_value=7 * 1024 ** 3)
+@patch('dh_virtualenv.scheduler.available_cpus', return_value=16)
+@patch.dict(os.environ, {'DEB_BUILD_OPTIONS': 'parallel=8', 'MAKEFLAGS': '-j8 w'})
+def test_schedule_build_jobs(available_cpus, available_memory):
+    d = Deployment('test', schedule_builds=True, prebuild_jobs=4)
+    d.schedule_build_jobs()
+    # 7 GB for 2 GB per job
+    eq_(3, d.build_jobs)
+    eq_(3, d.prebuild_jobs)
+    eq_('w -j3', d.pip_env['MAKEFLAGS'])
+    eq_('3', d.pip_env['CMAKE_BUILD_PARALLEL_LEVEL'])
+    eq_(os.environ['PATH'], d.pip_env['PATH'])
+
+    d = Deployment('test', schedule_builds=True, concurrent_builds=2,
+                   build_job_memory=512 * 1024 ** 2, offline='/wheels')
+    d.schedule_build_jobs()
+    eq_(4, d.build_jobs)
+    eq_('4', d.pip_env['MAX_JOBS'])
+    eq_('http://127.0.0.1:9', d.pip_env['http_proxy'])
+
+
+_FAKE_CCACHE = '''\
+#!/bin/sh
+# Counts every compilation as a hit
+if [ "$1" = --print-stats ]; then
+    printf 'direct_cache_hit\\t%s\\ncache_miss\\t1\\n' $(wc -l <"$CCACHE_DIR/hits")
+    exit 0
+fi
+echo >>"$CCACHE_DIR/hits"
+printf '# source.c\ndirect_cache_hit\n' >>"$CCACHE_STATSLOG"
+exec "$@"
+'''
+
+
+@temporary_dir
+def test_compiler_cache(tempdir):
+    bin_dir = os.path.join(tempdir, 'bin')
+    os.makedirs(bin_dir)
+    os.makedirs(os.path.join(tempdir, 'debian'))
+    os.makedirs(os.path.join(tempdir, 'cache', 'ccache'))
+    open(os.path.join(tempdir, 'cache', 'ccache', 'hits'), 'w').close()
+    with open(os.path.join(bin_dir, 'ccache'), 'w') as fh:
+        fh.write(_FAKE_CCACHE)
+    os.chmod(os.path.join(bin_dir, 'ccache'), 0o755)
+    cwd = os.getcwd()
+    environ = {'PATH': bin_dir + os.pathsep + os.environ['PATH'],
+               'CC': 'env', 'CXX': 'env'}
+
+    with patch.dict(os.environ, environ):
+        os.chdir(tempdir)
+        try:
+            d = Deployment('test', compiler_cache='ccache',
+                           cache_dir=os.path.join(tempdir, 'cache'))
+            with patch.object(d, 'venv_bin', return_value=sys.executable):
+                d.setup_compiler_cache()
+            env = d.pip_env
+            eq_(os.path.join(tempdir, 'cache', 'ccache'), env['CCACHE_DIR'])
+            eq_(tempdir, env['CCACHE_BASEDIR'])
+            ok_(env['TMPDIR'].startswith(os.path.join(tempdir, 'debian', '')))
+            ok_(env['LDSHARED'].startswith(os.path.join(bin_dir, 'ccache ')))
+            wrapper = env['CMAKE_C_COMPILER_LAUNCHER']
+            eq_(wrapper + ' env', env['CC'])
+
+            for _ in range(3):
+                subprocess.check_call(
+                    env['CC'].split() + ['true'], env=env)
+            report = d.report_compiler_cache()
+            ok_(not os.path.exists(wrapper))
+            with open(d.report_path('compiler-cache')) as fh:
+                eq_(dict(report, package='test'), json.load(fh))
+        finally:
+            os.chdir(cwd)
+    # No misses to tell how long compiling takes
+    eq_(('ccache', 3, 0, 1.0, 'build', 3, None),
+        (report['tool'], report['hits'], report['misses'],
+         report['hit_rate'], report['counted_for'], report['compilations'],
+         report['saved_seconds']))
+
+
+@temporary_dir
+@patch('tempfile.NamedTemporaryFile', FakeTemporaryFile)
+def test_install_package_with_cached_build_env(tempdir):
+    sourcedir = os.path.join(tempdir, 'src')
+    os.makedirs(sourcedir)
+    with open(os.path.join(sourcedir, 'pyproject.toml'), 'w') as fh:
+        fh.write('[build-system]\nrequires = ["setuptools", "cython"]\n'
+                 'build-backend = "scikit_build_core.build"\n')
+    calls = []
+
+    def pip(cmd, **kwargs):
+        calls.append((cmd, kwargs))
+        if '--target' in cmd:
+            os.makedirs(cmd[cmd.index('--target') + 1])
+        elif '-c' in cmd:
+            # The backend asks for more than its static requirements
+            with open(cmd[-1], 'w') as fh:
+                json.dump(['cmake>=3.15', 'setuptools'], fh)
+        elif 'wheel' in cmd:
+            open(os.path.join(cmd[cmd.index('--wheel-dir') + 1],
+                              'foo-1.0-py3-none-any.whl'), 'w').close()
+
+    d = Deployment('test', sourcedirectory=sourcedir, extras=['bar'],
+                   cache_build_envs=True, cache_dir=tempdir)
+    with patch('subprocess.check_call', side_effect=pip), \
+            patch.object(d, 'interpreter_tag', return_value='cpython-311'):
+        d.install_package()
+        d.install_package()
+
+    static_env_dir = d.build_env_cache.env_dir(['cython', 'setuptools'])
+    env_dir = d.build_env_cache.env_dir(['cmake>=3.15', 'cython', 'setuptools'])
+    with open(os.path.join(env_dir, 'requires.txt')) as fh:
+        eq_('cmake>=3.15\ncython\nsetuptools\n', fh.read())
+    # Prepared once, used twice
+    eq_(8, len(calls))
+    prepare, kwargs = calls[0]
+    eq_([PY_CMD, PIP_CMD, 'install', '--target'], prepare[:4])
+    eq_([LOG_ARG, 'cython', 'setuptools'], prepare[-3:])
+
+    query, kwargs = calls[1]
+    eq_([PY_CMD, '-c'], query[:2])
+    eq_(['scikit_build_core.build', '[]'], query[3:5])
+    eq_(sourcedir, kwargs['cwd'])
+    eq_(os.path.join(static_env_dir, 'site'), kwargs['env']['PYTHONPATH'])
+
+    prepare, kwargs = calls[2]
+    eq_([LOG_ARG, 'cmake>=3.15', 'cython', 'setuptools'], prepare[-4:])
+
+    build, kwargs = calls[3]
+    wheel_dir = build[build.index('--wheel-dir') + 1]
+    eq_([PY_CMD, PIP_CMD, 'wheel', '--no-deps', '--no-build-isolation',
+         '--wheel-dir', wheel_dir, LOG_ARG, sourcedir], build)
+    eq_(os.path.join(env_dir, 'site'), kwargs['env']['PYTHONPATH'])
+    ok_(kwargs['env']['PATH'].startswith(os.path.join(env_dir, 'site', 'bin')))
+
+    install, kwargs = calls[4]
+    eq_([PY_CMD, PIP_CMD, 'install', LOG_ARG,
+         os.path.join(wheel_dir, 'foo-1.0-py3-none-any.whl[bar]')], install)
+    eq_(sourcedir, kwargs['cwd'])
+    ok_(not os.path.exists(wheel_dir))
+
+    # Queried again, the environments are reused
+    eq_(query[:5], calls[5][0][:5])
+    eq_(build[:5], calls[6][0][:5])
+    eq_(install[:3], calls[7][0][:3])
+
+
+@temporary_dir
+@patch('tempfile.NamedTemporaryFile', FakeTemporaryFile)
+def test_install_package_without_build_requires_from_backend(tempdir):
+    with open(os.path.join(tempdir, 'pyproject.toml'), 'w') as fh:
+        fh.write('[build-system]\nrequires = ["setuptools"]\n')
+
+    def pip(cmd, **kwargs):
+        if '--target' in cmd:
+            os.makedirs(cmd[cmd.index('--target') + 1])
+        elif '-c' in cmd:
+            raise subprocess.CalledProcessError(1, cmd)
+
+    d = Deployment('test', sourcedirectory=tempdir, cache_build_envs=True,
+                   cache_dir=tempdir)
+    with patch('subprocess.check_call', side_effect=pip) as callmock, \
+            patch.object(d, 'interpreter_tag', return_value='cpython-311'):
+        d.install_package()
+    # Built in isolation instead
+    callmock.assert_called_with([PY_CMD, PIP_CMD, 'install', LOG_ARG, '.'],
+                                cwd=tempdir)
+
+
+@temporary_dir
+@patch('tempfile.NamedTemporaryFile', FakeTemporaryFile)
+def test_prebuild_wheels_with_cached_build_envs(tempdir):
+    requirements = os.path.join(tempdir, 'requirements.txt')
+    d = Deployment('test', prebuild_wheels=True, cache_build_envs=True,
+                   cache_dir=os.path.join(tempdir, 'cache'))
+    d._interpreter_tag = 'tag'
+    builds = []
+
+    def sdist(path, build_requires):
+        base = os.path.basename(path)[:-len('.tar.gz')]
+        with tarfile.open(path, 'w:gz') as tf:
+            content = '[build-system]\nrequires = {0}\n'.format(
+                json.dumps(build_requires)).encode('utf-8')
+            info = tarfile.TarInfo(base + '/pyproject.toml')
+            info.size = len(content)
+            tf.addfile(info, io.BytesIO(content))
+
+    def pip(cmd, **kwargs):
+        if '--dest' in cmd:
+            download_dir = cmd[cmd.index('--dest') + 1]
+            sdist(os.path.join(download_dir, 'PyYAML-6.0.tar.gz'),
+                  ['setuptools', 'cython'])
+            sdist(os.path.join(download_dir, 'dynamic-1.0.tar.gz'),
+                  ['setuptools'])
+            open(os.path.join(download_dir, 'legacy-1.0.tar.gz'), 'w').close()
+        elif '--target' in cmd:
+            os.makedirs(cmd[cmd.index('--target') + 1])
+
+    def build(cmd, stdout, stderr, env):
+        builds.append((os.path.basename(cmd[-1]),
+                       '--no-build-isolation' in cmd,
+                       (env or {}).get('PYTHONPATH')))
+        # Needs a build requirement it only tells about dynamically
+        return int('dynamic' in cmd[-1] and '--no-build-isolation' in cmd)
+
+    with patch('subprocess.check_call', side_effect=pip), \
+            patch('subprocess.call', side_effect=build), \
+            patch.object(Deployment, 'prebuild_log_dir',
+                         return_value=os.path.join(tempdir, 'logs')):
+        d.prebuild_wheels(requirements)
+
+    site = dict(
+        (tuple(requires),
+         os.path.join(d.build_env_cache.env_dir(requires), 'site'))
+        for requires in (['cython', 'setuptools'], ['setuptools']))
+    # Failed without isolation, then built with it
+    eq_([('dynamic-1.0.tar.gz', True, site[('setuptools',)]),
+         ('dynamic-1.0.tar.gz', False, None)],
+        [b for b in builds if b[0] == 'dynamic-1.0.tar.gz'])
+    eq_(sorted([('PyYAML-6.0.tar.gz', True, site[('cython', 'setuptools')]),
+                ('dynamic-1.0.tar.gz', True, site[('setuptools',)]),
+                ('dynamic-1.0.tar.gz', False, None),
+                ('legacy-1.0.tar.gz', False, None)]),
+        sorted(builds))
+
+
+def test_seed_requirements():
+    eq_(['pip', 'setuptools', 'wheel'],
+        Deployment('test', builtin_venv=True,
+                   seed_from_cache=True).seed_requirements())
+    eq_(['pip', 'setuptools', 'wheel'],
+        Deployment('test', builtin_venv=True, seed_from_cache=True,
+                   upgrade_pip_to='latest').seed_requirements())
+    eq_(['pip==23.2.1', 'setuptools', 'wheel'],
+        Deployment('test', builtin_venv=True, seed_from_cache=True,
+                   upgrade_pip_to='23.2.1').seed_requirements())
+    # Only the builtin venv gets seeded
+    ok_(not Deployment('test', seed_from_cache=True).seed_from_cache)
+
+
+@temporary_dir
+@patch('tempfile.NamedTemporaryFile', FakeTemporaryFile)
+def test_create_venv_seeded_from_cache(tempdir):
+    downloads = []
+
+    def download(cmd, **kwargs):
+        if 'download' in cmd:
+            downloads.append(cmd)
+            dest = cmd[cmd.index('--dest') + 1]
+            os.makedirs(dest, exist_ok=True)
+            for name in ('pip-23.2.1-py3-none-any.whl',
+                         'setuptools-68.0.0-py3-none-any.whl',
+                         'wheel-0.41.0-py3-none-any.whl'):
+                open(os.path.join(dest, name), 'w').close()
+
+    d = Deployment('test', python='python_interpreter', builtin_venv=True,
+                   use_system_packages=True, seed_from_cache=True,
+                   upgrade_pip_to='23.2.1', cache_dir=tempdir)
+    with patch('subprocess.check_call', side_effect=download) as callmock, \
+            patch('subprocess.check_output',
+                  return_value=b'cpython-311\n') as tagmock, \
+            patch('dh_virtualenv.installer.install_wheels') as install_wheels, \
+            patch.object(Deployment, 'install_scheme') as install_scheme:
+        d.create_virtualenv()
+        d.create_virtualenv()
+        d.install_dependencies()
+
+        # Another interpreter needs its own wheels
+        other = Deployment('test', python='python_interpreter',
+                           builtin_venv=True, seed_from_cache=True,
+                           upgrade_pip_to='23.2.1', cache_dir=tempdir)
+        other._interpreter_tag = 'cpython-37'
+        other.create_virtualenv()
+
+    # Downloaded once per interpreter with a bootstrapped pip, venv run
+    # once per virtualenv, no pip upgrade
+    eq_(2, len(downloads))
+    eq_(['pip==23.2.1', 'setuptools', 'wheel'], downloads[0][-3:])
+    venv_call = call(['python_interpreter', '-m', 'venv',
+                      '--system-site-packages', '--without-pip',
+                      TEST_VENV_PATH])
+    eq_(7, callmock.call_count)
+    eq_(venv_call, callmock.call_args_list[0])
+    eq_(['python_interpreter', '-m', 'venv'], callmock.call_args_list[1][0][0][:3])
+    eq_(venv_call, callmock.call_args_list[3])
+    eq_(PY_CMD, tagmock.call_args[0][0][0])
+    eq_(['cpython-311', 'cpython-37'],
+        sorted(os.listdir(os.path.join(tempdir, 'seed'))))
+
+    seed_parent = os.path.join(tempdir, 'seed', 'cpython-311')
+    seed_dir = os.path.join(seed_parent, os.listdir(seed_parent)[0])
+    with open(os.path.join(seed_dir, 'requirements.txt')) as fh:
+        eq_('pip==23.2.1\nsetuptools==68.0.0\nwheel==0.41.0\n', fh.read())
+    install_scheme.assert_any_call(PY_CMD)
+    install_wheels.assert_any_call(
+        [os.path.join(seed_dir, 'pip-23.2.1-py3-none-any.whl'),
+         os.path.join(seed_dir, 'setuptools-68.0.0-py3-none-any.whl'),
+         os.path.join(seed_dir, 'wheel-0.41.0-py3-none-any.whl')],
+        install_scheme.return_value, PY_CMD)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+import base64
+import csv
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+from nose.tools import eq_, ok_
+
+from dh_virtualenv import installer, metadata
+
+PYTHON_DIR = 'python{0}.{1}'.format(*sys.version_info[:2])
+
+
+def _make_wheel(directory, name='demo', version='1.0'):
+    """Build a small wheel using every part of the format."""
+    dist_info = '{0}-{1}.dist-info'.format(name, version)
+    data = '{0}-{1}.data'.format(name, version)
+    files = [
+        ('{0}/__init__.py'.format(name), 'def main():\n    return 0\n', 0o644),
+        ('{0}/cli/__init__.py'.format(name), '', 0o644),
+        ('{0}/scripts/'.format(data) + 'demo-sh', '#!/bin/sh\necho demo\n', 0o755),
+        ('{0}/scripts/'.format(data) + 'demo-py', '#!python\nprint(1)\n', 0o644),
+        ('{0}/headers/demo.h'.format(data), '#define DEMO 1\n', 0o644),
+        ('{0}/data/share/demo/demo.txt'.format(data), 'demo\n', 0o644),
+        (dist_info + '/METADATA', 'Metadata-Version: 2.1\nName: {0}\n'
+         'Version: {1}\n'.format(name, version), 0o644),
+        (dist_info + '/WHEEL', 'Wheel-Version: 1.0\nGenerator: test\n'
+         'Root-Is-Purelib: true\nTag: py3-none-any\n', 0o644),
+        (dist_info + '/entry_points.txt', '[console_scripts]\n'
+         'demo = demo:main\n[gui_scripts]\ndemo-gui = demo.cli:main\n', 0o644),
+    ]
+    path = os.path.join(directory, '{0}-{1}-py3-none-any.whl'.format(
+        name, version))
+    with zipfile.ZipFile(path, 'w') as zf:
+        for filename, content, mode in files:
+            info = zipfile.ZipInfo(filename)
+            info.external_attr = (0o100000 | mode) << 16
+            zf.writestr(info, content)
+        zf.writestr(dist_info + '/RECORD', ''.join(
+            '{0},sha256={1},{2}\n'.format(filename, base64.urlsafe_b64encode(
+                hashlib.sha256(content.encode()).digest()).rstrip(b'=')
+                .decode(), len(content))
+            for filename, content, _ in files) + dist_info + '/RECORD,,\n')
+    return path
+
+
+def _prefix_scheme(prefix):
+    site_packages = os.path.join(prefix, 'lib', PYTHON_DIR, 'site-packages')
+    return installer.Scheme(
+        purelib=site_packages, platlib=site_packages,
+        scripts=os.path.join(prefix, 'bin'),
+        headers=os.path.join(prefix, 'include', PYTHON_DIR),
+        data=prefix)
+
+
+def _tree(root):
+    found = set()
+    for dirpath, dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            found.add((os.path.relpath(path, root),
+                       os.stat(path).st_mode & 0o111 != 0))
+    return found
+
+
+def _record(site_packages, name):
+    with open(os.path.join(site_packages, name + '.dist-info', 'RECORD')) as fh:
+        return dict((row[0], row[1:]) for row in csv.reader(fh))
+
+
+def test_script_header():
+    eq_('#!/opt/venvs/foo/bin/python\n',
+        installer.script_header('/opt/venvs/foo/bin/python'))
+    long_path = '/' + 127 * 'p' + '/bin/python'
+    eq_("#!/bin/sh\n'''exec' " + long_path + ' "$0" "$@"\n' "' '''\n",
+        installer.script_header(long_path))
+
+
+def test_launcher_script():
+    ok_(installer.launcher_script('/usr/bin/python3', 'foo.cli:main')
+        .startswith('#!/usr/bin/python3\n'))
+    eq_(None, installer.launcher_script('/usr/bin/python3', 'foo.cli'))
+    eq_(None, installer.launcher_script('/usr/bin/python3', 'foo-bar:main'))
+
+
+def test_install_wheel_matches_pip():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        _make_wheel(tmpdir)
+        pip_prefix = os.path.join(tmpdir, 'pip')
+        subprocess.check_call([
+            sys.executable, '-m', 'pip', 'install', '--quiet', '--no-deps',
+            '--no-compile', '--no-index', '--disable-pip-version-check',
+            '--root-user-action=ignore',
+            '--find-links', tmpdir, '--prefix', pip_prefix, 'demo==1.0'])
+        builtin_prefix = os.path.join(tmpdir, 'builtin')
+        installer.install_wheels(
+            [os.path.join(tmpdir, 'demo-1.0-py3-none-any.whl')],
+            _prefix_scheme(builtin_prefix), '/opt/venvs/demo/bin/python')
+
+        eq_(_tree(pip_prefix), _tree(builtin_prefix))
+
+        site_packages = os.path.join('lib', PYTHON_DIR, 'site-packages')
+        pip_record = _record(os.path.join(pip_prefix, site_packages),
+                             'demo-1.0')
+        builtin_record = _record(os.path.join(builtin_prefix, site_packages),
+                                 'demo-1.0')
+        eq_(sorted(pip_record), sorted(builtin_record))
+        # Scripts and installer differ, the rest is exactly the same
+        for path in ('demo/__init__.py', '../../../bin/demo-sh',
+                     '../../../share/demo/demo.txt'):
+            eq_(pip_record[path], builtin_record[path])
+
+        with open(os.path.join(builtin_prefix, 'bin', 'demo-py')) as fh:
+            eq_('#!/opt/venvs/demo/bin/python\nprint(1)\n', fh.read())
+        with open(os.path.join(builtin_prefix, site_packages,
+                               'demo-1.0.dist-info', 'INSTALLER')) as fh:
+            eq_('dh-virtualenv\n', fh.read())
+        ok_('from demo.cli import main' in
+            open(os.path.join(builtin_prefix, 'bin', 'demo-gui')).read())
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_install_wheel_refuses_paths_outside():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'evil-1.0-py3-none-any.whl')
+        with zipfile.ZipFile(path, 'w') as zf:
+            zf.writestr('evil-1.0.dist-info/WHEEL', 'Root-Is-Purelib: true\n')
+            zf.writestr('../evil.py', '')
+        prefix = os.path.join(tmpdir, 'prefix')
+        try:
+            installer.install_wheel(path, _prefix_scheme(prefix),
+                                    '/usr/bin/python3')
+        except Exception as e:
+            ok_('outside' in str(e))
+        else:
+            ok_(False, 'Installed a file outside of the prefix')
+        ok_(not os.path.exists(os.path.join(tmpdir, 'evil.py')))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_uninstall():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        prefix = os.path.join(tmpdir, 'prefix')
+        scheme = _prefix_scheme(prefix)
+        installer.install_wheel(_make_wheel(tmpdir), scheme,
+                                '/usr/bin/python3')
+        os.makedirs(os.path.join(scheme.purelib, 'other'))
+
+        dist, = metadata.distributions(prefix)
+        installer.uninstall(dist)
+        eq_(['other'], os.listdir(scheme.purelib))
+        eq_([], os.listdir(scheme.scripts))
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import tempfile
+
+from nose.tools import eq_
+
+from dh_virtualenv import lockfile
+
+
+def _item(name, version, archive_info):
+    return {'metadata': {'name': name, 'version': version},
+            'download_info': {'url': 'https://example.com/',
+                              'archive_info': archive_info}}
+
+
+def test_pins_from_report():
+    report = {'install': [
+        _item('Six', '1.16.0', {'hashes': {'sha256': 'abc'}}),
+        _item('attrs', '20.3.0', {'hash': 'sha256=def'}),
+    ]}
+    eq_([('attrs', '20.3.0', ['def']), ('six', '1.16.0', ['abc'])],
+        lockfile.pins_from_report(report))
+
+
+def test_pins_from_report_without_archives():
+    report = {'install': [
+        _item('six', '1.16.0', {'hashes': {'sha256': 'abc'}}),
+        {'metadata': {'name': 'foo', 'version': '1.0'},
+         'download_info': {'url': 'file:///src/foo', 'dir_info': {}}},
+    ]}
+    eq_(None, lockfile.pins_from_report(report))
+    report = {'install': [_item('six', '1.16.0', {'hash': 'md5=abc'})]}
+    eq_(None, lockfile.pins_from_report(report))
+
+
+def test_format_and_read_lock():
+    content = lockfile.format_lock(
+        '--index-url https://example.com/simple\nsix>=1.0\n', '0123',
+        [('six', '1.16.0', ['bbb', 'aaa'])], source='requirements.txt')
+    eq_('# Generated by dh-virtualenv from requirements.txt, do not edit.\n'
+        '# requirements-sha256: 0123\n'
+        '--index-url https://example.com/simple\n'
+        'six==1.16.0 \\\n'
+        '    --hash=sha256:aaa \\\n'
+        '    --hash=sha256:bbb\n', content)
+
+    tempdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tempdir, 'requirements.lock')
+        eq_(None, lockfile.read_digest(path))
+        with open(path, 'w') as fh:
+            fh.write(content)
+        eq_('0123', lockfile.read_digest(path))
+    finally:
+        shutil.rmtree(tempdir)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import tempfile
+
+from nose.tools import eq_
+
+from dh_virtualenv import metadata
+
+
+def _write(root, name, content):
+    path = os.path.join(root, name)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as fh:
+        fh.write(content)
+    return path
+
+
+def test_distributions_and_record_files():
+    venv = tempfile.mkdtemp()
+    try:
+        site_packages = os.path.join(venv, 'lib', 'python3.11', 'site-packages')
+        _write(site_packages, 'Foo_Bar-1.0.dist-info/METADATA',
+               'Metadata-Version: 2.1\nName: Foo_Bar\nVersion: 1.0\n\nBody\n')
+        _write(site_packages, 'Foo_Bar-1.0.dist-info/RECORD',
+               'foo_bar/__init__.py,sha256=abc,10\n'
+               '"foo_bar/a,b.py",,\n'
+               '../../../bin/foo,sha256=def,20\n')
+        _write(site_packages, 'baz-2.0.dist-info/RECORD', '')
+        os.symlink('lib', os.path.join(venv, 'lib64'))
+
+        dists = metadata.distributions(venv)
+        eq_([('foo-bar', '1.0'), ('baz', '2.0')],
+            [(d.name, d.version) for d in dists])
+        eq_([os.path.join(site_packages, 'foo_bar', '__init__.py'),
+             os.path.join(site_packages, 'foo_bar', 'a,b.py'),
+             os.path.join(venv, 'bin', 'foo')],
+            metadata.record_files(dists[0]))
+        eq_([], metadata.record_files(dists[1]))
+    finally:
+        shutil.rmtree(venv)
+
+
+def test_local_distributions():
+    venv = tempfile.mkdtemp()
+    try:
+        site_packages = os.path.join(venv, 'lib', 'python3.11', 'site-packages')
+        _write(site_packages, 'foo-1.0.dist-info/direct_url.json',
+               '{"url": "file:///src/foo", "dir_info": {}}')
+        _write(site_packages, 'bar-2.0.dist-info/RECORD', '')
+        eq_(set(['foo']), metadata.local_distributions(venv))
+    finally:
+        shutil.rmtree(venv)
+
+
+def test_entry_points():
+    venv = tempfile.mkdtemp()
+    try:
+        site_packages = os.path.join(venv, 'lib', 'python3.11', 'site-packages')
+        _write(site_packages, 'foo-1.0.dist-info/entry_points.txt',
+               '[console_scripts]\n'
+               'Foo-Cli = foo.cli:main [extra]\n\n'
+               '[foo.plugins]\nbar = foo.bar\n')
+        dist, = metadata.distributions(venv)
+        eq_({'console_scripts': {'Foo-Cli': 'foo.cli:main [extra]'},
+             'foo.plugins': {'bar': 'foo.bar'}},
+            metadata.entry_points(dist))
+    finally:
+        shutil.rmtree(venv)
+
+
+def test_parse_object_reference():
+    eq_(('foo.cli', 'main'),
+        metadata.parse_object_reference('foo.cli:main [extra]'))
+    eq_(('foo.cli', 'Main.run'),
+        metadata.parse_object_reference(' foo.cli : Main.run'))
+    eq_(('foo', ''), metadata.parse_object_reference('foo'))
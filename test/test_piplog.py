@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+from nose.tools import eq_
+
+from dh_virtualenv import piplog
+
+LOG = '''\
+2024-01-01T10:00:00,000 Using pip 23.2.1 from /venv/lib/python3.11/site-packages/pip (python 3.11)
+2024-01-01T10:00:00,100 Collecting requests==2.31.0 (from -r requirements.txt (line 1))
+2024-01-01T10:00:00,300   Downloading requests-2.31.0-py3-none-any.whl (62 kB)
+2024-01-01T10:00:00,800 Collecting six==1.16.0
+2024-01-01T10:00:00,900   Using cached six-1.16.0-py2.py3-none-any.whl (11 kB)
+2024-01-01T10:00:01,000 Collecting PyYAML==6.0
+2024-01-01T10:00:01,100   Downloading PyYAML-6.0.tar.gz (1.2 MB)
+2024-01-01T10:00:03,100   Installing build dependencies: started
+2024-01-01T10:00:03,200   Processing /wheels/setuptools-68.0.0-py3-none-any.whl
+multi-line output without a timestamp
+2024-01-01T10:00:04,100 Processing ./src
+2024-01-01T10:00:04,500   Source in ./src has version 1.0, which satisfies requirement My_App==1.0 from file:///src
+2024-01-01T10:00:05,000 Building wheels for collected packages: PyYAML, My_App
+2024-01-01T10:00:05,000   Building wheel for PyYAML (pyproject.toml): started
+2024-01-01T10:00:09,500   Building wheel for PyYAML (pyproject.toml): finished with status 'done'
+2024-01-01T10:00:09,500   Created wheel for PyYAML: filename=PyYAML-6.0-cp311-cp311-linux_x86_64.whl size=700000 sha256=abc
+2024-01-01T10:00:09,600   Building wheel for My_App (setup.py): started
+2024-01-01T10:00:10,000   Building wheel for My_App (setup.py): finished with status 'done'
+2024-01-01T10:00:10,100 Installing collected packages: six, requests, PyYAML, My_App
+2024-01-01T10:00:12,100 Successfully installed My_App-1.0 PyYAML-6.0 requests-2.31.0 six-1.16.0
+'''
+
+
+def _entry(**kwargs):
+    entry = {'source': None, 'resolve_seconds': 0.0, 'download_seconds': 0.0,
+             'download_bytes': 0, 'cached': False, 'build_seconds': None,
+             'build_backend': None, 'wheel_bytes': None, 'version': None}
+    entry.update(kwargs)
+    return entry
+
+
+def test_parse_log():
+    timeline = piplog.parse_log(LOG.splitlines())
+    eq_(12.1, timeline['wall_seconds'])
+    eq_(2.0, timeline['install_seconds'])
+    eq_(['requests', 'six', 'pyyaml', 'my-app'],
+        list(timeline['distributions']))
+    eq_({
+        'requests': _entry(source='wheel', resolve_seconds=0.2,
+                           download_seconds=0.5, download_bytes=62000,
+                           version='2.31.0'),
+        'six': _entry(source='wheel', resolve_seconds=0.2, cached=True,
+                      version='1.16.0'),
+        'pyyaml': _entry(source='sdist', resolve_seconds=1.1,
+                         download_seconds=2.0, download_bytes=1200000,
+                         build_seconds=4.5, build_backend='pyproject.toml',
+                         wheel_bytes=700000, version='6.0'),
+        'my-app': _entry(source='directory', resolve_seconds=0.9,
+                         build_seconds=0.4, build_backend='setup.py',
+                         version='1.0'),
+    }, timeline['distributions'])
+
+
+def test_parse_log_empty():
+    eq_({'distributions': {}, 'install_seconds': None, 'wall_seconds': 0.0},
+        piplog.parse_log(['Not a pip log']))
+
+
+def test_parse_log_unknown_requirement():
+    timeline = piplog.parse_log([
+        '2024-01-01T10:00:00,000 Collecting ==1.0',
+        '2024-01-01T10:00:01,000 Collecting Foo_Bar>=2 (from -r r.txt)',
+        '2024-01-01T10:00:02,000 Installing collected packages: foo-bar',
+    ])
+    eq_(['==1.0', 'foo-bar'], list(timeline['distributions']))
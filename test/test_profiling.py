@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from nose.tools import eq_, ok_, assert_raises
+
+from dh_virtualenv import profiling
+
+
+def test_parse_importtime():
+    lines = [
+        'import time: self [us] | cumulative | imported package',
+        'import time:       100 |        100 | _io',
+        'import time:        50 |         50 |   foo.bar',
+        'import time:       200 |        250 | foo',
+        'Traceback (most recent call last):',
+    ]
+    eq_([profiling.ImportTime('_io', 0, 100, 100),
+         profiling.ImportTime('foo.bar', 1, 50, 50),
+         profiling.ImportTime('foo', 0, 200, 250)],
+        profiling.parse_importtime(lines))
+
+
+def test_run_measured():
+    status, wall, rss = profiling.run_measured(
+        [sys.executable, '-c', 'import sys; sys.exit(3)'])
+    eq_(3, status)
+    ok_(wall > 0)
+    ok_(rss > 0)
+
+
+def test_run_measured_killed():
+    status, _, _ = profiling.run_measured(
+        [sys.executable, '-c', 'import os; os.kill(os.getpid(), 9)'])
+    eq_(-9, status)
+
+
+def test_run_measured_without_input():
+    status, _, _ = profiling.run_measured(
+        [sys.executable, '-c', 'input()'], timeout=30)
+    eq_(1, status)
+
+
+def test_run_measured_timeout():
+    start = time.time()
+    assert_raises(subprocess.TimeoutExpired, profiling.run_measured,
+                  [sys.executable, '-c', 'import time; time.sleep(60)'],
+                  timeout=0.2)
+    ok_(time.time() - start < 30)
+
+
+def test_evict_page_cache():
+    root = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(root, 'foo'), 'w') as fh:
+            fh.write('foo')
+        os.symlink('missing', os.path.join(root, 'dangling'))
+        profiling.evict_page_cache(root)
+    finally:
+        shutil.rmtree(root)
+
+
+def test_summarize():
+    eq_({'wall_seconds': {'min': 0.1, 'median': 0.2, 'max': 0.4},
+         'max_rss_kb': 300},
+        profiling.summarize([(0.2, 100), (0.4, 300), (0.1, 200)]))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+import tempfile
+
+from mock import patch
+from nose.tools import eq_
+
+from dh_virtualenv import scheduler
+
+
+def test_parallel_option():
+    eq_(4, scheduler.parallel_option('nocheck parallel=4'))
+    eq_(None, scheduler.parallel_option('nocheck'))
+    eq_(None, scheduler.parallel_option('parallel=0 parallel=x'))
+    eq_(None, scheduler.parallel_option(''))
+
+
+def test_available_memory():
+    with tempfile.NamedTemporaryFile('w') as fh:
+        fh.write('MemTotal:        8000000 kB\n'
+                 'MemFree:          100000 kB\n'
+                 'MemAvailable:    4194304 kB\n')
+        fh.flush()
+        eq_(4 * 1024 ** 3, scheduler.available_memory(fh.name))
+    eq_(None, scheduler.available_memory('/nonexistent/meminfo'))
+
+
+@patch('os.sched_getaffinity', return_value={0, 1, 2})
+def test_available_cpus(getaffinity):
+    eq_(3, scheduler.available_cpus())
+
+
+def test_compile_jobs():
+    gib = 1024 ** 3
+    eq_(16, scheduler.compile_jobs(16, None, 2 * gib))
+    # 8 GB builders: memory is the limit
+    eq_(3, scheduler.compile_jobs(16, 7 * gib, 2 * gib))
+    eq_(4, scheduler.compile_jobs(16, 64 * gib, 2 * gib, parallel=4))
+    eq_(5, scheduler.compile_jobs(16, 64 * gib, 2 * gib, builds=3))
+    eq_(1, scheduler.compile_jobs(16, gib, 2 * gib, builds=2))
+
+
+def test_build_env():
+    eq_({'MAKEFLAGS': '-j3', 'MAX_JOBS': '3', 'NPY_NUM_BUILD_JOBS': '3',
+         'CMAKE_BUILD_PARALLEL_LEVEL': '3'}, scheduler.build_env(3))
+    eq_('w --no-print-directory -j2', scheduler.build_env(
+        2, 'w -j8 --jobserver-auth=3,4 --no-print-directory')['MAKEFLAGS'])
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+import importlib.util
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from importlib.machinery import SourceFileLoader
+
+from mock import patch
+from nose.tools import eq_, ok_
+
+from dh_virtualenv import Deployment
+from dh_virtualenv.cmdline import get_default_parser
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'bin', 'dh_virtualenv')
+
+
+def _load_script():
+    # Registered in sys.modules, so the process pool can find its functions
+    loader = SourceFileLoader('dh_virtualenv_script', SCRIPT)
+    spec = importlib.util.spec_from_loader(loader.name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    sys.modules[loader.name] = module
+    return module
+
+
+script = _load_script()
+
+
+def _fake_build_package(package, options, do_test):
+    # Output of subprocesses has to end up in the package's log, too
+    subprocess.check_call(['echo', 'building {0}'.format(package)])
+    if package == 'broken':
+        raise RuntimeError('{0} cannot be built'.format(package))
+
+
+def test_build_in_parallel_logs_per_package():
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        os.chdir(tmpdir)
+        os.mkdir('debian')
+        options, _ = get_default_parser().parse_args(['--jobs', '2'])
+        stderr = io.StringIO()
+        with patch.object(script, 'build_package', _fake_build_package), \
+                patch.object(script, 'log') as log, \
+                patch('sys.stderr', stderr):
+            failed = script._build_in_parallel(
+                ['good', 'broken', 'other'], options, False)
+        eq_(['broken'], failed)
+        eq_(1, log.error.call_count)
+        ok_(log.error.call_args[0][0].startswith('broken: Build failed'))
+        for package in ('good', 'broken', 'other'):
+            with open(script._package_log(package)) as fh:
+                eq_('building {0}\n'.format(package), fh.read())
+        # The tail of the failed package's log is repeated
+        eq_('building broken\n', stderr.getvalue())
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+
+def _fake_build_package_died(package, options, do_test):
+    # Fails before the log of the package exists
+    raise RuntimeError('{0} died'.format(package))
+
+
+def test_build_in_parallel_without_log():
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        os.chdir(tmpdir)
+        os.mkdir('debian')
+        options, _ = get_default_parser().parse_args(['--jobs', '2'])
+        with patch.object(script, '_build_package_logged',
+                          _fake_build_package_died), \
+                patch.object(script, 'log') as log:
+            failed = script._build_in_parallel(['foo', 'bar'], options, False)
+        eq_(['bar', 'foo'], sorted(failed))
+        eq_(4, log.error.call_count)
+        ok_('foo died' in str(log.error.call_args_list))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+
+def test_main_adds_autoscripts():
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    autoscripts = []
+
+    class FakeDebHelper(object):
+        def __init__(self, options):
+            self.packages = {'foo': {}}
+
+        def autoscript(self, package, when, template, sed):
+            autoscripts.append((package, when, sed))
+
+        def save(self):
+            pass
+
+    try:
+        os.chdir(tmpdir)
+        os.mkdir('debian')
+        with patch.object(script, 'build_package') as build_package, \
+                patch.object(script, 'DebHelper', FakeDebHelper), \
+                patch.object(script, 'Deployment') as deployment, \
+                patch.object(script, 'log'), \
+                patch.dict(os.environ,
+                           {'DH_VIRTUALENV_INSTALL_ROOT': '/opt/foo'}), \
+                patch('sys.argv',
+                      ['dh_virtualenv', '--install-suffix', 'bar']):
+            eq_(None, script.main())
+        eq_(1, build_package.call_count)
+        # Only building the package needs a Deployment
+        ok_(not deployment.from_options.called)
+        eq_(['postinst', 'prerm', 'postrm'],
+            [when for _, when, _ in autoscripts])
+        for _, _, sed in autoscripts:
+            ok_("dh_venv_install_dir='/opt/foo/bar'" in sed)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+
+def test_main_reports_failed_packages():
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+
+    class FakeDebHelper(object):
+        def __init__(self, options):
+            self.packages = dict((name, {}) for name in ('good', 'broken'))
+
+        def save(self):
+            raise AssertionError('Saved after a failed build')
+
+    try:
+        os.chdir(tmpdir)
+        os.mkdir('debian')
+        with patch.object(script, 'build_package', _fake_build_package), \
+                patch.object(script, 'DebHelper', FakeDebHelper), \
+                patch.object(script, 'log'), \
+                patch('sys.stderr', io.StringIO()), \
+                patch('sys.argv',
+                      ['dh_virtualenv', '--noscripts', '--jobs', '2']):
+            eq_(1, script.main())
+        ok_(os.path.exists(script._package_log('good')))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
+
+
+def _fake_install_dependencies(self):
+    # One file per requirement stands in for the installed distributions
+    with open(os.path.join(self.sourcedirectory, 'requirements.txt')) as fh:
+        for requirement in fh.read().split():
+            open(os.path.join(self.package_dir, requirement), 'w').close()
+
+
+def test_incremental_build_removes_dropped_requirements():
+    tmpdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        os.chdir(tmpdir)
+        os.mkdir('debian')
+        os.mkdir('src')
+        options, _ = get_default_parser().parse_args(
+            ['--incremental', '--sourcedirectory', 'src'])
+        package_dir = Deployment.from_options('test', options).package_dir
+
+        def build(requirements):
+            with open(os.path.join('src', 'requirements.txt'), 'w') as fh:
+                fh.write(requirements)
+            with patch.multiple(
+                    Deployment,
+                    create_virtualenv=lambda self: os.makedirs(
+                        self.package_dir, exist_ok=True),
+                    install_dependencies=_fake_install_dependencies,
+                    install_package=lambda self: None,
+                    fix_activate_path=lambda self: None,
+                    fix_shebangs=lambda self: None), \
+                    patch.object(script, 'log'):
+                script.build_package('test', options, False)
+            return sorted(os.listdir(package_dir))
+
+        eq_(['bar', 'foo'], build('foo\nbar\n'))
+        eq_(['foo'], build('foo\n'))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_
+
+from dh_virtualenv import simpleindex
+
+
+def test_build_index():
+    artifacts = tempfile.mkdtemp()
+    index = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(artifacts, 'sub'))
+        for name in ('six-1.16.0-py2.py3-none-any.whl', 'PyYAML-6.0.tar.gz',
+                     'sub/PyYAML-5.4.zip', 'README.txt'):
+            open(os.path.join(artifacts, name), 'w').close()
+
+        eq_({'six': [os.path.join(artifacts, 'six-1.16.0-py2.py3-none-any.whl')],
+             'pyyaml': [os.path.join(artifacts, 'sub', 'PyYAML-5.4.zip'),
+                        os.path.join(artifacts, 'PyYAML-6.0.tar.gz')]},
+            simpleindex.find_distributions(artifacts))
+
+        eq_(2, simpleindex.build_index(artifacts, index))
+        with open(os.path.join(index, 'index.html')) as fh:
+            root = fh.read()
+        ok_(root.index('<a href="pyyaml/">pyyaml</a>') <
+            root.index('<a href="six/">six</a>'))
+        with open(os.path.join(index, 'pyyaml', 'index.html')) as fh:
+            page = fh.read()
+        ok_('<a href="file://{0}/PyYAML-6.0.tar.gz">PyYAML-6.0.tar.gz</a>'
+            .format(artifacts) in page)
+        ok_('<a href="file://{0}/sub/PyYAML-5.4.zip">PyYAML-5.4.zip</a>'
+            .format(artifacts) in page)
+    finally:
+        shutil.rmtree(artifacts)
+        shutil.rmtree(index)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+import subprocess
+import sys
+
+from nose.tools import eq_, ok_, assert_raises
+
+from dh_virtualenv.timing import PhaseTimer
+
+
+def test_phase_records_child_resources():
+    timer = PhaseTimer()
+    with timer.phase('child'):
+        subprocess.check_call([sys.executable, '-c', 'sum(range(100000))'])
+    phase, = timer.phases
+    eq_('child', phase['name'])
+    eq_(False, phase['failed'])
+    ok_(phase['wall_seconds'] > 0)
+    ok_(phase['children_cpu_seconds'] > 0)
+    ok_(phase['children_max_rss_kb'] > 0)
+
+
+def test_failed_phase_is_recorded():
+    timer = PhaseTimer()
+    with assert_raises(ValueError):
+        with timer.phase('broken'):
+            raise ValueError()
+    eq_(True, timer.phases[0]['failed'])
+    eq_(['broken'], [p['name'] for p in timer.report()['phases']])
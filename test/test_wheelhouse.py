@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2014 Spotify AB
+
+# This file is part of dh-virtualenv.
+
+# dh-virtualenv is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation, either version 2 of the
+# License, or (at your option) any later version.
+
+# dh-virtualenv is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with dh-virtualenv. If not, see
+# <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import tempfile
+
+from nose.tools import eq_, ok_
+
+from dh_virtualenv import wheelhouse
+
+
+def _touch(path):
+    open(path, 'w').close()
+
+
+def test_parse_wheel_filename():
+    eq_(('zope-interface', '5.1.0'), wheelhouse.parse_wheel_filename(
+        'zope.interface-5.1.0-cp38-cp38-manylinux2010_x86_64.whl'))
+    eq_(('six', '1.15.0'), wheelhouse.parse_wheel_filename(
+        '/some/dir/six-1.15.0-py2.py3-none-any.whl'))
+    eq_(('foo', '1.0'), wheelhouse.parse_wheel_filename(
+        'Foo-1.0-1-py3-none-any.whl'))
+    eq_(None, wheelhouse.parse_wheel_filename('foo-1.0.tar.gz'))
+
+
+def test_parse_sdist_filename():
+    eq_(('pyyaml', '6.0'), wheelhouse.parse_sdist_filename('PyYAML-6.0.tar.gz'))
+    eq_(('zope-interface', '5.4.0'),
+        wheelhouse.parse_sdist_filename('/x/zope.interface-5.4.0.zip'))
+    eq_(None, wheelhouse.parse_sdist_filename('foo-1.0-py3-none-any.whl'))
+    eq_(None, wheelhouse.parse_sdist_filename('README.tar.gz'))
+
+
+def test_parse_pins_skips_unfetchable_requirements():
+    eq_([('requests', '2.24.0'), ('zope-interface', '5.1.0')],
+        wheelhouse.parse_pins([
+            'requests==2.24.0\n',
+            'Zope.Interface==5.1.0\n',
+            '-e git+https://example.com/foo.git#egg=foo\n',
+            'bar @ file:///tmp/bar\n',
+            '\n',
+        ]))
+
+
+def test_requirements_key_is_stable():
+    eq_(wheelhouse.requirements_key('a', 'b'),
+        wheelhouse.requirements_key('a', 'b'))
+    ok_(wheelhouse.requirements_key('ab', '') !=
+        wheelhouse.requirements_key('a', 'b'))
+
+
+def test_wheelhouse_is_keyed_by_tag():
+    house = wheelhouse.Wheelhouse('/cache', 'cpython-38-linux-x86_64')
+    eq_('/cache/wheels/cpython-38-linux-x86_64', house.path)
+
+
+def test_wheelhouse_completeness():
+    root = tempfile.mkdtemp()
+    try:
+        house = wheelhouse.Wheelhouse(root, 'tag')
+        pins = [('six', '1.15.0'), ('requests', '2.24.0')]
+        eq_(['--find-links=' + house.path], house.pip_args('key'))
+
+        house.save_manifest('key', pins)
+        eq_(sorted(pins), sorted(house.load_manifest('key')))
+        ok_(not house.is_complete('key'))
+        eq_(['--find-links=' + house.path], house.pip_args('key'))
+
+        _touch(os.path.join(house.path, 'six-1.15.0-py2.py3-none-any.whl'))
+        eq_([('requests', '2.24.0')], house.missing(pins))
+
+        staging = house.staging_dir()
+        wheel = os.path.join(staging, 'requests-2.24.0-py2.py3-none-any.whl')
+        _touch(wheel)
+        house.add(wheel)
+        ok_(house.is_complete('key'))
+        eq_(['--no-index', '--find-links=' + house.path],
+            house.pip_args('key'))
+    finally:
+        shutil.rmtree(root)